@@ -23,8 +23,10 @@ for each check, placed in the <experiment_directory> directory.
 """
 
 import argparse
+import multiprocessing
 from os import listdir
 from os import makedirs
+from os import sched_getaffinity
 from os.path import isdir
 from os.path import isfile
 
@@ -34,6 +36,10 @@ import matplotlib.pyplot as plt
 
 import pandas
 
+# Columns checked against the requirements. The bit i of the return code of an
+# experiment type is set if check CHECK_COLUMNS[i] failed.
+CHECK_COLUMNS = ['Median', '99%', 'Max']
+
 
 def directory_type(directory):
     """
@@ -66,136 +72,94 @@ def experiment_type(filename):
     return exp_type
 
 
-def check_requirement(
-    requirements_data,
-    experiment_data,
-    column,
-    payload
-):
-    """
-    Check if a single result meets the requirement.
-
-    :param requirements_data: A Pandas DataFrame with at least column <column>,
-        and only one entry.
-    :param experiment_data: A Pandas DataFrame with at least column <column>,
-        and only one entry.
-    :param column: The column to check
-    :param payload: The checked payload.
-    :raise: AssertionError if:
-        * <requirements_data> is not a DataFrame
-        * <experiment_data> is not a DataFrame
-        * <column> is not on <requirements_data> and in <experiment_data>
-        * <column> is not a string
-        * <payload> is not a string
-    :return: False on check failure, True on check pass
-    :return: A one entry Pandas DataFrame with columns: 'Check', 'Bytes',
-        'Requirement', 'Experiment', 'Difference', 'Percentage over
-        requirement', and 'Status'. Status is either "failed" or "passed"
-    """
-    assert(isinstance(requirements_data, pandas.DataFrame))
-    assert(isinstance(experiment_data, pandas.DataFrame))
-    assert(isinstance(column, str))
-    assert(column in requirements_data)
-    assert(column in experiment_data)
-    assert(isinstance(payload, str))
-
-    # Get the requirement
-    req = requirements_data[column].values[0]
-    # Get the experiment result
-    exp = experiment_data[column].values[0]
-
-    diff = req - exp  # Difference
-    perc = (-diff * 100) / req  # Percentage of result over the requirement
-
-    # Resulting DataFrame
-    result = pandas.DataFrame(
-        {
-            'Check': column,
-            'Bytes': payload,
-            'Requirement': [req],
-            'Experiment': [exp],
-            'Difference': [abs(diff)],
-            'Percentage over requirement': [perc],
-            'Status': ['failed' if diff < 0 else 'passed']
-        }
-    )
-    return bool(diff >= 0), result
-
-
 def check_requirements(
     requirements,
-    experiment,
+    summaries,
 ):
     """
-    Check results of an experiment type agains requirements.
+    Check the results of several experiment types against requirements.
 
     Check experiment results in terms of median, percentile 99, and maximum
-    latency.
-
-    :param requirements: A Pandas DataFrame with one row entry per payload, and
-        at least the columns "Bytes", "Median", "99%", and "Max".
-    :param experiment: A Pandas DataFrame with one row entry per payload, and
-        at least the columns "Bytes", "Median", "99%", and "Max".
+    latency. The requirements and the summaries are joined on
+    ('Experiment type', 'Bytes') once, and all the checks are evaluated as
+    column operations. A check fails if the experiment result is over the
+    requirement, or if there is no result for a required payload.
+
+    :param requirements: A Pandas DataFrame with one row entry per experiment
+        type and payload, and at least the columns "Experiment type", "Bytes",
+        "Median", "99%", and "Max".
+    :param summaries: A Pandas DataFrame with one row entry per experiment
+        type and payload, and at least the columns "Experiment type", "Bytes",
+        "Median", "99%", and "Max".
     :raise: AssertionError if:
         * requirements is not a DataFrame
-        * experiment is not a DataFrame
+        * summaries is not a DataFrame
         * Any of the mandatory columns is not in the DataFrames
-    :return: A return code (0 success)
-    :return: A dictionary with one entry per check (Median, 99%, and Max). Each
-        entry is a DataFrame as returned from check_requirement()
-
+    :return: A dictionary with the experiment types of <summaries> as keys,
+        and their return codes as values (0 success, else the bit i is set if
+        check CHECK_COLUMNS[i] failed for some payload).
+    :return: A DataFrame with columns 'Experiment type', 'Check', 'Bytes',
+        'Requirement', 'Experiment', 'Difference',
+        'Percentage over requirement', and 'Status' (either "failed" or
+        "passed"), with one entry per check and required payload of each
+        experiment type of <summaries>, ordered by check.
     """
     # Validate arguments
     assert(isinstance(requirements, pandas.DataFrame))
-    assert(isinstance(experiment, pandas.DataFrame))
-
-    # Columns to check
-    columns = [
-        'Bytes',
-        'Median',
-        '99%',
-        'Max',
-    ]
+    assert(isinstance(summaries, pandas.DataFrame))
 
     # Validate that columns in dataframes
-    for column in columns:
+    keys = ['Experiment type', 'Bytes']
+    for column in keys + CHECK_COLUMNS:
         assert(column in requirements)
-        assert(column in experiment)
-
-    return_code = 0
-    columns.pop(0)  # Remove 'Bytes' column
-
-    checks = {}
-
-    # Iterate over the payloads
-    payloads = requirements['Bytes'].unique()
-    for payload in payloads:
-        # Extract payload data
-        requirements_data = requirements[requirements['Bytes'] == payload]
-        result_data = experiment[experiment['Bytes'] == payload]
-
-        # Check payload data for each column
-        i = 0
-        for column in columns:
-            check, failed = check_requirement(
-                requirements_data,
-                result_data,
-                column,
-                str(payload)
-            )
-
-            # Append results
-            if column not in checks:
-                checks[column] = pandas.DataFrame()
-            checks[column] = checks[column].append(failed, sort=False)
-            checks[column] = checks[column].reset_index(drop=True)
+        assert(column in summaries)
+
+    # Join the requirements of the checked experiment types with their results
+    exp_types = summaries['Experiment type'].unique()
+    joined = requirements[
+        requirements['Experiment type'].isin(exp_types)
+    ][keys + CHECK_COLUMNS].merge(
+        summaries[keys + CHECK_COLUMNS].drop_duplicates(keys),
+        how='left',
+        on=keys,
+        suffixes=(' requirement', ' experiment')
+    )
 
-            # Update return_code
-            if check is False:
-                return_code += pow(2, i)
-            i += 1
+    # Evaluate each check for all the experiment types and payloads at once
+    column_checks = []
+    for column in CHECK_COLUMNS:
+        req = joined['{} requirement'.format(column)]  # Requirements
+        exp = joined['{} experiment'.format(column)]  # Experiment results
+        diff = req - exp  # Difference
+        # Percentage of result over the requirement
+        perc = (-diff * 100) / req
+        passed = diff >= 0
+        column_checks.append(
+            pandas.DataFrame(
+                {
+                    'Experiment type': joined['Experiment type'],
+                    'Check': column,
+                    'Bytes': joined['Bytes'],
+                    'Requirement': req,
+                    'Experiment': exp,
+                    'Difference': diff.abs(),
+                    'Percentage over requirement': perc,
+                    'Status': passed.map({True: 'passed', False: 'failed'}),
+                }
+            )
+        )
+    checks = pandas.concat(column_checks, ignore_index=True)
+    passed = checks['Status'] == 'passed'
 
-    return return_code, checks
+    # Set bit i of the return code if any payload fails CHECK_COLUMNS[i]
+    failed = checks[~passed].drop_duplicates(['Experiment type', 'Check'])
+    codes = failed['Check'].map(
+        {column: pow(2, i) for i, column in enumerate(CHECK_COLUMNS)}
+    ).groupby(failed['Experiment type']).sum()
+    return_codes = {
+        exp_type: int(codes.get(exp_type, 0)) for exp_type in exp_types
+    }
+    return return_codes, checks
 
 
 def plot(
@@ -242,8 +206,7 @@ def plot(
     ]
 
     # Agregate requirements and experiment data in one DataFrame
-    summaries_data = requirements
-    summaries_data = summaries_data.append(experiment, sort=False)
+    summaries_data = pandas.concat([requirements, experiment], sort=False)
     summaries_data.Bytes = summaries_data.Bytes.astype(str)
 
     fig, ax = plt.subplots()
@@ -273,16 +236,13 @@ def plot(
     plt.close(fig)
 
 
-def plot_and_check(
+def plot_experiment_type(
     requirements,
     experiment,
     plots_directory
 ):
     """
-    Plot and check experiment data against requirements.
-
-    Plot the experiment data and requirements data series.
-    Check whether the experiment data meet the requirements.
+    Plot the experiment data and requirements of an experiment type.
 
     :param requirements: Pandas DataFrame containing the requirements for a
         specific experiment type.
@@ -291,16 +251,17 @@ def plot_and_check(
     :param plots_directory: A directory to place the resulting plots.
     :raise: AssertionError if requirements or experiment are not Pandas
         Dataframes.
-    :return: The return of "check_requirements()"
     """
     # Validate arguments
     assert(isinstance(requirements, pandas.DataFrame))
     assert(isinstance(experiment, pandas.DataFrame))
 
-    # Columns to check
-    columns = ['Median', '99%', 'Max']
+    requirements = requirements.reset_index(drop=True)
+    requirements.insert(0, 'Label', 'requirements')
+    experiment = experiment.reset_index(drop=True)
+    experiment.insert(0, 'Label', 'experiment')
     # Plot comparison for each column
-    for column in columns:
+    for column in CHECK_COLUMNS:
         plot(
             requirements=requirements,
             experiment=experiment,
@@ -308,8 +269,57 @@ def plot_and_check(
             plots_directory=plots_directory,
             title=column.lower()
         )
-    # Check the requirements
-    return check_requirements(requirements, experiment)
+
+
+def plot_checks(requirements, summaries, plots_directory, jobs):
+    """
+    Plot the experiment data and requirements of all the experiment types.
+
+    The experiment types are plotted in parallel, by a pool of at most <jobs>
+    processes. The plots of each experiment type are placed in the
+    '<plots_directory>/measurements_<experiment_type>' directory.
+
+    :param requirements: Pandas DataFrame containing the requirements.
+    :param summaries: Pandas DataFrame containing the summaries of all the
+        experiment types, with an "Experiment type" column.
+    :param plots_directory: A directory to place the resulting plots.
+    :param jobs: The maximum number of plotting processes.
+    :return: The number of experiment types that could not be plotted.
+    """
+    tasks = []
+    for exp_type, experiment in summaries.groupby(
+        'Experiment type',
+        sort=False
+    ):
+        tasks.append(
+            (
+                exp_type,
+                requirements[requirements['Experiment type'] == exp_type],
+                experiment,
+                '{}/measurements_{}'.format(plots_directory, exp_type),
+            )
+        )
+    if len(tasks) == 0:
+        return 0
+
+    failures = 0
+    with multiprocessing.Pool(max(min(jobs, len(tasks)), 1)) as pool:
+        results = [
+            (
+                exp_type,
+                pool.apply_async(
+                    plot_experiment_type,
+                    (reqs, experiment, exp_plots_directory)
+                )
+            ) for exp_type, reqs, experiment, exp_plots_directory in tasks
+        ]
+        for exp_type, result in results:
+            try:
+                result.get()
+            except Exception as e:
+                print('Error plotting {}: {}'.format(exp_type, e))
+                failures += 1
+    return failures
 
 
 if __name__ == '__main__':
@@ -357,6 +367,20 @@ if __name__ == '__main__':
         help='Whether to print a table with the summaries for each result',
         required=False
     )
+    parser.add_argument(
+        '--no_plots',
+        action='store_true',
+        help='Check the results without generating the check plots',
+        required=False
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='The maximum number of processes plotting experiment types',
+        default=len(sched_getaffinity(0)),
+        required=False
+    )
     args = parser.parse_args()
     plots_directory = args.plots_directory
     requirements = args.requirements
@@ -389,52 +413,40 @@ if __name__ == '__main__':
     # Get requirements
     requirements = pandas.read_csv(requirements)
 
-    # Check each summary separately
+    # Get all the experiment summaries in one DataFrame
+    experiments = []
     for summary in summaries:
-        # Get experiment type
-        exp_type = experiment_type(summary)
-        print('Checking {}  '.format(exp_type), end='', flush=True)
-
-        # Get requirements for experiment type
-        reqs = requirements[requirements['Experiment type'] == exp_type]
-        reqs.insert(0, 'Label', 'requirements')
-        reqs = reqs.reset_index(drop=True)
-
-        # Get experiment summary data
         experiment = pandas.read_csv(
             summary,
-            usecols=[
-                'Bytes',
-                'Median',
-                '99%',
-                'Max'
-            ]
+            usecols=['Bytes'] + CHECK_COLUMNS
         )
-        experiment['Experiment type'] = exp_type
-        experiment.insert(0, 'Label', 'experiment')
-
-        # Plot experiment and requirements, and check the experiment
-        status, column_checks = plot_and_check(
-            requirements=reqs,
-            experiment=experiment,
-            plots_directory='{}/measurements_{}'.format(
-                plots_directory,
-                exp_type
-            )
+        experiment.insert(0, 'Experiment type', experiment_type(summary))
+        experiments.append(experiment)
+    if len(experiments) > 0:
+        experiments = pandas.concat(experiments, ignore_index=True)
+    else:
+        experiments = pandas.DataFrame(
+            columns=['Experiment type', 'Bytes'] + CHECK_COLUMNS
         )
 
+    # Check all the experiment types at once
+    return_codes, all_checks = check_requirements(requirements, experiments)
+    checks_by_type = dict(
+        list(all_checks.groupby('Experiment type', sort=False))
+    )
+    for exp_type in return_codes:
+        print('Checking {}  '.format(exp_type), end='', flush=True)
+
         # Checkup check status
-        if status == 0:
+        if return_codes[exp_type] == 0:
             print('[PASSED]')
         else:
             print('[FAILED]')
             exit_code += 1
 
         # Generate check report
-        checks = pandas.DataFrame()
-        for check in column_checks:
-            checks = checks.append(column_checks[check], sort=False)
-        checks = checks.reset_index(drop=True)
+        checks = checks_by_type.get(exp_type, all_checks.iloc[0:0])
+        checks = checks.drop(columns='Experiment type').reset_index(drop=True)
         checks.to_csv(
             '{}/checks_{}.csv'.format(experiment_directory, exp_type),
             float_format='%.3f',
@@ -451,6 +463,17 @@ if __name__ == '__main__':
     if not print_summaries:
         print('----------------------------')
 
+    # Plot experiments and requirements
+    if args.no_plots is False:
+        if plot_checks(
+            requirements,
+            experiments,
+            plots_directory,
+            args.jobs
+        ) > 0:
+            print('Some check plots could not be generated')
+        print('----------------------------')
+
     # Print analysis summary and exit with exit_code
     print(
         '{:.3f}% checks passed: ({}/{})'.format(
@@ -24,6 +24,29 @@ minima, median, 99 percentile, and maxima, generates comparison plots
 directory). The script's exit code is 0 if all performed comparisons succeed,
 and 1 otherwise. Run with '-h' or '--help' to see a complete list of arguments.
 
+With '--samples', the verdict is based on the raw samples of both experiments
+instead of the summaries: for each payload, the differences in median, 99
+percentile, and 99.99 percentile are given bootstrap confidence intervals, and
+a comparison fails only if an interval is entirely above the fail threshold.
+The intervals and Kolmogorov-Smirnov and Mann-Whitney U tests of the samples
+are stored in '<experiment_type>_samples_comparison.csv' CSVs.
+
+With '--builds', any number of results directories (one per build) are
+compared against each other instead. Their summaries are loaded once in a
+table indexed by experiment type, payload, and build ('builds_summary.csv'),
+and the script creates pairwise relative difference matrices of the builds
+for latency minima, median, 99 percentile, and maxima
+('builds_matrices.csv'), ranks the builds for each of them
+('builds_ranks.csv'), and plots all the builds of each experiment type
+together ('<experiment_type>_builds.png').
+
+Some magnitudes (such as the maxima) are much noisier than others, so a single
+fail threshold does not fit all of them. With '--calibrate', the run-to-run
+noise of each experiment type, payload, and magnitude is estimated from a
+directory of A/A results directories (several runs of the same build), and
+the derived thresholds are written to a thresholds CSV file. Comparisons
+given that file with '--thresholds' use its threshold for each entry.
+
 Example:
     python3 latency_compare_experiments.py \\
         --reference ./reference_results \\
@@ -64,17 +87,35 @@ The previous generates the following CSVs and plots:
 """
 import argparse
 import logging
+from math import erfc
+from math import sqrt
 from os import listdir
 from os import makedirs
 from os.path import isdir
 from os.path import isfile
 
+from latency_process_results import load_measurements
+from latency_process_results import samples_store_files
+
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
+import numpy as np
+
 import pandas as pd
 
+# Statistics compared in the samples mode, and their percentiles
+SAMPLES_STATISTICS = {
+    'Median': 50,
+    '99%': 99,
+    '99.99%': 99.99,
+}
+# Number of bootstrap replicates of each statistic in the samples mode
+BOOTSTRAP_RESAMPLES = 2000
+# Standard deviations of the A/A difference used as calibrated threshold
+CALIBRATION_SIGMAS = 3
+
 
 def directory_type(directory):
     """
@@ -116,6 +157,7 @@ def compare_(
     result_data,
     columns,
     fail_threshold,
+    thresholds=None,
 ):
     """
     Compare the reference and result data for certain columns.
@@ -125,7 +167,8 @@ def compare_(
     <result_data> is bigger than the equivalent reference times
     (1 + <fail_threshold>), then the comparison fails. In this sense,
     <fail_threshold> acts as a percentage over the reference, but expressed in
-    based 1 instead of 100.
+    based 1 instead of 100. If <thresholds> has an entry for a payload and
+    column, it is used instead of <fail_threshold>.
 
     The function makes the following assumptions about the DataFrames:
         - They contain a 'Bytes' column.
@@ -137,6 +180,9 @@ def compare_(
     :param result_data: A DataFrame with the data to check.
     :param columns: The columns to compare.
     :param fail_threshold: The limit over the reference.
+    :param thresholds: A dictionary with (payload, column) tuples as keys, and
+        the limit over the reference of each as values, as returned by
+        load_thresholds(). Defaults: None.
 
     :returns: A tuple containing:
         - Return code: True if all comparisons succeeded (meaning the result
@@ -166,34 +212,41 @@ def compare_(
     """
     ret = True  # Function return code
     comp_dfs = {}  # A dictionary containing the comparison DataFrames
+    if thresholds is None:
+        thresholds = {}
     # Iterate over columns
     for column in columns:
-        comp_df = pd.DataFrame()  # DataFrame for the colum comparison
+        comp_entries = []  # Entries of the column comparison
         # Iterate over payloads (Bytes) in reference_data
-        for payload, ref_grp in reference_data.groupby(['Bytes']):
+        for payload, ref_grp in reference_data.groupby('Bytes'):
             # Get result_data for that payload
             res_grp = result_data.loc[result_data['Bytes'] == payload]
+            # Fail threshold for the payload entry
+            threshold = thresholds.get((payload, column), fail_threshold)
             # DataFrame for payload entry
             comp_entry = pd.DataFrame(
                 {
                     'Bytes': [payload],
                     'Reference {}'.format(column): ref_grp[column].values,
                     'Result {}'.format(column): res_grp[column].values,
-                    'Fail threshold': [fail_threshold],
+                    'Fail threshold': [threshold],
                 }
             )
             # Perform the actual comparison
             if (res_grp[column].values[0] >
-                    ref_grp[column].values[0]) * (1 + fail_threshold):
+                    ref_grp[column].values[0] * (1 + threshold)):
                 # Once one check fails, the entire comparison fails.
                 ret = False
                 comp_entry['Comparison'] = 'failed'
             else:
                 comp_entry['Comparison'] = 'passed'
-            # Add entry to column DataFrame
-            comp_df = comp_df.append(comp_entry, sort=False)
+            # Add entry to column entries
+            comp_entries.append(comp_entry)
         # Add column DataFrame to dictionary, using column as key
-        comp_df = comp_df.reset_index(drop=True)
+        if len(comp_entries) > 0:
+            comp_df = pd.concat(comp_entries, ignore_index=True, sort=False)
+        else:
+            comp_df = pd.DataFrame()
         comp_dfs[column] = comp_df
     return ret, comp_dfs
 
@@ -295,7 +348,8 @@ def compare_and_plot(
     columns=['Min', 'Median', 'Max', '99%'],
     reference_label='reference',
     result_label='result',
-    fail_threshold=0.1
+    fail_threshold=0.1,
+    thresholds=None
 ):
     """
     Compare and plot latency results against a reference.
@@ -321,6 +375,9 @@ def compare_and_plot(
     :param result_label: The label for the result data.
         Defaults: 'result'.
     :param fail_threshold: The limit over the reference. Defaults: 0.1.
+    :param thresholds: A dictionary with per payload and column limits over
+        the reference, as returned by load_thresholds(), which take precedence
+        over <fail_threshold>. Defaults: None.
 
     :returns: A tuple containing:
         - Return code: True if all comparisons succeeded (meaning the result
@@ -383,8 +440,6 @@ def compare_and_plot(
     assert(fail_threshold >= 0 and fail_threshold <= 1)
 
     # Summaries combination
-    summaries_data = pd.DataFrame()
-
     # Data from reference
     reference_data = pd.read_csv(reference)
     reference_data['Label'] = reference_label
@@ -398,16 +453,19 @@ def compare_and_plot(
         reference_data=reference_data,
         result_data=result_data,
         columns=columns,
-        fail_threshold=fail_threshold
+        fail_threshold=fail_threshold,
+        thresholds=thresholds
     )
 
     # Prepare data for plots
     reference_data.Bytes = reference_data.Bytes.astype(str)
     result_data.Bytes = result_data.Bytes.astype(str)
     # Create summary
-    summaries_data = summaries_data.append(reference_data, sort=False)
-    summaries_data = summaries_data.append(result_data, sort=False)
-    summaries_data = summaries_data.reset_index(drop=True)
+    summaries_data = pd.concat(
+        [reference_data, result_data],
+        ignore_index=True,
+        sort=False
+    )
 
     # Create one comparison plot for each 2 columns
     column_pairs = [columns[x:x+2] for x in range(0, len(columns), 2)]
@@ -427,6 +485,413 @@ def compare_and_plot(
     return comp_result, comp_dfs, summaries_data
 
 
+def bootstrap_percentiles(sorted_latencies, percentile, random_state):
+    """
+    Draw bootstrap replicates of a percentile of a set of latencies.
+
+    Taking the r-th smallest of n latencies resampled with replacement is the
+    same as taking the latency at the position of the r-th smallest of n
+    uniform values, which follows a Beta(r, n - r + 1) distribution. So the
+    replicates are drawn directly, without resampling the latencies.
+
+    :param sorted_latencies: A sorted numpy array with the latencies.
+    :param percentile: The percentile, in [0, 100].
+    :param random_state: A numpy RandomState.
+    :return: A numpy array with BOOTSTRAP_RESAMPLES replicates.
+    """
+    n = len(sorted_latencies)
+    rank = min(max(int(np.ceil(percentile / 100 * n)), 1), n)
+    uniform = random_state.beta(rank, n - rank + 1, BOOTSTRAP_RESAMPLES)
+    positions = np.minimum((uniform * n).astype(int), n - 1)
+    return sorted_latencies[positions]
+
+
+def ks_test(reference, result):
+    """
+    Perform a two-sample Kolmogorov-Smirnov test.
+
+    :param reference: A sorted numpy array with the reference latencies.
+    :param result: A sorted numpy array with the result latencies.
+    :return: The KS statistic (maximum distance between the empirical CDFs).
+    :return: The asymptotic p-value of the test.
+    """
+    n = len(reference)
+    m = len(result)
+    values = np.concatenate((reference, result))
+    statistic = np.max(
+        np.abs(
+            np.searchsorted(reference, values, side='right') / n -
+            np.searchsorted(result, values, side='right') / m
+        )
+    )
+    effective = np.sqrt(n * m / (n + m))
+    lambda_ = (effective + 0.12 + 0.11 / effective) * statistic
+    # The series does not converge for small lambdas, where it is 1
+    if lambda_ < 0.2:
+        return statistic, 1.0
+    k = np.arange(1, 101)
+    p_value = 2 * np.sum((-1.0) ** (k - 1) * np.exp(-2 * (k * lambda_) ** 2))
+    return statistic, min(max(p_value, 0.0), 1.0)
+
+
+def mann_whitney_test(reference, result):
+    """
+    Perform a two-sided Mann-Whitney U test.
+
+    The p-value uses the normal approximation with tie correction.
+
+    :param reference: A sorted numpy array with the reference latencies.
+    :param result: A sorted numpy array with the result latencies.
+    :return: The probability of a result latency being greater than a
+        reference one (counting ties as a half), which is the U statistic of
+        the result divided by the number of pairs.
+    :return: The p-value of the test.
+    """
+    n = len(reference)
+    m = len(result)
+    values = np.sort(np.concatenate((reference, result)))
+    # Average rank (starting at 1) of the result latencies
+    ranks = (
+        np.searchsorted(values, result, side='left') +
+        np.searchsorted(values, result, side='right') + 1
+    ) / 2
+    u = ranks.sum() - m * (m + 1) / 2
+    _, counts = np.unique(values, return_counts=True)
+    ties = np.sum(counts.astype(float) ** 3 - counts)
+    sigma = sqrt(n * m / 12 * ((n + m + 1) - ties / ((n + m) * (n + m - 1))))
+    if sigma == 0:
+        return u / (n * m), 1.0
+    z = (u - n * m / 2) / sigma
+    return u / (n * m), erfc(abs(z) / sqrt(2))
+
+
+def compare_samples(
+    reference,
+    result,
+    fail_threshold,
+    confidence,
+    random_state,
+    thresholds=None
+):
+    """
+    Compare the latency samples of a result against a reference.
+
+    For each payload and statistic of SAMPLES_STATISTICS, a bootstrap
+    confidence interval of the difference between the result and the
+    reference is computed. The comparison fails only if the whole interval is
+    above <fail_threshold> (or the entry of <thresholds> for the payload and
+    statistic, if any) times the reference value. Besides, the
+    distributions of each payload are compared with the Kolmogorov-Smirnov and
+    the Mann-Whitney U tests, for information only.
+
+    :param reference: The path to the reference measurements CSV file. It is
+        assumed to be of the form '<some_path>/measurements_<type>.csv'.
+    :param result: The path to the results measurements CSV file. It is
+        assumed to be of the form '<some_path>/measurements_<type>.csv'.
+    :param fail_threshold: The limit over the reference, in base 1.
+    :param confidence: The confidence of the intervals, in (0, 1).
+    :param random_state: A numpy RandomState for the bootstrap replicates.
+    :param thresholds: A dictionary with per payload and statistic limits
+        over the reference, as returned by load_thresholds(). Defaults: None.
+
+    :returns: A tuple containing:
+        - Return code: True if all comparisons succeeded, False otherwise.
+        - DataFrame: A DataFrame with columns 'Bytes', 'Statistic',
+            'Reference [us]', 'Result [us]', 'Difference [us]',
+            'Lower bound [us]', 'Upper bound [us]', 'Fail threshold',
+            'Comparison', 'KS statistic', 'KS p-value',
+            'Mann-Whitney p-value', and 'P(result > reference)', with one row
+            per payload present in both files and statistic.
+    """
+    ref_payloads, ref_latencies, ref_offsets, _ = load_measurements(reference)
+    res_payloads, res_latencies, res_offsets, _ = load_measurements(result)
+    alpha = (1 - confidence) / 2 * 100
+    if thresholds is None:
+        thresholds = {}
+
+    rows = []
+    for i, payload in enumerate(res_payloads):
+        j = np.flatnonzero(ref_payloads == payload)
+        if len(j) == 0:
+            logger.warning(
+                'No reference samples for {} Bytes in {}'.format(
+                    payload,
+                    reference
+                )
+            )
+            continue
+        j = j[0]
+        ref = np.sort(ref_latencies[ref_offsets[j]:ref_offsets[j + 1]])
+        res = np.sort(res_latencies[res_offsets[i]:res_offsets[i + 1]])
+        ks_statistic, ks_p_value = ks_test(ref, res)
+        superiority, mw_p_value = mann_whitney_test(ref, res)
+        for statistic, percentile in SAMPLES_STATISTICS.items():
+            ref_value = np.percentile(ref, percentile)
+            res_value = np.percentile(res, percentile)
+            differences = (
+                bootstrap_percentiles(res, percentile, random_state) -
+                bootstrap_percentiles(ref, percentile, random_state)
+            )
+            lower, upper = np.percentile(differences, [alpha, 100 - alpha])
+            threshold = thresholds.get((payload, statistic), fail_threshold)
+            rows.append(
+                [
+                    payload,
+                    statistic,
+                    ref_value,
+                    res_value,
+                    res_value - ref_value,
+                    lower,
+                    upper,
+                    threshold,
+                    'failed' if lower > threshold * ref_value else 'passed',
+                    ks_statistic,
+                    ks_p_value,
+                    mw_p_value,
+                    superiority,
+                ]
+            )
+    comp_df = pd.DataFrame(
+        rows,
+        columns=[
+            'Bytes',
+            'Statistic',
+            'Reference [us]',
+            'Result [us]',
+            'Difference [us]',
+            'Lower bound [us]',
+            'Upper bound [us]',
+            'Fail threshold',
+            'Comparison',
+            'KS statistic',
+            'KS p-value',
+            'Mann-Whitney p-value',
+            'P(result > reference)',
+        ]
+    )
+    return bool((comp_df['Comparison'] == 'passed').all()), comp_df
+
+
+def load_builds(build_directories):
+    """
+    Load the summaries of several builds in a single table.
+
+    :param build_directories: The list of results directories, one per build.
+        The build name is the directory name.
+    :return: A DataFrame with the columns of the summaries, indexed by
+        'Experiment type', 'Bytes', and 'Build', and sorted by experiment type
+        and payload, with the builds in the order of <build_directories>, or
+        None if there are no summaries in any of them.
+    """
+    data = []
+    for directory in build_directories:
+        build = directory.split('/')[-1]
+        summary_files = [
+            f for f in sorted(listdir(directory)) if f.endswith('_summary.csv')
+        ]
+        if len(summary_files) == 0:
+            logger.warning(
+                'No summaries found in {}, build {} is left out'.format(
+                    directory,
+                    build
+                )
+            )
+        for f in summary_files:
+            logger.debug('Loading {}/{}'.format(directory, f))
+            summary = pd.read_csv('{}/{}'.format(directory, f))
+            summary.insert(0, 'Build', build)
+            summary.insert(
+                0,
+                'Experiment type',
+                experiment_type_from_filename(f)
+            )
+            data.append(summary)
+    if len(data) == 0:
+        logger.error(
+            'No summaries found in {}'.format(', '.join(build_directories))
+        )
+        return None
+    data = pd.concat(data, ignore_index=True, sort=False)
+    builds = [d.split('/')[-1] for d in build_directories]
+    data['Build'] = pd.Categorical(data['Build'], categories=builds)
+    return data.set_index(['Experiment type', 'Bytes', 'Build']).sort_index()
+
+
+def relative_difference_matrices(data, columns):
+    """
+    Compute the pairwise relative differences between builds.
+
+    For each experiment type and column, the relative difference of a build
+    (row) against another one (column) is the geometric mean, over the
+    payloads measured in both, of the ratio between their values, minus one.
+    So 0.1 means that the row build is 10% slower than the column one.
+
+    :param data: A DataFrame as returned by load_builds().
+    :param columns: The summary columns to compare.
+    :return: A DataFrame with columns 'Experiment type', 'Metric', 'Build',
+        and one column per build, with one matrix per experiment type and
+        column.
+    """
+    builds = list(data.index.levels[2])
+    matrices = []
+    for exp_type, exp_data in data.groupby(level='Experiment type'):
+        for column in columns:
+            # Payloads x builds
+            logs = np.log(
+                exp_data[column].unstack('Build').reindex(
+                    columns=builds
+                ).values.astype(float)
+            )
+            differences = logs[:, :, None] - logs[:, None, :]
+            counts = np.sum(~np.isnan(differences), axis=0)
+            with np.errstate(invalid='ignore'):
+                matrix = np.nansum(differences, axis=0) / counts
+            matrix = pd.DataFrame(np.expm1(matrix), columns=builds)
+            matrix.insert(0, 'Build', builds)
+            matrix.insert(0, 'Metric', column)
+            matrix.insert(0, 'Experiment type', exp_type)
+            matrices.append(matrix)
+    return pd.concat(matrices, ignore_index=True)
+
+
+def rank_builds(data, columns):
+    """
+    Rank the builds by each column, for each experiment type.
+
+    The builds are ranked (1 being the lowest latency) for each payload, and
+    then by their mean rank over the payloads.
+
+    :param data: A DataFrame as returned by load_builds().
+    :param columns: The summary columns to rank by.
+    :return: A DataFrame with columns 'Experiment type', 'Metric', 'Build',
+        'Mean rank', and 'Rank'.
+    """
+    ranks = data[columns].groupby(
+        level=['Experiment type', 'Bytes']
+    ).rank(method='average')
+    ranks = ranks.groupby(level=['Experiment type', 'Build']).mean()
+    ranks = ranks.stack().rename('Mean rank').reset_index()
+    ranks = ranks.rename(columns={ranks.columns[2]: 'Metric'})
+    ranks['Rank'] = ranks.groupby(
+        ['Experiment type', 'Metric']
+    )['Mean rank'].rank(method='min').astype(int)
+    ranks['Metric'] = pd.Categorical(ranks['Metric'], categories=columns)
+    return ranks[
+        ['Experiment type', 'Metric', 'Build', 'Mean rank', 'Rank']
+    ].sort_values(['Experiment type', 'Metric', 'Rank']).reset_index(
+        drop=True
+    )
+
+
+def plot_builds(data, exp_type, columns, plots_directory):
+    """
+    Create a plot with the summaries of all the builds of an experiment type.
+
+    The figure has one panel per column, with the payload in the X-axis, and
+    one data series per build. It is stored as
+    '<plots_directory>/<exp_type>_builds.png'.
+
+    :param data: A DataFrame as returned by load_builds().
+    :param exp_type: The experiment type.
+    :param columns: The summary columns to plot.
+    :param plots_directory: The directory to store the plot.
+    """
+    exp_data = data.xs(exp_type, level='Experiment type')
+    payloads = list(exp_data.index.get_level_values('Bytes').unique())
+    rows = -(-len(columns) // 2)
+    fig, axes = plt.subplots(
+        rows,
+        2,
+        sharex=True,
+        figsize=(12, 4 * rows),
+        squeeze=False
+    )
+    for ax, column in zip(axes.flat, columns):
+        values = exp_data[column].unstack('Build')
+        for build in values.columns:
+            ax.plot(
+                [payloads.index(b) for b in values.index],
+                values[build].values,
+                '.-',
+                label=build
+            )
+        ax.set_title(column)
+        ax.set_ylabel('Latency [us]')
+        ax.grid()
+    for ax in axes[-1]:
+        ax.set_xticks(range(len(payloads)))
+        ax.set_xticklabels(payloads, rotation='vertical')
+        ax.set_xlabel('Payload [Bytes]')
+    axes.flat[0].legend(loc='best', fontsize='small')
+    fig.suptitle('Comparison {}'.format(exp_type))
+    fig_path = '{}/{}_builds.png'.format(plots_directory, exp_type)
+    plt.savefig(fig_path)
+    logger.debug('Generated figure: {}'.format(fig_path))
+    plt.close(fig)
+
+
+def calibrate_thresholds(data, columns, min_threshold):
+    """
+    Estimate comparison thresholds from the noise between A/A runs.
+
+    For each experiment type, payload, and column, the run-to-run noise is
+    estimated as the relative (scaled) median absolute deviation of the
+    values of the runs, which are all expected to be of the same build. The
+    threshold is CALIBRATION_SIGMAS standard deviations of the difference
+    between two runs, and not less than <min_threshold>.
+
+    :param data: A DataFrame as returned by load_builds(), with one "build"
+        per A/A run.
+    :param columns: The summary columns to calibrate.
+    :param min_threshold: The minimum threshold.
+    :return: A DataFrame with columns 'Experiment type', 'Bytes', 'Metric',
+        'Runs', 'Noise', and 'Threshold', with one row per experiment type,
+        payload, and column measured in at least two runs. 'Noise' and
+        'Threshold' are relative to the median, in base 1.
+    """
+    levels = ['Experiment type', 'Bytes']
+    values = data[columns]
+    grouped = values.groupby(level=levels)
+    deviations = (values - grouped.transform('median')).abs()
+    noise = 1.4826 * deviations.groupby(level=levels).median() / (
+        grouped.median()
+    )
+    thresholds = pd.concat(
+        [
+            grouped.count().stack().rename('Runs'),
+            noise.stack().rename('Noise'),
+        ],
+        axis=1
+    )
+    thresholds.index.names = levels + ['Metric']
+    thresholds = thresholds[thresholds['Runs'] >= 2].reset_index()
+    thresholds['Threshold'] = np.maximum(
+        CALIBRATION_SIGMAS * np.sqrt(2) * thresholds['Noise'],
+        min_threshold
+    )
+    return thresholds
+
+
+def load_thresholds(thresholds_file, exp_type):
+    """
+    Load the thresholds of an experiment type from a thresholds file.
+
+    :param thresholds_file: A CSV file as output by calibrate_thresholds().
+    :param exp_type: The experiment type.
+    :return: A dictionary with (payload, metric) tuples as keys, and the
+        thresholds as values.
+    """
+    thresholds = pd.read_csv(thresholds_file)
+    thresholds = thresholds[thresholds['Experiment type'] == exp_type]
+    return {
+        (payload, metric): threshold for payload, metric, threshold in zip(
+            thresholds['Bytes'],
+            thresholds['Metric'],
+            thresholds['Threshold']
+        )
+    }
+
+
 if __name__ == '__main__':
     # Get argument parser
     parser = argparse.ArgumentParser(
@@ -448,14 +913,23 @@ if __name__ == '__main__':
     required.add_argument(
         '-R',
         '--reference',
-        help='The reference directory',
-        required=True
+        help='The reference directory. Not used with --builds',
+        required=False
     )
     required.add_argument(
         '-r',
         '--results',
-        help='The results directory',
-        required=True
+        help='The results directory. Not used with --builds',
+        required=False
+    )
+    optional.add_argument(
+        '-b',
+        '--builds',
+        nargs='+',
+        help="""Compare any number of results directories (one per build)
+                against each other, instead of a result against a
+                reference.""",
+        required=False
     )
     optional.add_argument(
         '-t',
@@ -466,6 +940,51 @@ if __name__ == '__main__':
         default=0.1,
         required=False
     )
+    optional.add_argument(
+        '-s',
+        '--samples',
+        action='store_true',
+        help="""Compare the raw samples (measurements_<type>.csv) instead of
+                the summaries. A comparison fails only if the bootstrap
+                confidence interval of the difference in median, 99
+                percentile, or 99.99 percentile is entirely above the fail
+                threshold.""",
+        required=False
+    )
+    optional.add_argument(
+        '-c',
+        '--confidence',
+        help='The confidence of the intervals of the samples comparison.',
+        type=float,
+        default=0.95,
+        required=False
+    )
+    optional.add_argument(
+        '-a',
+        '--calibrate',
+        help="""A directory with A/A results directories (several runs of the
+                same build) to estimate the run-to-run noise of each
+                experiment type, payload, and magnitude from. The derived
+                thresholds are written to --thresholds (or
+                <plots_directory>/thresholds.csv), and no comparison is
+                performed.""",
+        required=False
+    )
+    optional.add_argument(
+        '-T',
+        '--thresholds',
+        help="""A thresholds CSV file as output by --calibrate. Its thresholds
+                are used instead of --fail_threshold for the entries it
+                has.""",
+        required=False
+    )
+    optional.add_argument(
+        '--min_threshold',
+        help='The minimum threshold derived by --calibrate.',
+        type=float,
+        default=0.02,
+        required=False
+    )
     optional.add_argument(
         '-P',
         '--print_summaries',
@@ -483,12 +1002,37 @@ if __name__ == '__main__':
     args = parser.parse_args()
     # Validate arguments
     plots_directory = args.plots_directory
-    reference = args.reference
-    reference = reference[:-1] if reference.endswith('/') else reference
-    results = args.results
-    results = results[:-1] if results.endswith('/') else results
+    if args.calibrate is not None:
+        if (
+            args.builds is not None or args.reference is not None or
+            args.results is not None
+        ):
+            parser.error('--calibrate cannot be used with other comparisons')
+        if not isdir(args.calibrate):
+            parser.error('Cannot find {}'.format(args.calibrate))
+    elif args.builds is not None:
+        if args.reference is not None or args.results is not None:
+            parser.error('--builds cannot be used with --reference/--results')
+        builds = [b[:-1] if b.endswith('/') else b for b in args.builds]
+        if len(set(b.split('/')[-1] for b in builds)) != len(builds):
+            parser.error('The --builds directories must have different names')
+    elif args.reference is None or args.results is None:
+        parser.error('--reference and --results are required')
+    else:
+        reference = args.reference
+        reference = reference[:-1] if reference.endswith('/') else reference
+        results = args.results
+        results = results[:-1] if results.endswith('/') else results
     print_summaries = args.print_summaries
     fail_threshold = float(args.fail_threshold)
+    if not 0 < args.confidence < 1:
+        parser.error('--confidence must be in (0, 1)')
+    random_state = np.random.RandomState(0)
+    if (
+        args.calibrate is None and args.thresholds is not None and
+        not isfile(args.thresholds)
+    ):
+        parser.error('Cannot find {}'.format(args.thresholds))
 
     # Create a custom logger
     logger = logging.getLogger('LATENCY_COMPARISON')
@@ -506,6 +1050,85 @@ if __name__ == '__main__':
     else:
         logger.setLevel(logging.INFO)
 
+    # Derive the thresholds from the A/A runs
+    if args.calibrate is not None:
+        calibration = args.calibrate
+        if calibration.endswith('/'):
+            calibration = calibration[:-1]
+        runs = sorted(
+            [
+                '{}/{}'.format(calibration, d) for d in listdir(calibration)
+                if isdir('{}/{}'.format(calibration, d))
+            ]
+        )
+        runs_data = load_builds(runs)
+        if runs_data is None:
+            exit(1)
+        thresholds = calibrate_thresholds(
+            runs_data,
+            [
+                c for c in ['Min', 'Median', 'Max', '99%', '99.99%']
+                if c in runs_data
+            ],
+            args.min_threshold
+        )
+        thresholds_file = args.thresholds
+        if thresholds_file is None:
+            thresholds_file = '{}/thresholds.csv'.format(plots_directory)
+        thresholds.to_csv(thresholds_file, float_format='%.4f', index=False)
+        logger.info(
+            'Thresholds from {} runs written to {}'.format(
+                len(runs),
+                thresholds_file
+            )
+        )
+        logger.info(
+            'Median threshold per magnitude:\n{}'.format(
+                thresholds.groupby('Metric', sort=False)['Threshold'].median()
+            )
+        )
+        exit(0)
+
+    # Compare all the builds against each other
+    if args.builds is not None:
+        columns = ['Min', 'Median', '99%', 'Max']
+        builds_data = load_builds(builds)
+        if builds_data is None:
+            exit(1)
+        csv_name = '{}/builds_summary.csv'.format(plots_directory)
+        builds_data.reset_index().to_csv(
+            csv_name,
+            float_format='%.3f',
+            index=False
+        )
+        logger.debug('Generated CSV: {}'.format(csv_name))
+        csv_name = '{}/builds_matrices.csv'.format(plots_directory)
+        relative_difference_matrices(builds_data, columns).to_csv(
+            csv_name,
+            float_format='%.4f',
+            index=False
+        )
+        logger.debug('Generated CSV: {}'.format(csv_name))
+        ranks = rank_builds(builds_data, columns)
+        csv_name = '{}/builds_ranks.csv'.format(plots_directory)
+        ranks.to_csv(csv_name, float_format='%.3f', index=False)
+        logger.debug('Generated CSV: {}'.format(csv_name))
+        for exp_type in builds_data.index.get_level_values(
+            'Experiment type'
+        ).unique():
+            plot_builds(builds_data, exp_type, columns, plots_directory)
+            logger.info(
+                'Ranking for {}:\n{}'.format(
+                    exp_type,
+                    ranks[ranks['Experiment type'] == exp_type].pivot(
+                        index='Build',
+                        columns='Metric',
+                        values='Rank'
+                    )
+                )
+            )
+        exit(0)
+
     # Get list of summary files in reference and results directories
     reference_files = [f for f in listdir(reference) if 'summary' in f]
     results_files = [f for f in listdir(results) if 'summary' in f]
@@ -533,6 +1156,13 @@ if __name__ == '__main__':
                 'No reference file found for {}. Skipping'.format(result)
             )
             continue
+        # Get the calibrated thresholds of the experiment type
+        thresholds = None
+        if args.thresholds is not None:
+            thresholds = load_thresholds(
+                args.thresholds,
+                experiment_type_from_filename(result)
+            )
         # Compare a plot experiment for latency minima, meadian, maxima, and
         # 99 percentile.
         comp_result, comp_dfs, summaries_data = compare_and_plot(
@@ -542,7 +1172,8 @@ if __name__ == '__main__':
             columns=['Min', 'Median', 'Max', '99%'],
             reference_label='Reference: {}'.format(reference.split('/')[-1]),
             result_label='Result: {}'.format(results.split('/')[-1]),
-            fail_threshold=fail_threshold
+            fail_threshold=fail_threshold,
+            thresholds=thresholds
         )
         # Save comparison summary CSV in the plots directory
         csv_name = '{}/{}_comparison.csv'.format(
@@ -552,6 +1183,34 @@ if __name__ == '__main__':
         summaries_data.to_csv(csv_name, float_format='%.3f', index=False)
         logger.debug('Generated CSV: {}'.format(csv_name))
 
+        # Compare the samples, which replaces the verdict of the summaries
+        samples_df = None
+        if args.samples is True:
+            samples_name = result.replace('_summary.csv', '.csv')
+            reference_samples = '{}/{}'.format(reference, samples_name)
+            result_samples = '{}/{}'.format(results, samples_name)
+            if not all(
+                isfile(f) or isfile(samples_store_files(f)[0])
+                for f in [reference_samples, result_samples]
+            ):
+                logger.error('No samples found for {}'.format(result))
+                comp_result = False
+            else:
+                comp_result, samples_df = compare_samples(
+                    reference=reference_samples,
+                    result=result_samples,
+                    fail_threshold=fail_threshold,
+                    confidence=args.confidence,
+                    random_state=random_state,
+                    thresholds=thresholds
+                )
+                csv_name = '{}/{}_samples_comparison.csv'.format(
+                    plots_directory,
+                    experiment_type_from_filename(result)
+                )
+                samples_df.to_csv(csv_name, float_format='%.6g', index=False)
+                logger.debug('Generated CSV: {}'.format(csv_name))
+
         # Check exit code
         if comp_result is True:
             logger.info('Comparison for {} PASSED'.format(result))
@@ -560,6 +1219,25 @@ if __name__ == '__main__':
             failed_comparisons.append(result)
             logger.error('Comparison for {} FAILED'.format(result))
 
+        # Log the intervals of the samples comparison
+        if samples_df is not None:
+            for _, row in samples_df.iterrows():
+                log = logger.error
+                if row['Comparison'] == 'passed':
+                    log = logger.debug
+                log(
+                    '   {} Bytes {}: {:+.3f} us, {:g}% interval '
+                    '[{:+.3f}, {:+.3f}] us, threshold {:+.3f} us'.format(
+                        row['Bytes'],
+                        row['Statistic'],
+                        row['Difference [us]'],
+                        args.confidence * 100,
+                        row['Lower bound [us]'],
+                        row['Upper bound [us]'],
+                        row['Fail threshold'] * row['Reference [us]']
+                    )
+                )
+
         # Print if necessary
         if print_summaries is True or args.debug:
             logger.info('{} summary:\n{}'.format(result, summaries_data))
@@ -0,0 +1,563 @@
+# Copyright 2019 Proyectos y Sistemas de Mantenimiento SL (eProsima).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""."""
+import argparse
+from os import listdir
+from os import makedirs
+from os.path import isdir
+from os.path import isfile
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import numpy as np
+
+import pandas
+
+# Payloads [Bytes] at which the latency cost per byte is expected to change:
+# the UDP payload of an Ethernet frame (IP fragmentation), the memory page,
+# the L1 data cache, and the Fast-RTPS default maximum message size (RTPS
+# fragmentation).
+DEFAULT_BREAKPOINTS = [1472, 4096, 32768, 65000]
+# Summary columns for which a cost model is fitted
+MODEL_COLUMNS = ['Median', '99%', 'Max']
+# Summary columns checked for regressions. The maxima are left out, as they
+# are too noisy to tell a fixed overhead from a per-byte cost.
+REGRESSION_COLUMNS = ['Median', '99%']
+# Exit code bits for each kind of regression
+FIXED_OVERHEAD_REGRESSION = 1
+PER_BYTE_COST_REGRESSION = 2
+
+
+def directory_type(directory):
+    """
+    Check whether the argument is a directory.
+
+    :param directory: The directory path.
+    :return: The directory path without ending /.
+    Exit if the directory cannot be found.
+    """
+    if directory.endswith('/'):
+        directory = directory[:-1]
+    if not isdir(directory):
+        print('Cannot find {}'.format(directory))
+        exit(1)
+    return directory
+
+
+def experiment_type(filename):
+    """
+    Get experiment type of a summary file based on its name.
+
+    Get experiment type of a summary file based on its name (as output by
+    "latency_process_results.py).
+
+    :param filename: The name of the summary file.
+    :raise: AssertionError if filename is not a string.
+    :return: The experiment type as a string.
+    """
+    assert(isinstance(filename, str))
+    exp_type = filename.split('/')[-1].split('.')[-2].split('_')[1:-1]
+    exp_type = '_'.join(exp_type)
+    return exp_type
+
+
+def payload_segments(payloads, breakpoints):
+    """
+    Split a payload sweep in segments at a set of breakpoints.
+
+    Each segment covers the payloads in (lower, upper]. The first segment
+    starts at 0 and the last one ends at infinity, so any payload belongs to a
+    segment. Segments with less than two measured payloads (which cannot be
+    fitted) are merged with the previous one.
+
+    :param payloads: The measured payloads.
+    :param breakpoints: The payloads at which a segment ends.
+    :return: A list of [lower, upper, number of measured payloads] segments.
+    """
+    payloads = np.unique(payloads)
+    bounds = [0] + sorted(breakpoints) + [np.inf]
+    segments = []
+    for lower, upper in zip(bounds[:-1], bounds[1:]):
+        count = np.count_nonzero((payloads > lower) & (payloads <= upper))
+        if len(segments) > 0 and (count < 2 or segments[-1][2] < 2):
+            segments[-1][1] = upper
+            segments[-1][2] += count
+        else:
+            segments.append([lower, upper, count])
+    return segments
+
+
+def fit_cost_model(summary, breakpoints, columns=MODEL_COLUMNS):
+    """
+    Fit a piecewise fixed overhead plus per-byte cost model to a summary.
+
+    For each column and payload segment (see payload_segments()), the latency
+    is fitted by least squares to 'Fixed overhead' + 'Per-byte cost' * payload.
+
+    :param summary: A summary DataFrame as output by
+        "latency_process_results.py".
+    :param breakpoints: The payloads at which a segment ends.
+    :param columns: The summary columns to fit.
+    :return: A DataFrame with columns 'Statistic', 'Lower [Bytes]',
+        'Upper [Bytes]', 'Payloads', 'Last payload [Bytes]',
+        'Fixed overhead [us]', and 'Per-byte cost [ns/Byte]', with one row per
+        column and segment. The per-byte cost of a segment with only one
+        payload is NaN.
+    """
+    rows = []
+    for column in columns:
+        for lower, upper, count in payload_segments(
+            summary['Bytes'],
+            breakpoints
+        ):
+            segment = summary[
+                (summary['Bytes'] > lower) & (summary['Bytes'] <= upper)
+            ]
+            if count < 2:
+                per_byte = np.nan
+                fixed = segment[column].mean()
+            else:
+                per_byte, fixed = np.polyfit(
+                    segment['Bytes'].astype(float),
+                    segment[column].astype(float),
+                    1
+                )
+            rows.append(
+                [
+                    column,
+                    lower,
+                    upper,
+                    count,
+                    segment['Bytes'].max(),
+                    fixed,
+                    per_byte * 1000,
+                ]
+            )
+    return pandas.DataFrame(
+        rows,
+        columns=[
+            'Statistic',
+            'Lower [Bytes]',
+            'Upper [Bytes]',
+            'Payloads',
+            'Last payload [Bytes]',
+            'Fixed overhead [us]',
+            'Per-byte cost [ns/Byte]',
+        ]
+    )
+
+
+def model_latencies(model, column, payloads):
+    """
+    Evaluate a cost model at a set of payloads.
+
+    :param model: A DataFrame as returned by fit_cost_model().
+    :param column: The statistic to evaluate.
+    :param payloads: The payloads.
+    :return: A numpy array with the modelled latencies [us].
+    """
+    coefficients = model[model['Statistic'] == column]
+    payloads = np.asarray(payloads, dtype=float)
+    # Segments are sorted and contiguous, so the segment of a payload is the
+    # first one which upper bound is not below it.
+    index = np.searchsorted(
+        coefficients['Upper [Bytes]'].values.astype(float),
+        payloads
+    )
+    index = np.minimum(index, len(coefficients) - 1)
+    fixed = coefficients['Fixed overhead [us]'].values[index]
+    per_byte = np.nan_to_num(
+        coefficients['Per-byte cost [ns/Byte]'].values[index]
+    )
+    return fixed + per_byte / 1000 * payloads
+
+
+def compare_models(reference, result, columns, fail_threshold):
+    """
+    Compare the cost models of two executions.
+
+    The fixed overhead and the per-byte cost of each segment are checked
+    separately. The difference of each coefficient is expressed as the
+    latency increase [us] it causes at the last measured payload of the
+    segment, and it is a regression if it exceeds <fail_threshold> times the
+    reference latency at that payload.
+
+    :param reference: A DataFrame as returned by fit_cost_model(), with an
+        additional 'Experiment type' column.
+    :param result: A DataFrame as returned by fit_cost_model(), with an
+        additional 'Experiment type' column.
+    :param columns: The statistics to compare.
+    :param fail_threshold: The limit over the reference, in base 1.
+    :return: A DataFrame with columns 'Experiment type', 'Statistic',
+        'Lower [Bytes]', 'Upper [Bytes]', 'Coefficient', 'Reference',
+        'Result', 'Difference [us]', and 'Status', with one row per
+        coefficient of every segment present in both models.
+    """
+    keys = ['Experiment type', 'Statistic', 'Lower [Bytes]', 'Upper [Bytes]']
+    data = pandas.merge(
+        reference[reference['Statistic'].isin(columns)],
+        result,
+        on=keys,
+        suffixes=(' reference', ' result')
+    )
+    last = data['Last payload [Bytes] result'].astype(float)
+    reference_latency = (
+        data['Fixed overhead [us] reference'] +
+        data['Per-byte cost [ns/Byte] reference'].fillna(0) / 1000 * last
+    )
+
+    comparisons = []
+    for coefficient, scale in [
+        ('Fixed overhead [us]', 1),
+        ('Per-byte cost [ns/Byte]', last / 1000),
+    ]:
+        comparison = data[keys].copy()
+        comparison['Coefficient'] = coefficient
+        comparison['Reference'] = data['{} reference'.format(coefficient)]
+        comparison['Result'] = data['{} result'.format(coefficient)]
+        comparison['Difference [us]'] = (
+            comparison['Result'] - comparison['Reference']
+        ) * scale
+        comparison['Status'] = np.where(
+            comparison['Difference [us]'] > fail_threshold * reference_latency,
+            'failed',
+            'passed'
+        )
+        comparisons.append(comparison)
+    return pandas.concat(comparisons, ignore_index=True).sort_values(
+        keys,
+        kind='mergesort'
+    ).reset_index(drop=True)
+
+
+def interpolate_requirements(requirements, payloads, breakpoints):
+    """
+    Derive requirements for payloads that were not measured.
+
+    For each experiment type, a cost model is fitted to the requirements
+    curve, and evaluated at the payloads of <payloads> which do not have a
+    requirement yet.
+
+    :param requirements: A requirements DataFrame as output by
+        "latency_determine_requirements.py".
+    :param payloads: The payloads to derive requirements for.
+    :param breakpoints: The payloads at which a model segment ends.
+    :return: A DataFrame with the requirements of <requirements> and the
+        interpolated ones, sorted by payload within each experiment type.
+    """
+    columns = [c for c in MODEL_COLUMNS if c in requirements]
+    types_requirements = []
+    for exp_type, reqs in requirements.groupby(
+        'Experiment type',
+        sort=False
+    ):
+        new_payloads = np.setdiff1d(payloads, reqs['Bytes'].values)
+        outside = new_payloads[
+            (new_payloads < reqs['Bytes'].min()) |
+            (new_payloads > reqs['Bytes'].max())
+        ]
+        if len(outside) > 0:
+            print(
+                'Extrapolating {} requirements for payloads {}'.format(
+                    exp_type,
+                    outside.tolist()
+                )
+            )
+        model = fit_cost_model(reqs, breakpoints, columns)
+        new_reqs = pandas.DataFrame(
+            {
+                'Experiment type': exp_type,
+                'Bytes': new_payloads,
+            }
+        )
+        for column in columns:
+            new_reqs[column] = model_latencies(model, column, new_payloads)
+        types_requirements.append(
+            pandas.concat(
+                [reqs, new_reqs],
+                ignore_index=True,
+                sort=False
+            ).sort_values('Bytes')
+        )
+    return pandas.concat(types_requirements, ignore_index=True)
+
+
+def plot_model_history(models, exp_type, column, plots_directory):
+    """
+    Plot the history of the cost model coefficients of an experiment type.
+
+    The figure has a fixed overhead and a per-byte cost panel, with the
+    executions in the X-axis and one data series per payload segment. It is
+    stored as '<plots_directory>/<exp_type>/model_<column>.png'.
+
+    :param models: A DataFrame with the models of all the executions, as
+        returned by fit_cost_model() and expanded with the 'Execution' and
+        'Experiment type' columns.
+    :param exp_type: The experiment type.
+    :param column: The statistic which model is plotted.
+    :param plots_directory: The directory to store the plots.
+    """
+    data = models[
+        (models['Experiment type'] == exp_type) &
+        (models['Statistic'] == column)
+    ]
+    executions = list(data['Execution'].unique())
+    fig, axes = plt.subplots(2, 1, sharex=True)
+    for (lower, upper), grp in data.groupby(
+        ['Lower [Bytes]', 'Upper [Bytes]']
+    ):
+        x = [executions.index(e) for e in grp['Execution']]
+        label = '({:g}, {:g}] Bytes'.format(lower, upper)
+        axes[0].plot(x, grp['Fixed overhead [us]'], '.-', label=label)
+        axes[1].plot(x, grp['Per-byte cost [ns/Byte]'], '.-', label=label)
+    axes[0].set_ylabel('Fixed overhead [us]')
+    axes[1].set_ylabel('Per-byte cost [ns/Byte]')
+    for ax in axes:
+        ax.grid()
+    axes[0].legend(loc='best', fontsize='small')
+    axes[1].set_xticks(range(len(executions)))
+    axes[1].set_xticklabels(executions, rotation='vertical')
+    plt.xlabel('Execution')
+    axes[0].set_title('Cost model history {} {}'.format(exp_type, column))
+
+    save_directory = '{}/{}'.format(plots_directory, exp_type)
+    if not isdir(save_directory):
+        makedirs(save_directory)
+    plt.savefig(
+        '{}/model_{}.png'.format(save_directory, column.replace('%', '')),
+        bbox_inches='tight'
+    )
+    plt.close(fig)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="""
+            Script to model how latency grows with the payload. For each
+            execution in <experiments_results> and experiment type, the script
+            fits a piecewise fixed overhead plus per-byte cost model to the
+            median, 99 percentile, and maximum of the summaries output by
+            'latency_process_results.py', with segments ending at
+            <breakpoints>, and stores the coefficients next to the summaries
+            ('<name>_model.csv'). The models of the last execution are compared
+            against the ones of a reference execution, reporting fixed
+            overhead and per-byte cost regressions separately. The exit code
+            is 0 if there are no regressions, and the sum of 1 (fixed overhead
+            regression) and 2 (per-byte cost regression) otherwise.
+            Optionally, the history of the coefficients is plotted, and
+            requirements are interpolated for payloads that were not measured.
+        """
+    )
+    parser.add_argument(
+        '-e',
+        '--experiments_results',
+        help='The directory containing the results of all the experiments',
+        type=directory_type,
+        required=True
+    )
+    parser.add_argument(
+        '-b',
+        '--breakpoints',
+        help='The payloads [Bytes] at which a model segment ends',
+        type=int,
+        nargs='+',
+        required=False,
+        default=DEFAULT_BREAKPOINTS
+    )
+    parser.add_argument(
+        '--reference',
+        help="""The execution to compare the last one against. Defaults to
+                the execution before the last one""",
+        required=False
+    )
+    parser.add_argument(
+        '-f',
+        '--fail_threshold',
+        help="""The latency increase at the last payload of a segment caused
+                by a single coefficient, relative to the reference latency,
+                above which the coefficient is a regression""",
+        type=float,
+        required=False,
+        default=0.1
+    )
+    parser.add_argument(
+        '-c',
+        '--comparison_file',
+        help='A file to write the comparison of the models',
+        required=False,
+        default='latency_model_comparison.csv'
+    )
+    parser.add_argument(
+        '-p',
+        '--plots_directory',
+        help='The directory to store the history plots of the coefficients',
+        required=False
+    )
+    parser.add_argument(
+        '-r',
+        '--requirements',
+        help='A requirements CSV file to interpolate requirements from',
+        required=False
+    )
+    parser.add_argument(
+        '--payloads',
+        help='The payloads [Bytes] to interpolate requirements for',
+        type=int,
+        nargs='+',
+        required=False
+    )
+    parser.add_argument(
+        '-o',
+        '--output_file',
+        help='A file to write the interpolated requirements',
+        required=False,
+        default='latency_requirements_interpolated.csv'
+    )
+    args = parser.parse_args()
+    experiments = args.experiments_results
+    breakpoints = args.breakpoints
+
+    if (args.requirements is None) != (args.payloads is None):
+        parser.error('--requirements and --payloads must be used together')
+    if args.requirements is not None and not isfile(args.requirements):
+        parser.error('Cannot find {}'.format(args.requirements))
+
+    # Get path of result directories
+    executions = sorted(
+        [d for d in listdir(experiments) if isdir(
+            '{}/{}'.format(experiments, d)
+        )]
+    )
+
+    # Fit and store the models of every execution and experiment type
+    models = []
+    for execution in executions:
+        results_dir = '{}/{}'.format(experiments, execution)
+        summaries = sorted(
+            [f for f in listdir(results_dir) if f.endswith('_summary.csv')]
+        )
+        for f in summaries:
+            model = fit_cost_model(
+                pandas.read_csv('{}/{}'.format(results_dir, f)),
+                breakpoints
+            )
+            model_file = '{}/{}_model.csv'.format(
+                results_dir,
+                f[:-len('_summary.csv')]
+            )
+            print('Generating {}'.format(model_file))
+            model.to_csv(model_file, float_format='%.6g', index=False)
+            model.insert(0, 'Experiment type', experiment_type(f))
+            model.insert(0, 'Execution', execution)
+            models.append(model)
+
+    if len(models) == 0:
+        print('No summaries found in {}'.format(experiments))
+        exit(1)
+    models = pandas.concat(models, ignore_index=True)
+
+    # Plot the history of the coefficients
+    if args.plots_directory is not None:
+        for exp_type in models['Experiment type'].unique():
+            for column in MODEL_COLUMNS:
+                print(
+                    'Plotting cost model history of {} {}'.format(
+                        exp_type,
+                        column
+                    )
+                )
+                plot_model_history(
+                    models,
+                    exp_type,
+                    column,
+                    args.plots_directory
+                )
+
+    # Interpolate requirements
+    if args.requirements is not None:
+        requirements = interpolate_requirements(
+            pandas.read_csv(args.requirements),
+            args.payloads,
+            breakpoints
+        )
+        requirements.to_csv(
+            args.output_file,
+            float_format='%.3f',
+            index=False
+        )
+        print(
+            'Interpolated requirements written to {}'.format(
+                args.output_file
+            )
+        )
+
+    # Compare the last execution against the reference
+    exit_code = 0
+    result = executions[-1]
+    reference = args.reference
+    if reference is None and len(executions) > 1:
+        reference = executions[-2]
+    if reference is None:
+        print('Only one execution found. Models are not compared')
+    elif reference not in executions:
+        print('Cannot find execution {}'.format(reference))
+        exit(1)
+    else:
+        comparison = compare_models(
+            models[models['Execution'] == reference].drop(
+                columns='Execution'
+            ),
+            models[models['Execution'] == result].drop(columns='Execution'),
+            REGRESSION_COLUMNS,
+            args.fail_threshold
+        )
+        comparison.to_csv(
+            args.comparison_file,
+            float_format='%.6g',
+            index=False
+        )
+        for coefficient, code in [
+            ('Fixed overhead [us]', FIXED_OVERHEAD_REGRESSION),
+            ('Per-byte cost [ns/Byte]', PER_BYTE_COST_REGRESSION),
+        ]:
+            failed = comparison[
+                (comparison['Coefficient'] == coefficient) &
+                (comparison['Status'] == 'failed')
+            ]
+            print(
+                '{} regressions of {} against {}: {}'.format(
+                    coefficient.split(' [')[0],
+                    result,
+                    reference,
+                    len(failed)
+                )
+            )
+            for _, row in failed.iterrows():
+                print(
+                    '    {} {} ({:g}, {:g}] Bytes: {:.6g} -> {:.6g}'.format(
+                        row['Experiment type'],
+                        row['Statistic'],
+                        row['Lower [Bytes]'],
+                        row['Upper [Bytes]'],
+                        row['Reference'],
+                        row['Result']
+                    )
+                )
+            if len(failed) > 0:
+                exit_code += code
+    exit(exit_code)
@@ -15,13 +15,21 @@
 """."""
 import argparse
 from os import listdir
+from os import remove
 from os.path import isdir
 from os.path import isfile
 
+from latency_process_results import histogram_sketches
+from latency_process_results import merge_sketches
+from latency_process_results import sketch_quantiles
+
 import numpy as np
 
 import pandas
 
+# Number of resamples of the bootstrap tolerance bounds
+BOOTSTRAP_RESAMPLES = 2000
+
 
 def directory_type(directory):
     """
@@ -56,6 +64,367 @@ def experiment_type(filename):
     return exp_type
 
 
+def pooled_requirements(results_dirs, experiment_types, req_percentiles):
+    """
+    Derive requirements from the pooled samples of all the experiments.
+
+    The log-binned histograms stored next to the summaries by
+    "latency_process_results.py" ('<name>_histogram.csv') of every experiment
+    are merged by experiment type and payload, so each requirement is a
+    percentile over all the samples of all the experiments, with the relative
+    accuracy of the histograms. The raw measurements are not read.
+
+    :param results_dirs: The list of experiment results directories.
+    :param experiment_types: The list of supported experiment types.
+    :param req_percentiles: A dictionary with the requirement columns as keys,
+        and the pooled percentile used to derive each of them as values.
+    :raise: AssertionError if the histograms of the experiments do not have
+        the same relative accuracy.
+    :return: A DataFrame with columns 'Experiment type', 'Bytes', and one
+        column per requirement, or None if an experiment type is not
+        supported or an experiment has no histograms.
+    """
+    sketches = {}
+    accuracy = None
+    for results_dir in results_dirs:
+        histogram_files = sorted(
+            [
+                f for f in listdir(results_dir)
+                if isfile('{}/{}'.format(results_dir, f))
+                and f.endswith('_histogram.csv')
+            ]
+        )
+        if len(histogram_files) == 0:
+            print(
+                'No histograms found in {}. Process it again with '
+                'latency_process_results.py'.format(results_dir)
+            )
+            return None
+
+        for f in histogram_files:
+            exp_type = experiment_type(f)
+            if exp_type not in experiment_types:
+                print(
+                    'Experiment {} found in {} is NOT supported'.format(
+                        exp_type,
+                        results_dir
+                    )
+                )
+                return None
+            file_sketches, file_accuracy = histogram_sketches(
+                pandas.read_csv('{}/{}'.format(results_dir, f))
+            )
+            if len(file_sketches) == 0:
+                continue
+            if accuracy is None:
+                accuracy = file_accuracy
+            assert(np.isclose(accuracy, file_accuracy, rtol=1e-6))
+            for payload, sketch in file_sketches.items():
+                key = (exp_type, payload)
+                if key in sketches:
+                    sketches[key] = merge_sketches(sketches[key], sketch)
+                else:
+                    sketches[key] = sketch
+
+    columns = list(req_percentiles)
+    rows = []
+    for (exp_type, payload), sketch in sorted(sketches.items()):
+        rows.append(
+            [exp_type, payload] + list(
+                sketch_quantiles(
+                    sketch,
+                    [req_percentiles[c] for c in columns],
+                    accuracy
+                )
+            )
+        )
+    return pandas.DataFrame(
+        rows,
+        columns=['Experiment type', 'Bytes'] + columns
+    )
+
+
+def load_summaries(results_dirs, experiment_types):
+    """
+    Load the summaries of a set of experiment results directories.
+
+    :param results_dirs: The list of experiment results directories.
+    :param experiment_types: The list of supported experiment types.
+    :return: A DataFrame with the entries of all the summaries, expanded with
+        an "Experiment" column containing the directory name of the
+        experiment results, and an "Experiment type" column. None if an
+        experiment type is not supported.
+    """
+    file_data = []
+    for results_dir in results_dirs:
+        # Get path of summary files
+        results_files = sorted(
+            [
+                '{}/{}'.format(
+                    results_dir,
+                    f
+                ) for f in listdir(results_dir) if isfile(
+                    '{}/{}'.format(
+                        results_dir,
+                        f
+                    )
+                ) and 'summary' in f
+            ]
+        )
+
+        # Iterate over the summaries
+        for f in results_files:
+            # Get experiment type
+            exp_type = experiment_type(f)
+            # Check that supported
+            if exp_type not in experiment_types:
+                print(
+                    'Experiment {} found in {} is NOT supported'.format(
+                        exp_type,
+                        results_dir
+                    )
+                )
+                return None
+
+            # Load data as DataFrame
+            data = pandas.read_csv(f)
+            data.insert(0, 'Experiment type', exp_type)
+            data.insert(0, 'Experiment', results_dir.split('/')[-1])
+            file_data.append(data)
+
+    if len(file_data) == 0:
+        return pandas.DataFrame(columns=['Experiment', 'Experiment type'])
+    return pandas.concat(file_data, ignore_index=True, sort=False)
+
+
+def derive_requirements(data, req_columns):
+    """
+    Derive requirements for each experiment type and payload.
+
+    :param data: A DataFrame with at least the columns "Experiment type",
+        "Bytes", and the ones of <req_columns>, as returned by
+        load_summaries().
+    :param req_columns: A dictionary with the requirement columns as keys,
+        and the percentile of the summary values used to derive each of them
+        as values.
+    :return: A DataFrame with columns 'Experiment type', 'Bytes', and one
+        column per requirement, with the experiment types and payloads in
+        order of appearance in <data>.
+    """
+    grouped = data.groupby(['Experiment type', 'Bytes'], sort=False)
+    requirements = pandas.DataFrame(
+        {
+            c: grouped[c].quantile(req_columns[c] / 100)
+            for c in req_columns
+        }
+    )
+    return requirements.reset_index()[
+        ['Experiment type', 'Bytes'] + list(req_columns)
+    ]
+
+
+def binomial_cdf(n, p):
+    """
+    Compute the cumulative distribution function of a binomial distribution.
+
+    :param n: The number of trials.
+    :param p: The success probability, in (0, 1).
+    :return: A numpy array with the probability of at most k successes, for k
+        in 0, ..., n.
+    """
+    k = np.arange(1, n + 1)
+    log_combinations = np.concatenate(
+        ([0], np.cumsum(np.log((n - k + 1) / k)))
+    )
+    k = np.arange(n + 1)
+    return np.cumsum(
+        np.exp(log_combinations + k * np.log(p) + (n - k) * np.log1p(-p))
+    )
+
+
+def tolerance_bound(
+    values,
+    coverage,
+    confidence,
+    upper,
+    method,
+    random_state
+):
+    """
+    Compute a one-sided tolerance bound of a set of values.
+
+    The bound is expected to be above (or below if not <upper>) <coverage> of
+    the population the values are drawn from, with probability <confidence>.
+    With the 'nonparametric' method, the bound is the order statistic with the
+    lowest rank that reaches <confidence> (distribution-free), or the extreme
+    value if there are not enough values for that. With the 'bootstrap'
+    method, the bound is the <confidence> percentile of the bootstrap
+    distribution of the <coverage> percentile.
+    In both cases, the confidence actually reached is the distribution-free
+    confidence of the highest (lowest if not <upper>) value not beyond the
+    bound.
+
+    :param values: A numpy array with the values.
+    :param coverage: The fraction of the population to bound, in (0, 1).
+    :param confidence: The target confidence, in (0, 1).
+    :param upper: Whether the bound is an upper bound.
+    :param method: Either 'nonparametric' or 'bootstrap'.
+    :param random_state: A numpy RandomState for the bootstrap resamples.
+    :return: The bound (NaN if there are no values).
+    :return: The confidence reached by the bound (0 if there are no values).
+    """
+    values = np.sort(values)
+    n = len(values)
+    if n == 0:
+        return np.nan, 0.0
+    cdf = binomial_cdf(n, coverage)
+    if method == 'bootstrap':
+        resamples = values[
+            random_state.randint(0, n, (BOOTSTRAP_RESAMPLES, n))
+        ]
+        if upper is True:
+            quantiles = np.percentile(resamples, coverage * 100, axis=1)
+            bound = np.percentile(quantiles, confidence * 100)
+            rank = np.searchsorted(values, bound, side='right')
+        else:
+            quantiles = np.percentile(resamples, (1 - coverage) * 100, axis=1)
+            bound = np.percentile(quantiles, (1 - confidence) * 100)
+            rank = n - np.searchsorted(values, bound, side='left')
+    else:
+        rank = min(np.searchsorted(cdf[:n], confidence) + 1, n)
+        bound = values[rank - 1] if upper is True else values[n - rank]
+    return bound, cdf[rank - 1]
+
+
+def tolerance_requirements(
+    data,
+    req_bounds,
+    coverage,
+    confidence,
+    method,
+    random_state
+):
+    """
+    Derive requirements as tolerance bounds of the summary values.
+
+    :param data: A DataFrame with at least the columns "Experiment type",
+        "Bytes", and the ones of <req_bounds>, as returned by
+        load_summaries().
+    :param req_bounds: A dictionary with the requirement columns as keys, and
+        whether the requirement is an upper bound as values.
+    :param coverage: The fraction of the runs each requirement must bound.
+    :param confidence: The target confidence.
+    :param method: Either 'nonparametric' or 'bootstrap'.
+    :param random_state: A numpy RandomState for the bootstrap resamples.
+    :return: A DataFrame with columns 'Experiment type', 'Bytes', and one
+        column per requirement.
+    :return: A DataFrame with columns 'Experiment type', 'Bytes',
+        'Requirement', 'Runs', 'Confidence', and 'Additional runs needed',
+        with one row per requirement. The additional runs needed are the ones
+        for the extreme value to reach the target confidence
+        distribution-free.
+    """
+    keys = ['Experiment type', 'Bytes']
+    runs_needed = int(np.ceil(np.log1p(-confidence) / np.log(coverage)))
+    requirements = []
+    report = []
+    for key, grp in data.groupby(keys, sort=False):
+        payload_reqs = list(key)
+        for column, upper in req_bounds.items():
+            values = grp[column].dropna().values
+            bound, reached = tolerance_bound(
+                values,
+                coverage,
+                confidence,
+                upper,
+                method,
+                random_state
+            )
+            payload_reqs.append(bound)
+            report.append(
+                list(key) + [
+                    column,
+                    len(values),
+                    reached,
+                    max(runs_needed - len(values), 0),
+                ]
+            )
+        requirements.append(payload_reqs)
+    requirements = pandas.DataFrame(
+        requirements,
+        columns=keys + list(req_bounds)
+    )
+    report = pandas.DataFrame(
+        report,
+        columns=keys + [
+            'Requirement',
+            'Runs',
+            'Confidence',
+            'Additional runs needed',
+        ]
+    )
+    return requirements, report
+
+
+def update_state(state_file, results_dirs, experiment_types, columns):
+    """
+    Update the state of an incremental requirements derivation.
+
+    The state file keeps the summary values needed to derive the requirements
+    of every experiment already consumed, one row per experiment and payload,
+    so only the summaries of the experiments that are not in it yet are read.
+    The percentiles over the experiments are not mergeable, so the state grows
+    with the number of experiments. The entries of experiments that are not in
+    <results_dirs> anymore are dropped.
+
+    :param state_file: The path to the state CSV file. It is created if it
+        does not exist.
+    :param results_dirs: The list of experiment results directories.
+    :param experiment_types: The list of supported experiment types.
+    :param columns: The summary columns needed to derive the requirements.
+    :return: The updated state, as a DataFrame with columns 'Experiment',
+        'Experiment type', 'Bytes', and <columns>, or None if an experiment
+        type is not supported or the state file does not have these columns.
+    """
+    state_columns = ['Experiment', 'Experiment type', 'Bytes'] + columns
+    if isfile(state_file):
+        state = pandas.read_csv(state_file)
+        if list(state.columns) != state_columns:
+            print(
+                'State file {} does not have the columns {}, use --rebuild '
+                'to replace it'.format(state_file, state_columns)
+            )
+            return None
+    else:
+        state = pandas.DataFrame(columns=state_columns)
+
+    names = [d.split('/')[-1] for d in results_dirs]
+    state = state[state['Experiment'].isin(names)]
+    consumed = set(state['Experiment'])
+    new_dirs = [
+        d for d, name in zip(results_dirs, names) if name not in consumed
+    ]
+    print(
+        'Reading {} new experiments ({} already consumed)'.format(
+            len(new_dirs),
+            len(consumed)
+        )
+    )
+    new_data = load_summaries(new_dirs, experiment_types)
+    if new_data is None:
+        return None
+    if len(state) == 0:
+        state = new_data.reindex(columns=state_columns)
+    elif len(new_data) > 0:
+        state = pandas.concat(
+            [state, new_data[state_columns]],
+            ignore_index=True,
+            sort=False
+        )
+    state.to_csv(state_file, index=False)
+    return state
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -86,6 +455,60 @@ if __name__ == '__main__':
         required=False,
         default='latency_requirements.csv'
     )
+    parser.add_argument(
+        '--pooled',
+        action='store_true',
+        help="""Derive each requirement as a percentile (50 for the median,
+                99 for the 99 percentile, and 100 for the maximum) over the
+                samples of all the experiments, merging the histograms stored
+                next to the summaries, instead of as the 99 percentile of the
+                summary values""",
+        required=False
+    )
+    parser.add_argument(
+        '-s',
+        '--state_file',
+        help="""A CSV file to keep the summary values of the experiments
+                already consumed. If given, only the summaries of the new
+                experiments are read""",
+        required=False
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Read all the summaries again, replacing the state file',
+        required=False
+    )
+    parser.add_argument(
+        '-t',
+        '--tolerance',
+        choices=['nonparametric', 'bootstrap'],
+        help="""Derive each requirement as an upper tolerance bound of the
+                summary values, which covers <coverage> of the runs with
+                <confidence>, instead of as their 99 percentile""",
+        required=False
+    )
+    parser.add_argument(
+        '--coverage',
+        help='The fraction of the runs the tolerance bounds must cover',
+        type=float,
+        required=False,
+        default=0.9
+    )
+    parser.add_argument(
+        '--confidence',
+        help='The confidence of the tolerance bounds',
+        type=float,
+        required=False,
+        default=0.9
+    )
+    parser.add_argument(
+        '--report_file',
+        help="""A file to write the runs, confidence, and additional runs
+                needed of each tolerance bound""",
+        required=False,
+        default='latency_requirements_tolerance.csv'
+    )
     args = parser.parse_args()
     experiments = args.experiments_results
     output_file = args.output_file
@@ -126,96 +549,85 @@ if __name__ == '__main__':
         'intraprocess_reliable',
     ]
 
-    # Create a dictionary with one entry per experiment type. The values are
-    # Pandas DataFrames:
-    # {
-    #     'experiment_type_1': <Pandas DataFrame>,
-    #     'experiment_type_2': <Pandas DataFrame>
-    # }
-    # The DataFrames contain a "Experiment" column to keep track of from which
-    # experiment does every data entry come from.
-    data_by_exp_type = {}
-    for results_dir in results_dirs:
-        # Get path of summary files
-        results_files = sorted(
-            [
-                '{}/{}'.format(
-                    results_dir,
-                    f
-                ) for f in listdir(results_dir) if isfile(
-                    '{}/{}'.format(
-                        results_dir,
-                        f
-                    )
-                ) and 'summary' in f
-            ]
-        )
+    if args.pooled is True and args.state_file is not None:
+        parser.error('--state_file is not supported with --pooled')
+    if args.pooled is True and args.tolerance is not None:
+        parser.error('--tolerance is not supported with --pooled')
+    if not 0 < args.coverage < 1 or not 0 < args.confidence < 1:
+        parser.error('--coverage and --confidence must be in (0, 1)')
 
-        # Iterate over the summaries
-        for f in results_files:
-            # Get experiment type
-            exp_type = experiment_type(f)
-            # Check that supported
-            if exp_type not in experiment_types:
-                print(
-                    'Experiment {} found in {} is NOT supported'.format(
-                        exp_type,
-                        results_dir
-                    )
-                )
-                exit(1)
-            # Initialize dictionary entry
-            if exp_type not in data_by_exp_type:
-                data_by_exp_type[exp_type] = pandas.DataFrame()
+    if args.pooled is True:
+        requirements = pooled_requirements(
+            results_dirs,
+            experiment_types,
+            {
+                'Median': 50,
+                '99%': 99,
+                'Max': 100,
+            }
+        )
+        if requirements is None:
+            exit(1)
+    else:
+        # Requirement columns and percentile used to derive requirements
+        req_columns = {
+            'Median': 99,
+            '99%': 99,
+            'Max': 99,
+        }
 
-            # Load data as DataFrame
-            file_data = pandas.read_csv(f)
-            # Expand data with a "Experiment" column containing directory name
-            # of experiment results.
-            file_data['Experiment'] = results_dir.split('/')[-1]
-            # Append data to
-            data_by_exp_type[exp_type] = data_by_exp_type[exp_type].append(
-                file_data,
-                sort=False
+        # Get the summary values of every experiment, either from all the
+        # summaries, or from the state file and the summaries of the new
+        # experiments.
+        if args.state_file is None:
+            data = load_summaries(results_dirs, experiment_types)
+        else:
+            if args.rebuild is True and isfile(args.state_file):
+                remove(args.state_file)
+            data = update_state(
+                args.state_file,
+                results_dirs,
+                experiment_types,
+                list(req_columns)
             )
+        if data is None:
+            exit(1)
 
-    # Requirement columns and percentile used to derive requirements
-    req_columns = {
-        'Median': 99,
-        '99%': 99,
-        'Max': 99,
-    }
-
-    # Derive requirements for each experiment type, payload, and req_column
-    # based on the percentiles. Store them in a DataFrame in the form:
-    #                     Experiment type Bytes   Median       99%       Max
-    # 0 interprocess_best_effort_security    16 29.70648  85.15608 504.45288
-    # 1 interprocess_best_effort_security    32 51.34644 135.73314 504.40790
-    requirements = pandas.DataFrame()
-    for exp_type in data_by_exp_type:
-        # Get experiment_type data
-        exp_data = data_by_exp_type[exp_type].reset_index(drop=True)
-        exp_requirements = pandas.DataFrame()
-
-        # Iterate over payloads
-        payloads = exp_data['Bytes'].unique()
-        for payload in payloads:
-            # Get payload data
-            payload_data = exp_data[exp_data['Bytes'] == payload]
-
-            # Iterate over requirement columns
-            payload_reqs = pandas.DataFrame()
-            for c in req_columns:
-                # Calculate percentile and insert entry
-                payload_reqs.at[0, c] = np.percentile(
-                    payload_data[c],
-                    req_columns[c]
+        # Derive requirements for each experiment type, payload, and
+        # req_column based on the percentiles. Store them in a DataFrame in
+        # the form:
+        #                     Experiment type Bytes  Median      99%      Max
+        # 0 interprocess_best_effort_security    16 29.7064 85.15608 504.4528
+        # 1 interprocess_best_effort_security    32 51.3464 135.7331 504.4079
+        if args.tolerance is None:
+            requirements = derive_requirements(data, req_columns)
+        else:
+            requirements, report = tolerance_requirements(
+                data,
+                {c: True for c in req_columns},
+                args.coverage,
+                args.confidence,
+                args.tolerance,
+                np.random.RandomState(0)
+            )
+            report.to_csv(args.report_file, float_format='%.3f', index=False)
+            below = report[report['Confidence'] < args.confidence]
+            print(
+                '{}/{} requirements reach {} confidence of covering {} of '
+                'the runs'.format(
+                    len(report) - len(below),
+                    len(report),
+                    args.confidence,
+                    args.coverage
+                )
+            )
+            if len(below) > 0:
+                print(
+                    'Up to {} additional runs needed (see {})'.format(
+                        below['Additional runs needed'].max(),
+                        args.report_file
+                    )
                 )
-
-            payload_reqs.insert(0, 'Bytes', payload)
-            exp_requirements = exp_requirements.append(payload_reqs)
-        exp_requirements.insert(0, 'Experiment type', exp_type)
-        requirements = requirements.append(exp_requirements)
 
     # Save requirements as CSV file
     requirements = requirements.reset_index(drop=True)
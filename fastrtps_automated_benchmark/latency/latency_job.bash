@@ -210,25 +210,11 @@ main ()
 
     # Create plots and summary of experiment results
     rm ${RESULTS_DIR}/*summary* &> /dev/null
-    SUMMARIES=""
-    DATA_FILES=($(ls ${RESULTS_DIR} -I plots))
-    for FILE in ${DATA_FILES[@]}
-    do
-        # Get filename without extension
-        IFS='.' read -r -a FILE <<< "${FILE}"
-        FILE=${FILE[-2]}
-        echo "Generating plots for ${FILE}..."
-
-        # Create plots and summary
-        ${PYTHON_3} ${SCRITP_DIR}/latency_process_results.py \
-            --plots_directory ${RESULTS_DIR}/plots/${FILE} \
-            --raw_csv ${RESULTS_DIR}/${FILE}.csv \
-            --output_csv ${RESULTS_DIR}/${FILE}_summary.csv
-
-        # Add summary to list
-        SUMMARIES="${SUMMARIES} ${RESULTS_DIR}/${FILE}_summary.csv"
-        echo "-------------------------------------------------------------------"
-    done
+    echo "Generating plots and summaries for ${RESULTS_DIR}..."
+    ${PYTHON_3} ${SCRITP_DIR}/latency_process_results.py \
+        --results_directory ${RESULTS_DIR}
+    SUMMARIES=$(ls ${RESULTS_DIR}/*_summary.csv)
+    echo "-------------------------------------------------------------------"
 
     # Create comparison plots
     echo "Creating sub-experiment comparison plots"
@@ -14,8 +14,14 @@
 
 """."""
 import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+from os import listdir
 from os import makedirs
+from os import sched_getaffinity
+from os.path import getmtime
 from os.path import isdir
+from os.path import isfile
 
 import matplotlib
 matplotlib.use('Agg')
@@ -25,6 +31,37 @@ import numpy as np
 
 import pandas
 
+# Percentiles of the latency summary
+DEFAULT_PERCENTILES = [90, 99, 99.99]
+# Relative accuracy of the quantiles estimated with latency sketches
+SKETCH_RELATIVE_ACCURACY = 0.001
+# Values under this are accounted in the sketch bucket of this value
+SKETCH_MIN_VALUE = 1e-6
+# Relative accuracy of the log-binned histograms stored with the summary
+HISTOGRAM_RELATIVE_ACCURACY = 0.01
+# Maximum number of samples drawn in the series plots
+DEFAULT_SERIES_POINTS = 4000
+# Number of windows in which a series is split to detect its warm-up
+STEADY_STATE_WINDOWS = 100
+# Consecutive settled windows that mark the start of the steady state
+STEADY_STATE_RUN = 3
+# Number of windows of the drift statistics
+DRIFT_WINDOWS = 100
+# Number of dominant spike periods reported per payload
+SPIKE_PERIODS = 3
+# Suffixes of the CSV files output by this script, and by the scripts
+# storing their results next to the summaries ('latency_cost_model.py')
+OUTPUT_SUFFIXES = [
+    'summary',
+    'index',
+    'windows',
+    'periods',
+    'tail',
+    'bursts',
+    'histogram',
+    'model',
+]
+
 
 def directory_type(directory):
     """
@@ -40,6 +77,1581 @@ def directory_type(directory):
     return directory
 
 
+def percentile_label(percentile):
+    """
+    Get the summary column name of a percentile.
+
+    :param percentile: The percentile, in the range [0, 100].
+    :return: The column name, e.g. '99%' for 99, or '99.99%' for 99.99.
+    """
+    return '{:g}%'.format(percentile)
+
+
+def summary_columns(percentiles, jitter_percentiles):
+    """
+    Get the columns of a latency summary.
+
+    :param percentiles: The latency percentiles of the summary.
+    :param jitter_percentiles: The jitter percentiles of the summary.
+    :return: A list with the column names.
+    """
+    columns = [
+        'Bytes',
+        'Samples',
+        'Max',
+        'Min',
+        'Mean',
+        'Median',
+        'Stdev',
+        'Mean jitter',
+        'Max jitter',
+    ]
+    columns += [percentile_label(p) for p in percentiles]
+    columns += [
+        '{} jitter'.format(percentile_label(p)) for p in jitter_percentiles
+    ]
+    return columns
+
+
+def partition_by_payload(raw_data):
+    """
+    Lay out the latency samples of a measurements DataFrame by payload.
+
+    The payloads are factorized in order of appearance, and the latencies are
+    stably reordered so that the samples of each payload are contiguous
+    without altering their relative order. Since the measurements CSV files
+    already have one block per payload, the reordering is skipped in that case.
+
+    :param raw_data: A DataFrame with at least columns 'Payload [Bytes]' and
+        'Latency [us]'.
+    :return: The payloads, in order of appearance, as a numpy array.
+    :return: The latencies as a float64 numpy array, grouped by payload.
+    :return: An offsets numpy array of len(payloads) + 1 elements, so that the
+        latencies of payloads[i] are latencies[offsets[i]:offsets[i + 1]].
+    """
+    codes, payloads = pandas.factorize(raw_data['Payload [Bytes]'])
+    latencies = raw_data['Latency [us]'].to_numpy(dtype=np.float64)
+    if np.any(codes[1:] < codes[:-1]):
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        latencies = latencies[order]
+    offsets = np.zeros(len(payloads) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(payloads)), out=offsets[1:])
+    return np.asarray(payloads), latencies, offsets
+
+
+def samples_store_files(raw_csv):
+    """
+    Get the files of the samples store of a measurements CSV file.
+
+    :param raw_csv: The path to a 'measurements_<experiment_type>.csv' file.
+    :return: The path to the 'measurements_<experiment_type>_samples.npy'
+        file, holding the latencies (float64) grouped by payload.
+    :return: The path to the 'measurements_<experiment_type>_index.csv'
+        file, with columns 'Payload [Bytes]', 'Offset', and 'Samples'.
+    """
+    name = raw_csv[:-len('.csv')] if raw_csv.endswith('.csv') else raw_csv
+    return '{}_samples.npy'.format(name), '{}_index.csv'.format(name)
+
+
+def write_samples_store(raw_csv, payloads, latencies, offsets):
+    """
+    Store the latencies of a measurements CSV file in binary format.
+
+    The latencies are stored with full precision, grouped by payload, in a
+    .npy file that can be memory-mapped, so the samples of one payload can be
+    read without loading the rest (see load_measurements()). The 'Sample'
+    column is not stored, since it is the position of the latency in its
+    payload.
+
+    :param raw_csv: The path to the measurements CSV file.
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    """
+    samples_file, index_file = samples_store_files(raw_csv)
+    np.save(samples_file, np.ascontiguousarray(latencies, dtype=np.float64))
+    pandas.DataFrame(
+        {
+            'Payload [Bytes]': payloads,
+            'Offset': offsets[:-1],
+            'Samples': np.diff(offsets),
+        }
+    ).to_csv(index_file, index=False)
+
+
+def load_measurements(raw_csv):
+    """
+    Load the latencies of a measurements CSV file grouped by payload.
+
+    If the samples store of the file exists (see write_samples_store()), and
+    it is not older than the CSV file, the latencies are memory-mapped from
+    it. Otherwise, the CSV file is read and partitioned.
+
+    :param raw_csv: The path to the measurements CSV file.
+    :return: The payloads, the latencies, and the offsets as returned by
+        partition_by_payload().
+    :return: The path to the samples store file if the latencies were
+        memory-mapped from it, None otherwise.
+    """
+    samples_file, index_file = samples_store_files(raw_csv)
+    if isfile(samples_file) and isfile(index_file) and (
+        not isfile(raw_csv) or getmtime(samples_file) >= getmtime(raw_csv)
+    ):
+        index = pandas.read_csv(index_file)
+        latencies = np.load(samples_file, mmap_mode='r')
+        offsets = np.append(index['Offset'].values, len(latencies))
+        return (
+            index['Payload [Bytes]'].values,
+            latencies,
+            offsets,
+            samples_file
+        )
+
+    raw_data = pandas.read_csv(raw_csv)
+    payloads, latencies, offsets = partition_by_payload(raw_data)
+    return payloads, latencies, offsets, None
+
+
+def window_matrix(latencies, windows):
+    """
+    Lay out a latency series as a matrix of windows of consecutive samples.
+
+    The last window is padded with NaN so that all the windows have the same
+    size, and windows made only of padding are dropped, so the result must be
+    reduced with the NaN aware numpy functions.
+
+    :param latencies: A numpy array with the latencies.
+    :param windows: The maximum number of windows.
+    :return: A float64 numpy array with one row per window.
+    :return: The number of samples per window.
+    """
+    samples = len(latencies)
+    windows = min(windows, max(samples, 1))
+    window_size = max(-(-samples // windows), 1)
+    padded = np.full(windows * window_size, np.nan)
+    padded[:samples] = latencies
+    padded = padded.reshape(windows, window_size)
+    return padded[~np.all(np.isnan(padded), axis=1)], window_size
+
+
+def detect_steady_state(latencies, windows=STEADY_STATE_WINDOWS):
+    """
+    Find the number of warm-up samples at the beginning of a latency series.
+
+    The series is split in <windows> windows of consecutive samples (see
+    window_matrix()), and the median and the interquartile range of every
+    window are computed at once. The second half of the series is taken as
+    steady state, and a window is settled if its median is within five
+    (scaled) median absolute deviations of the steady state window medians,
+    and its interquartile range is not above twice the steady state one. The
+    warm-up ends with the first run of STEADY_STATE_RUN settled windows, so
+    isolated outliers after it are not taken as warm-up.
+
+    :param latencies: A numpy array with the latencies.
+    :param windows: The number of windows. Defaults: STEADY_STATE_WINDOWS.
+    :return: The number of warm-up samples, which is also the position of the
+        first steady state sample. 0 for series shorter than two samples per
+        window.
+    """
+    if len(latencies) < 2 * windows:
+        return 0
+    padded, window_size = window_matrix(latencies, windows)
+    quartiles = np.nanpercentile(padded, [25, 50, 75], axis=1)
+    medians = quartiles[1]
+    ranges = quartiles[2] - quartiles[0]
+    half = len(medians) // 2
+    reference = np.median(medians[half:])
+    deviation = 1.4826 * np.median(np.abs(medians[half:] - reference))
+    # Do not flag windows because of negligible deviations
+    tolerance = max(5 * deviation, 0.01 * abs(reference))
+    settled = (
+        (np.abs(medians - reference) <= tolerance)
+        & (ranges <= 2 * np.median(ranges[half:]) + tolerance)
+    )
+    runs = np.convolve(
+        settled.astype(np.int64),
+        np.ones(STEADY_STATE_RUN, dtype=np.int64),
+        mode='valid'
+    )
+    first = np.flatnonzero(runs == STEADY_STATE_RUN)
+    if len(first) == 0 or first[0] >= half:
+        # Never settled before the reference part, so nothing is discarded
+        return 0
+    return int(first[0] * window_size)
+
+
+def omitted_latencies(latencies, expected_interval):
+    """
+    Compute the latencies of the samples omitted because of stalls.
+
+    When a sample takes longer than the interval at which samples are
+    expected, the samples that should have been sent in the meantime are
+    never measured (coordinated omission). As HdrHistogram does with an
+    expected interval, a sample of latency L >= 2 * <expected_interval> is
+    accompanied by the missing samples of latencies L - I, L - 2I... down to
+    I = <expected_interval>. All of them are generated at once with np.repeat.
+
+    :param latencies: A numpy array with the latencies.
+    :param expected_interval: The expected interval between samples, in us.
+    :return: A float64 numpy array with the latencies of the omitted samples.
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    missing = np.floor(latencies / expected_interval).astype(np.int64) - 1
+    missing[missing < 0] = 0
+    total = missing.sum()
+    if total == 0:
+        return np.empty(0, dtype=np.float64)
+    # Position of each omitted sample within the ones of its stalled sample
+    steps = np.arange(total) - np.repeat(np.cumsum(missing) - missing, missing)
+    return np.repeat(latencies, missing) - (steps + 1) * expected_interval
+
+
+def create_latency_summary(
+    payloads,
+    latencies,
+    offsets,
+    percentiles=DEFAULT_PERCENTILES,
+    jitter_percentiles=[],
+    warmup=None,
+    discard_warmup=False,
+    expected_interval=None,
+):
+    """
+    Create a latency summary with one entry per payload.
+
+    The jitter is computed with a single np.diff over the whole latency column,
+    dropping the differences that cross from one payload to the next. The
+    median and all the requested percentiles of a payload are computed with a
+    single np.percentile call (the linear interpolation of the two central
+    samples is equal to the np.median average).
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param percentiles: The latency percentiles to add to the summary.
+        Defaults: [90, 99, 99.99].
+    :param jitter_percentiles: The jitter percentiles to add to the summary,
+        as '<percentile> jitter' columns. Defaults: [].
+    :param warmup: The number of warm-up samples of each payload (see
+        detect_steady_state()), added to the summary as a 'Warm-up samples'
+        column. Defaults: None (no column).
+    :param discard_warmup: Whether to compute the statistics (and 'Samples')
+        over the steady state samples only, after the <warmup> samples.
+        Defaults: False.
+    :param expected_interval: The expected interval between samples, in us,
+        to correct the coordinated omission (see omitted_latencies()).
+        Defaults: None (no correction).
+    :return: A DataFrame with columns 'Bytes', 'Samples', 'Max', 'Min', 'Mean',
+        'Median', 'Stdev', 'Mean jitter', 'Max jitter', one column per
+        percentile, one column per jitter percentile, 'Warm-up samples' if
+        <warmup> is given, and 'Corrected samples', 'Corrected Median', and
+        one 'Corrected <percentile>' column per percentile if
+        <expected_interval> is given.
+    """
+    jitters = np.abs(np.diff(latencies))
+    quantiles = [50] + list(percentiles)
+    starts = offsets[:-1]
+    if warmup is not None and discard_warmup is True:
+        starts = starts + warmup
+
+    rows = []
+    for i, payload in enumerate(payloads):
+        payload_latencies = latencies[starts[i]:offsets[i + 1]]
+        # The jitter in offsets[i + 1] - 1 is the change of payload
+        payload_jitters = jitters[starts[i]:max(offsets[i + 1] - 1, 0)]
+        values = np.percentile(payload_latencies, quantiles)
+        row = [
+            payload,
+            len(payload_latencies),
+            np.max(payload_latencies),
+            np.min(payload_latencies),
+            np.mean(payload_latencies),
+            values[0],
+            np.std(payload_latencies),
+            np.mean(payload_jitters) if len(payload_jitters) else np.nan,
+            np.max(payload_jitters) if len(payload_jitters) else np.nan,
+        ]
+        row.extend(values[1:])
+        if len(jitter_percentiles) > 0:
+            if len(payload_jitters) > 0:
+                row.extend(np.percentile(payload_jitters, jitter_percentiles))
+            else:
+                row.extend([np.nan] * len(jitter_percentiles))
+        if expected_interval is not None:
+            corrected = np.concatenate(
+                (
+                    payload_latencies,
+                    omitted_latencies(payload_latencies, expected_interval),
+                )
+            )
+            row.append(len(corrected))
+            row.extend(np.percentile(corrected, quantiles))
+        rows.append(row)
+
+    columns = summary_columns(percentiles, jitter_percentiles)
+    if expected_interval is not None:
+        columns += ['Corrected samples', 'Corrected Median']
+        columns += [
+            'Corrected {}'.format(percentile_label(p)) for p in percentiles
+        ]
+    summary = pandas.DataFrame(rows, columns=columns)
+    summary['Bytes'] = summary['Bytes'].astype(payloads.dtype)
+    summary['Samples'] = summary['Samples'].astype(np.int64)
+    if expected_interval is not None:
+        column = 'Corrected samples'
+        summary[column] = summary[column].astype(np.int64)
+    if warmup is not None:
+        summary['Warm-up samples'] = np.asarray(warmup, dtype=np.int64)
+    return summary
+
+
+def output_file(output_csv, suffix):
+    """
+    Get the path of an additional output CSV file of a summary.
+
+    :param output_csv: The path to the summary CSV file.
+    :param suffix: The suffix of the additional file, e.g. 'windows'.
+    :return: '<name>_<suffix>.csv' for a '<name>_summary.csv' summary, and
+        '<output_csv without .csv>_<suffix>.csv' otherwise.
+    """
+    name = output_csv
+    if name.endswith('.csv'):
+        name = name[:-len('.csv')]
+    if name.endswith('_summary'):
+        name = name[:-len('_summary')]
+    return '{}_{}.csv'.format(name, suffix)
+
+
+def create_drift_statistics(
+    payloads,
+    latencies,
+    offsets,
+    windows=DRIFT_WINDOWS,
+    starts=None,
+):
+    """
+    Compute the evolution of the latency of each payload along the run.
+
+    The series of every payload is split in <windows> windows of consecutive
+    samples (see window_matrix()), and the median, 99 percentile, and maximum
+    of all the windows of a payload are computed at once. A least squares line
+    is fitted to the window medians, whose slope is reported in us per 1000
+    samples, and the drift score is the change of the fitted median along the
+    whole series relative to the median of the series (e.g. 0.1 for a
+    latency that grows a 10% from the beginning to the end of the run).
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param windows: The number of windows per payload.
+        Defaults: DRIFT_WINDOWS.
+    :param starts: The position of the first sample of each payload to take
+        into account, e.g. to skip the warm-up. Defaults: None (offsets[:-1]).
+    :return: A DataFrame with columns 'Bytes', 'Window', 'First sample',
+        'Samples', 'Median', '99%', and 'Max', with one entry per window and
+        payload. 'First sample' is relative to the beginning of the payload.
+    :return: A DataFrame with columns 'Bytes', 'Drift slope', and
+        'Drift score', with one entry per payload.
+    """
+    if starts is None:
+        starts = offsets[:-1]
+
+    window_tables = []
+    drift_rows = []
+    for i, payload in enumerate(payloads):
+        payload_latencies = latencies[starts[i]:offsets[i + 1]]
+        if len(payload_latencies) == 0:
+            drift_rows.append([payload, np.nan, np.nan])
+            continue
+        padded, window_size = window_matrix(payload_latencies, windows)
+        values = np.nanpercentile(padded, [50, 99, 100], axis=1)
+        first_samples = np.arange(len(padded)) * window_size
+        window_tables.append(
+            pandas.DataFrame(
+                {
+                    'Bytes': payload,
+                    'Window': np.arange(len(padded)),
+                    'First sample': first_samples + starts[i] - offsets[i],
+                    'Samples': np.sum(~np.isnan(padded), axis=1),
+                    'Median': values[0],
+                    '99%': values[1],
+                    'Max': values[2],
+                }
+            )
+        )
+        if len(padded) < 2:
+            drift_rows.append([payload, np.nan, np.nan])
+            continue
+        centers = first_samples + window_size / 2
+        slope = np.polyfit(centers, values[0], 1)[0]
+        median = np.median(payload_latencies)
+        drift_rows.append(
+            [
+                payload,
+                slope * 1000,
+                slope * len(payload_latencies) / median if median else np.nan,
+            ]
+        )
+
+    columns = ['Bytes', 'Window', 'First sample', 'Samples', 'Median', '99%',
+               'Max']
+    if len(window_tables) > 0:
+        window_data = pandas.concat(window_tables, ignore_index=True)
+    else:
+        window_data = pandas.DataFrame(columns=columns)
+    drift = pandas.DataFrame(
+        drift_rows,
+        columns=['Bytes', 'Drift slope', 'Drift score']
+    )
+    return window_data[columns], drift
+
+
+def detect_spike_periods(
+    latencies,
+    spike_percentile=99,
+    periods=SPIKE_PERIODS,
+):
+    """
+    Find the periods at which the latency spikes of a series recur.
+
+    The samples above the <spike_percentile> percentile of the series are
+    spikes. The autocorrelation of the (zero mean) spike indicator is computed
+    for all the lags at once with an FFT, and its local maxima six times
+    above the noise level (1 / sqrt(samples)) are period candidates. A
+    candidate must also stand out from the lags around it, by six (scaled)
+    median absolute deviations over their median, since bursts of spikes
+    raise the correlation of all the short lags. Since a
+    period P also yields peaks at 2P, 3P..., the candidates are taken in
+    increasing lag order, dropping the multiples of the accepted ones, and the
+    <periods> strongest ones are reported.
+
+    :param latencies: A numpy array with the latencies.
+    :param spike_percentile: The percentile above which a sample is a spike.
+        Defaults: 99.
+    :param periods: The maximum number of periods. Defaults: SPIKE_PERIODS.
+    :return: The number of spikes.
+    :return: A list of (period in samples, autocorrelation) tuples, sorted by
+        decreasing autocorrelation.
+    """
+    samples = len(latencies)
+    if samples < 4:
+        return 0, []
+    spikes = latencies > np.percentile(latencies, spike_percentile)
+    indicator = spikes - np.mean(spikes)
+    if not np.any(indicator):
+        return int(np.sum(spikes)), []
+
+    # Zero padding to avoid the circular correlation
+    size = 1 << int(2 * samples - 1).bit_length()
+    spectrum = np.fft.rfft(indicator, size)
+    correlation = np.fft.irfft(spectrum * np.conj(spectrum), size)
+    correlation = correlation[:samples // 2 + 1] / correlation[0]
+
+    # Local maxima over the noise level of a non-periodic indicator
+    noise = 6 / np.sqrt(samples)
+    lags = np.arange(2, len(correlation) - 1)
+    peaks = lags[
+        (correlation[lags] > correlation[lags - 1])
+        & (correlation[lags] >= correlation[lags + 1])
+        & (correlation[lags] > noise)
+    ]
+    accepted = []
+    for lag in peaks:
+        harmonic = False
+        for period in accepted:
+            multiple = max(round(lag / period), 1)
+            if abs(lag - multiple * period) <= multiple:
+                harmonic = True
+                break
+        if harmonic:
+            continue
+        # Bursts of spikes raise the correlation of all the short lags, so a
+        # period must also stand out from the lags around it
+        width = max(lag // 2, 4)
+        around = correlation[max(lag - width, 1):lag + width + 1]
+        baseline = np.median(around)
+        spread = 1.4826 * np.median(np.abs(around - baseline))
+        if correlation[lag] - baseline > max(6 * spread, noise):
+            accepted.append(lag)
+    accepted.sort(key=lambda lag: correlation[lag], reverse=True)
+    return int(np.sum(spikes)), [
+        (int(lag), correlation[lag]) for lag in accepted[:periods]
+    ]
+
+
+def create_spike_periods(
+    payloads,
+    latencies,
+    offsets,
+    spike_percentile=99,
+    periods=SPIKE_PERIODS,
+    starts=None,
+):
+    """
+    Find the dominant spike periods of each payload.
+
+    See detect_spike_periods().
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param spike_percentile: The percentile above which a sample is a spike.
+        Defaults: 99.
+    :param periods: The maximum number of periods per payload.
+        Defaults: SPIKE_PERIODS.
+    :param starts: The position of the first sample of each payload to take
+        into account, e.g. to skip the warm-up. Defaults: None (offsets[:-1]).
+    :return: A DataFrame with columns 'Bytes', 'Spikes', 'Rank',
+        'Period [samples]', and 'Autocorrelation', with one entry per period
+        found.
+    """
+    if starts is None:
+        starts = offsets[:-1]
+
+    rows = []
+    for i, payload in enumerate(payloads):
+        spikes, found = detect_spike_periods(
+            np.asarray(latencies[starts[i]:offsets[i + 1]]),
+            spike_percentile=spike_percentile,
+            periods=periods,
+        )
+        for rank, (period, correlation) in enumerate(found):
+            rows.append([payload, spikes, rank + 1, period, correlation])
+    return pandas.DataFrame(
+        rows,
+        columns=[
+            'Bytes',
+            'Spikes',
+            'Rank',
+            'Period [samples]',
+            'Autocorrelation',
+        ]
+    )
+
+
+def create_tail_exemplars(
+    payloads,
+    latencies,
+    offsets,
+    top=10,
+    context=5,
+    starts=None,
+):
+    """
+    Extract the worst samples of each payload with the samples around them.
+
+    The <top> highest latencies of each payload are selected with a single
+    np.argpartition, and the <context> samples before and after each of them
+    are gathered with one fancy indexing operation.
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param top: The number of worst samples per payload. Defaults: 10.
+    :param context: The number of samples to store before and after each of
+        the worst samples. Defaults: 5.
+    :param starts: The position of the first sample of each payload to take
+        into account, e.g. to skip the warm-up. Defaults: None (offsets[:-1]).
+    :return: A DataFrame with columns 'Bytes', 'Rank', 'Sample', 'Offset',
+        and 'Latency [us]', where 'Sample' is the position of the worst sample
+        in its payload, and there is one entry per 'Offset' in
+        [-context, context] (0 is the worst sample itself).
+    """
+    if starts is None:
+        starts = offsets[:-1]
+    shifts = np.arange(-context, context + 1)
+
+    tables = []
+    for i, payload in enumerate(payloads):
+        payload_latencies = np.asarray(latencies[offsets[i]:offsets[i + 1]])
+        first = starts[i] - offsets[i]
+        candidates = payload_latencies[first:]
+        count = min(top, len(candidates))
+        if count == 0:
+            continue
+        worst = np.argpartition(candidates, len(candidates) - count)[-count:]
+        worst = worst[np.argsort(candidates[worst], kind='stable')[::-1]]
+        worst += first
+        positions = worst[:, None] + shifts[None, :]
+        valid = (positions >= 0) & (positions < len(payload_latencies))
+        ranks = np.broadcast_to(np.arange(1, count + 1)[:, None], valid.shape)
+        samples = np.broadcast_to(worst[:, None], valid.shape)
+        tables.append(
+            pandas.DataFrame(
+                {
+                    'Bytes': payload,
+                    'Rank': ranks[valid],
+                    'Sample': samples[valid],
+                    'Offset': np.broadcast_to(shifts, valid.shape)[valid],
+                    'Latency [us]': payload_latencies[positions[valid]],
+                }
+            )
+        )
+
+    columns = ['Bytes', 'Rank', 'Sample', 'Offset', 'Latency [us]']
+    if len(tables) == 0:
+        return pandas.DataFrame(columns=columns)
+    return pandas.concat(tables, ignore_index=True)[columns]
+
+
+def create_burst_statistics(
+    payloads,
+    latencies,
+    offsets,
+    spike_percentile=99,
+    burst_gap=10,
+    starts=None,
+):
+    """
+    Group the latency spikes of each payload in bursts.
+
+    The samples above the <spike_percentile> percentile of a payload are
+    spikes, and consecutive spikes separated by at most <burst_gap> samples
+    belong to the same burst. The bursts are found with a single np.diff over
+    the spike positions.
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param spike_percentile: The percentile above which a sample is a spike.
+        Defaults: 99.
+    :param burst_gap: The maximum number of samples between two spikes of the
+        same burst. Defaults: 10.
+    :param starts: The position of the first sample of each payload to take
+        into account, e.g. to skip the warm-up. Defaults: None (offsets[:-1]).
+    :return: A DataFrame with columns 'Bytes', 'Spikes', 'Bursts',
+        'Mean burst length', 'Max burst length' (lengths in spikes),
+        'Mean burst span', 'Max burst span' (spans in samples, from the first
+        to the last spike), 'Bursts per 1000 samples', and
+        'Mean burst interval' (samples between the beginning of two
+        consecutive bursts), with one entry per payload.
+    """
+    if starts is None:
+        starts = offsets[:-1]
+
+    rows = []
+    for i, payload in enumerate(payloads):
+        payload_latencies = np.asarray(latencies[starts[i]:offsets[i + 1]])
+        if len(payload_latencies) == 0:
+            rows.append([payload, 0, 0] + [np.nan] * 6)
+            continue
+        threshold = np.percentile(payload_latencies, spike_percentile)
+        spikes = np.flatnonzero(payload_latencies > threshold)
+        if len(spikes) == 0:
+            rows.append([payload, 0, 0] + [np.nan] * 4 + [0, np.nan])
+            continue
+        # A new burst begins after every gap longer than burst_gap
+        beginnings = np.concatenate(
+            ([0], np.flatnonzero(np.diff(spikes) > burst_gap) + 1)
+        )
+        ends = np.append(beginnings[1:], len(spikes))
+        lengths = ends - beginnings
+        spans = spikes[ends - 1] - spikes[beginnings] + 1
+        intervals = np.diff(spikes[beginnings])
+        rows.append(
+            [
+                payload,
+                len(spikes),
+                len(beginnings),
+                np.mean(lengths),
+                np.max(lengths),
+                np.mean(spans),
+                np.max(spans),
+                1000 * len(beginnings) / len(payload_latencies),
+                np.mean(intervals) if len(intervals) > 0 else np.nan,
+            ]
+        )
+    return pandas.DataFrame(
+        rows,
+        columns=[
+            'Bytes',
+            'Spikes',
+            'Bursts',
+            'Mean burst length',
+            'Max burst length',
+            'Mean burst span',
+            'Max burst span',
+            'Bursts per 1000 samples',
+            'Mean burst interval',
+        ]
+    )
+
+
+def sketch_latencies(values, relative_accuracy=SKETCH_RELATIVE_ACCURACY):
+    """
+    Create a mergeable sketch of a set of latencies.
+
+    The sketch is a histogram with logarithmic buckets, where bucket <key>
+    holds the values in (gamma^(key - 1), gamma^key], with
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy). Any quantile
+    estimated from it is within <relative_accuracy> of the exact quantile
+    sample (see sketch_quantiles()). Its size depends on the range of the
+    values (about 3500 buckets per decade for the default 0.1% accuracy), but
+    not on the number of values. Values under SKETCH_MIN_VALUE are accounted
+    in the bucket of SKETCH_MIN_VALUE.
+
+    :param values: A numpy array with the latencies.
+    :param relative_accuracy: The relative accuracy of the sketch.
+        Defaults: SKETCH_RELATIVE_ACCURACY.
+    :return: A pandas Series with the number of values (int64) of each
+        non-empty bucket, indexed by bucket key.
+    """
+    if len(values) == 0:
+        return pandas.Series([], dtype=np.int64)
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    keys = np.ceil(
+        np.log(np.maximum(values, SKETCH_MIN_VALUE)) / np.log(gamma)
+    ).astype(np.int64)
+    lowest = keys.min()
+    counts = np.bincount(keys - lowest)
+    buckets = np.flatnonzero(counts)
+    return pandas.Series(counts[buckets], index=buckets + lowest)
+
+
+def merge_sketches(sketch, other):
+    """
+    Merge two sketches created with the same relative accuracy.
+
+    :param sketch: A sketch as returned by sketch_latencies().
+    :param other: A sketch as returned by sketch_latencies().
+    :return: The merged sketch.
+    """
+    return sketch.add(other, fill_value=0).astype(np.int64)
+
+
+def sketch_quantiles(
+    sketch,
+    percentiles,
+    relative_accuracy=SKETCH_RELATIVE_ACCURACY
+):
+    """
+    Estimate percentiles from a sketch.
+
+    For a percentile p over n values, the exact quantile sample is the one
+    with rank floor(p * (n - 1) / 100) in the sorted values. The estimation
+    is the center (in relative terms) of the bucket holding that sample, so
+    its relative error is under <relative_accuracy>. Note that np.percentile
+    interpolates linearly between the two closest ranks, which can make it
+    differ from the exact quantile sample on sparse tails.
+
+    :param sketch: A sketch as returned by sketch_latencies().
+    :param percentiles: A list of percentiles in the range [0, 100].
+    :param relative_accuracy: The relative accuracy with which the sketch was
+        created. Defaults: SKETCH_RELATIVE_ACCURACY.
+    :return: A numpy array with the estimated percentiles (NaN if the sketch
+        is empty).
+    """
+    if sketch.empty:
+        return np.full(len(percentiles), np.nan)
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    sketch = sketch.sort_index()
+    cumulative = np.cumsum(sketch.values)
+    ranks = np.floor(np.asarray(percentiles) * (cumulative[-1] - 1) / 100)
+    positions = np.searchsorted(cumulative, ranks, side='right')
+    keys = sketch.index.values[positions].astype(np.float64)
+    return 2 * np.power(gamma, keys) / (gamma + 1)
+
+
+def create_latency_histograms(
+    payloads,
+    latencies,
+    offsets,
+    relative_accuracy=HISTOGRAM_RELATIVE_ACCURACY,
+    starts=None,
+):
+    """
+    Create a log-binned histogram of the latencies of each payload.
+
+    The histograms are the sketches of sketch_latencies(), so the ones of
+    different runs can be merged (see histogram_sketches()), and the bucket
+    bounds are stored so that the files can be used without knowing the
+    relative accuracy.
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param relative_accuracy: The relative accuracy of the histograms.
+        Defaults: HISTOGRAM_RELATIVE_ACCURACY.
+    :param starts: The position of the first sample of each payload to take
+        into account, e.g. to skip the warm-up. Defaults: None (offsets[:-1]).
+    :return: A DataFrame with columns 'Bytes', 'Bucket', 'Lower [us]',
+        'Upper [us]', and 'Count', with one entry per non-empty bucket of each
+        payload, in increasing latency order. Bucket <key> holds the
+        latencies in ('Lower [us]', 'Upper [us]'] = (gamma^(key - 1),
+        gamma^key].
+    """
+    if starts is None:
+        starts = offsets[:-1]
+    sketches = [
+        sketch_latencies(
+            latencies[starts[i]:offsets[i + 1]],
+            relative_accuracy
+        )
+        for i in range(len(payloads))
+    ]
+    return sketches_histograms(payloads, sketches, relative_accuracy)
+
+
+def sketches_histograms(payloads, sketches, relative_accuracy):
+    """
+    Lay out the sketches of a set of payloads as log-binned histograms.
+
+    :param payloads: The payloads.
+    :param sketches: The sketches of the payloads, as returned by
+        sketch_latencies().
+    :param relative_accuracy: The relative accuracy of the sketches.
+    :return: A DataFrame like the one returned by create_latency_histograms().
+    """
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+
+    tables = []
+    for payload, sketch in zip(payloads, sketches):
+        keys = sketch.index.values
+        tables.append(
+            pandas.DataFrame(
+                {
+                    'Bytes': payload,
+                    'Bucket': keys,
+                    'Lower [us]': np.power(gamma, keys - 1.0),
+                    'Upper [us]': np.power(gamma, keys.astype(np.float64)),
+                    'Count': sketch.values,
+                }
+            )
+        )
+
+    columns = ['Bytes', 'Bucket', 'Lower [us]', 'Upper [us]', 'Count']
+    if len(tables) == 0:
+        return pandas.DataFrame(columns=columns)
+    return pandas.concat(tables, ignore_index=True)[columns]
+
+
+def histogram_sketches(histograms):
+    """
+    Get the sketches of the payloads of a log-binned histograms DataFrame.
+
+    :param histograms: A DataFrame as returned by create_latency_histograms(),
+        or read from a histogram CSV file.
+    :return: A dictionary with the payloads as keys, and their sketches (see
+        sketch_latencies()) as values.
+    :return: The relative accuracy of the histograms (NaN if empty).
+    """
+    relative_accuracy = np.nan
+    if len(histograms) > 0:
+        first = histograms.iloc[0]
+        gamma = first['Upper [us]'] / first['Lower [us]']
+        relative_accuracy = (gamma - 1) / (gamma + 1)
+    sketches = {}
+    for payload, grp in histograms.groupby('Bytes', sort=False):
+        sketches[payload] = pandas.Series(
+            grp['Count'].values.astype(np.int64),
+            index=grp['Bucket'].values.astype(np.int64)
+        )
+    return sketches, relative_accuracy
+
+
+def create_streaming_latency_summary(
+    raw_csv,
+    chunk_size,
+    percentiles=DEFAULT_PERCENTILES,
+    jitter_percentiles=[],
+    relative_accuracy=SKETCH_RELATIVE_ACCURACY,
+    histogram_accuracy=HISTOGRAM_RELATIVE_ACCURACY,
+):
+    """
+    Create a latency summary reading the measurements CSV in chunks.
+
+    Only one chunk of <chunk_size> rows is loaded at a time, and a running
+    state is kept for each payload, so the memory used does not depend on the
+    size of the file. 'Samples', 'Max', 'Min', 'Mean', 'Stdev' (merged with
+    Chan et al. parallel algorithm), 'Mean jitter' and 'Max jitter' (carrying
+    the last latency of each payload across chunks) are exact. The median and
+    the percentiles are estimated with latency sketches, so their relative
+    error is under <relative_accuracy> (see sketch_quantiles()). The
+    log-binned histograms are merged across chunks in the same way.
+
+    :param raw_csv: The path to a latency measurements CSV file.
+    :param chunk_size: The number of rows to load at a time.
+    :param percentiles: The latency percentiles to add to the summary.
+        Defaults: [90, 99, 99.99].
+    :param jitter_percentiles: The jitter percentiles to add to the summary.
+        Defaults: [].
+    :param relative_accuracy: The relative accuracy of the sketches.
+        Defaults: SKETCH_RELATIVE_ACCURACY.
+    :param histogram_accuracy: The relative accuracy of the histograms.
+        Defaults: HISTOGRAM_RELATIVE_ACCURACY.
+    :return: A DataFrame like the one returned by create_latency_summary().
+    :return: A DataFrame like the one returned by create_latency_histograms().
+    """
+    states = {}
+    chunks = pandas.read_csv(
+        raw_csv,
+        usecols=['Payload [Bytes]', 'Latency [us]'],
+        chunksize=chunk_size
+    )
+    for chunk in chunks:
+        payloads, latencies, offsets = partition_by_payload(chunk)
+        for i, payload in enumerate(payloads):
+            values = latencies[offsets[i]:offsets[i + 1]]
+            state = states.get(payload)
+            if state is not None:
+                # Carry the jitter across the chunk boundary
+                values_jitters = np.abs(
+                    np.diff(np.concatenate(([state['Last']], values)))
+                )
+            else:
+                values_jitters = np.abs(np.diff(values))
+
+            count = len(values)
+            mean = np.mean(values)
+            m2 = np.sum(np.square(values - mean))
+            chunk_state = {
+                'Samples': count,
+                'Max': np.max(values),
+                'Min': np.min(values),
+                'Mean': mean,
+                'M2': m2,
+                'Last': values[-1],
+                'Jitters': len(values_jitters),
+                'Jitter sum': np.sum(values_jitters),
+                'Max jitter': (
+                    np.max(values_jitters) if len(values_jitters) else np.nan
+                ),
+                'Sketch': sketch_latencies(values, relative_accuracy),
+                'Histogram': sketch_latencies(values, histogram_accuracy),
+                'Jitter sketch': sketch_latencies(
+                    values_jitters,
+                    relative_accuracy
+                ),
+            }
+            if state is None:
+                states[payload] = chunk_state
+                continue
+
+            # Merge chunk state into the payload running state
+            total = state['Samples'] + count
+            delta = mean - state['Mean']
+            state['Mean'] += delta * count / total
+            state['M2'] += (
+                m2 + delta * delta * state['Samples'] * count / total
+            )
+            state['Samples'] = total
+            state['Max'] = max(state['Max'], chunk_state['Max'])
+            state['Min'] = min(state['Min'], chunk_state['Min'])
+            state['Last'] = chunk_state['Last']
+            state['Jitters'] += chunk_state['Jitters']
+            state['Jitter sum'] += chunk_state['Jitter sum']
+            state['Max jitter'] = np.fmax(
+                state['Max jitter'],
+                chunk_state['Max jitter']
+            )
+            state['Sketch'] = merge_sketches(
+                state['Sketch'],
+                chunk_state['Sketch']
+            )
+            state['Jitter sketch'] = merge_sketches(
+                state['Jitter sketch'],
+                chunk_state['Jitter sketch']
+            )
+            state['Histogram'] = merge_sketches(
+                state['Histogram'],
+                chunk_state['Histogram']
+            )
+
+    rows = []
+    for payload, state in states.items():
+        values = sketch_quantiles(
+            state['Sketch'],
+            [50] + list(percentiles),
+            relative_accuracy
+        )
+        row = [
+            payload,
+            state['Samples'],
+            state['Max'],
+            state['Min'],
+            state['Mean'],
+            values[0],
+            np.sqrt(state['M2'] / state['Samples']),
+            (
+                state['Jitter sum'] / state['Jitters']
+                if state['Jitters'] else np.nan
+            ),
+            state['Max jitter'],
+        ]
+        row.extend(values[1:])
+        if len(jitter_percentiles) > 0:
+            row.extend(
+                sketch_quantiles(
+                    state['Jitter sketch'],
+                    jitter_percentiles,
+                    relative_accuracy
+                )
+            )
+        rows.append(row)
+
+    summary = pandas.DataFrame(
+        rows,
+        columns=summary_columns(percentiles, jitter_percentiles)
+    )
+    summary['Samples'] = summary['Samples'].astype(np.int64)
+    histograms = sketches_histograms(
+        list(states),
+        [state['Histogram'] for state in states.values()],
+        histogram_accuracy
+    )
+    return summary, histograms
+
+
+def plot_histogram(latencies, payload, plots_directory):
+    """
+    Create the latency histogram of a payload.
+
+    The bins are logarithmic, so the tail of the distribution is not
+    squeezed in the first bins. The figure is stored as
+    '<plots_directory>/histogram_<payload>.png'.
+
+    :param latencies: A numpy array with the latencies of the payload.
+    :param payload: The payload in Bytes.
+    :param plots_directory: The directory to store the plot.
+    """
+    fig_title = '{}/histogram_{}.png'.format(plots_directory, payload)
+    print('Generating {}'.format(fig_title))
+    fig, ax = plt.subplots()
+    lowest = max(np.min(latencies), SKETCH_MIN_VALUE)
+    highest = max(np.max(latencies), lowest * 1.01)
+    ax.hist(latencies, bins=np.geomspace(lowest, highest, 101))
+    ax.set_xscale('log')
+    ax.grid()
+    plt.xlabel('Latency [us]')
+    plt.ylabel('Number of occurrences')
+    plt.title('Latency Histogram - {} Bytes'.format(payload))
+    plt.savefig(fig_title)
+    plt.close(fig)
+
+
+def plot_ccdf(histograms, plots_directory):
+    """
+    Create the latency CCDF plot of all the payloads of an experiment type.
+
+    The complementary cumulative distribution function (fraction of samples
+    above each latency) is computed from the log-binned histograms, and drawn
+    on log-log axes, which shows the tail of the distributions.
+    The figure is stored as '<plots_directory>/ccdf.png'.
+
+    :param histograms: A DataFrame as returned by create_latency_histograms(),
+        or read from a histogram CSV file.
+    :param plots_directory: The directory to store the plot.
+    """
+    fig_title = '{}/ccdf.png'.format(plots_directory)
+    print('Generating {}'.format(fig_title))
+    fig, ax = plt.subplots()
+    for payload, grp in histograms.groupby('Bytes', sort=False):
+        counts = grp['Count'].values
+        above = 1 - np.cumsum(counts) / counts.sum()
+        # The last bucket has no sample above, which log axes cannot show
+        ax.step(
+            grp['Upper [us]'].values[:-1],
+            above[:-1],
+            where='post',
+            label='{} Bytes'.format(payload)
+        )
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.grid(which='both', alpha=0.3)
+    ax.legend(loc='best', fontsize='small')
+    plt.xlabel('Latency [us]')
+    plt.ylabel('Fraction of samples above latency')
+    plt.title('Latency CCDF')
+    plt.savefig(fig_title)
+    plt.close(fig)
+
+
+def decimate_series(latencies, points):
+    """
+    Reduce a latency series to about <points> samples, keeping its shape.
+
+    The series is split in <points> / 2 buckets of consecutive samples, and
+    the minimum and the maximum of each bucket are kept (min/max envelope),
+    so no extreme sample is lost. Series with less than <points> samples are
+    not reduced.
+
+    :param latencies: A numpy array with the latencies.
+    :param points: The maximum number of samples to keep.
+    :return: A numpy array with the sample numbers (positions in <latencies>)
+        of the kept samples, in increasing order.
+    :return: A numpy array with the kept latencies.
+    """
+    if len(latencies) <= points:
+        return np.arange(len(latencies)), np.asarray(latencies)
+    padded, bucket_size = window_matrix(latencies, max(points // 2, 1))
+    starts = np.arange(len(padded)) * bucket_size
+    positions = np.unique(
+        np.concatenate(
+            (
+                starts + np.nanargmin(padded, axis=1),
+                starts + np.nanargmax(padded, axis=1),
+            )
+        )
+    )
+    return positions, np.asarray(latencies[positions])
+
+
+def windowed_percentiles(latencies, points, percentiles):
+    """
+    Compute percentiles of a latency series over consecutive windows.
+
+    The series is split in <points> / 2 windows of consecutive samples (the
+    buckets of decimate_series()), and the percentiles are computed over each
+    window with a single vectorized call.
+
+    :param latencies: A numpy array with the latencies.
+    :param points: Twice the number of windows.
+    :param percentiles: A list of percentiles in the range [0, 100].
+    :return: A numpy array with the sample number of the center of each
+        window.
+    :return: A numpy array with one row per percentile and one column per
+        window.
+    """
+    padded, window_size = window_matrix(latencies, max(points // 2, 1))
+    centers = np.arange(len(padded)) * window_size + window_size // 2
+    return centers, np.nanpercentile(padded, percentiles, axis=1)
+
+
+def plot_series(
+    latencies,
+    payload,
+    plots_directory,
+    points=DEFAULT_SERIES_POINTS,
+    overlay=False
+):
+    """
+    Create the latency series plot of a payload.
+
+    The series is decimated to about <points> samples with decimate_series()
+    before plotting, so the rendering time does not depend on the number of
+    samples, and the spikes remain visible. The figure is stored as
+    '<plots_directory>/series_<payload>.png'.
+
+    :param latencies: A numpy array with the latencies of the payload.
+    :param payload: The payload in Bytes.
+    :param plots_directory: The directory to store the plot.
+    :param points: The maximum number of samples to plot.
+        Defaults: DEFAULT_SERIES_POINTS.
+    :param overlay: Whether to overlay the median and the percentile 99 of
+        windows of consecutive samples (see windowed_percentiles()).
+        Defaults: False.
+    """
+    fig_title = '{}/series_{}.png'.format(plots_directory, payload)
+    print('Generating {}'.format(fig_title))
+    fig, ax = plt.subplots()
+    positions, values = decimate_series(latencies, points)
+    ax.plot(positions, values, label='Latency [us]', linewidth=0.8)
+    if overlay is True and len(latencies) > 0:
+        centers, windowed = windowed_percentiles(latencies, points, [50, 99])
+        ax.plot(centers, windowed[0], label='Windowed median', color='#ff6600')
+        ax.plot(centers, windowed[1], label='Windowed 99%', color='#ff0000')
+    ax.legend(loc='best')
+    plt.xlabel('Sample number')
+    plt.ylabel('Latency [us]')
+    plt.title('Latency Series - {} Bytes'.format(payload))
+    plt.savefig(fig_title)
+    plt.close(fig)
+
+
+def plot_latencies(latencies, payload, plots_directory, plot_options):
+    """
+    Create the histogram and series plots of a payload.
+
+    :param latencies: A numpy array with the latencies of the payload.
+    :param payload: The payload in Bytes.
+    :param plots_directory: The directory to store the plots.
+    :param plot_options: A dictionary with the keyword arguments for
+        plot_series() ('points' and 'overlay').
+    """
+    plot_histogram(latencies, payload, plots_directory)
+    plot_series(latencies, payload, plots_directory, **plot_options)
+
+
+def plot_payload(
+    shared_name,
+    start,
+    end,
+    payload,
+    plots_directory,
+    plot_options
+):
+    """
+    Create the plots of a payload, reading its latencies from shared memory.
+
+    :param shared_name: The name of the shared memory block holding the
+        latencies as returned by partition_by_payload().
+    :param start: The offset of the first latency of the payload.
+    :param end: The offset after the last latency of the payload.
+    :param payload: The payload in Bytes.
+    :param plots_directory: The directory to store the plots.
+    :param plot_options: The plot options for plot_latencies().
+    """
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        latencies = np.ndarray(
+            (end - start,),
+            dtype=np.float64,
+            buffer=shared.buf,
+            offset=start * np.dtype(np.float64).itemsize
+        )
+        plot_latencies(latencies, payload, plots_directory, plot_options)
+        # The view must be released before closing the shared memory
+        del latencies
+    finally:
+        shared.close()
+
+
+def plot_stored_payload(
+    samples_file,
+    start,
+    end,
+    payload,
+    plots_directory,
+    plot_options
+):
+    """
+    Create the plots of a payload, reading its latencies from a samples store.
+
+    :param samples_file: The samples store file holding the latencies (see
+        write_samples_store()).
+    :param start: The offset of the first latency of the payload.
+    :param end: The offset after the last latency of the payload.
+    :param payload: The payload in Bytes.
+    :param plots_directory: The directory to store the plots.
+    :param plot_options: The plot options for plot_latencies().
+    """
+    latencies = np.load(samples_file, mmap_mode='r')[start:end]
+    plot_latencies(latencies, payload, plots_directory, plot_options)
+
+
+def create_payload_plots(
+    payloads,
+    latencies,
+    offsets,
+    plots_directory,
+    jobs,
+    plot_options={},
+    samples_file=None
+):
+    """
+    Create the histogram and series plots of every payload.
+
+    A pool of at most <jobs> processes renders the plots, each worker mapping
+    only the slice of the payload it is plotting, either from <samples_file>
+    or, if there is no samples store, from a shared memory block to which the
+    latencies are copied once.
+
+    :param payloads: The payloads, as returned by partition_by_payload().
+    :param latencies: The latencies, as returned by partition_by_payload().
+    :param offsets: The payload offsets, as returned by
+        partition_by_payload().
+    :param plots_directory: The directory to store the plots.
+    :param jobs: The maximum number of plotting processes.
+    :param plot_options: The plot options for plot_latencies().
+        Defaults: {}.
+    :param samples_file: The samples store file from which <latencies> were
+        loaded, if any. Defaults: None.
+    :raise: Any exception raised by a plotting worker.
+    """
+    if len(payloads) == 0:
+        return
+    if samples_file is not None:
+        tasks = [
+            (
+                samples_file,
+                offsets[i],
+                offsets[i + 1],
+                payload,
+                plots_directory,
+                plot_options,
+            ) for i, payload in enumerate(payloads)
+        ]
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            pool.starmap(plot_stored_payload, tasks, chunksize=1)
+        return
+
+    shared = shared_memory.SharedMemory(
+        create=True,
+        size=max(latencies.nbytes, 1)
+    )
+    try:
+        shared_latencies = np.ndarray(
+            latencies.shape,
+            dtype=np.float64,
+            buffer=shared.buf
+        )
+        shared_latencies[:] = latencies
+        del shared_latencies
+        tasks = [
+            (
+                shared.name,
+                offsets[i],
+                offsets[i + 1],
+                payload,
+                plots_directory,
+                plot_options,
+            ) for i, payload in enumerate(payloads)
+        ]
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            pool.starmap(plot_payload, tasks, chunksize=1)
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def process_measurements(raw_csv, output_csv, plots_directory, options):
+    """
+    Create the summary and plots of a latency measurements CSV file.
+
+    :param raw_csv: The path to the measurements CSV file.
+    :param output_csv: The path to store the summary CSV file.
+    :param plots_directory: The directory to store the plots.
+    :param options: The parsed command line arguments.
+    """
+    print('----------------------------')
+    if options.streaming is True:
+        # CSV summary file, without loading the whole raw CSV
+        print('Creating summary {} in streaming mode'.format(output_csv))
+        summary, histograms = create_streaming_latency_summary(
+            raw_csv,
+            chunk_size=options.chunk_size,
+            percentiles=options.percentiles,
+            jitter_percentiles=options.jitter_percentiles,
+            relative_accuracy=options.sketch_accuracy,
+            histogram_accuracy=options.histogram_accuracy,
+        )
+        histogram_csv = output_file(output_csv, 'histogram')
+        print('Creating histograms {}'.format(histogram_csv))
+        histograms.to_csv(histogram_csv, float_format='%.9g', index=False)
+        summary.to_csv(
+            output_csv,
+            float_format='%.{}f'.format(options.precision),
+            index=False
+        )
+        print('Plots are not generated in streaming mode')
+        print('----------------------------')
+        return
+
+    payloads, latencies, offsets, samples_file = load_measurements(raw_csv)
+    if samples_file is not None:
+        print('Loaded samples from {}'.format(samples_file))
+    elif options.ingest is True:
+        print('Storing samples of {}'.format(raw_csv))
+        write_samples_store(raw_csv, payloads, latencies, offsets)
+
+    warmup = None
+    if options.warmup is not None:
+        warmup = np.array([
+            detect_steady_state(latencies[offsets[i]:offsets[i + 1]])
+            for i in range(len(payloads))
+        ], dtype=np.int64)
+        print(
+            '{} warm-up samples detected in {}{}'.format(
+                warmup.sum(),
+                raw_csv,
+                ' (discarded)' if options.warmup == 'discard' else ''
+            )
+        )
+
+    # CSV summary file
+    print('Creating summary {}'.format(output_csv))
+    summary = create_latency_summary(
+        payloads,
+        latencies,
+        offsets,
+        percentiles=options.percentiles,
+        jitter_percentiles=options.jitter_percentiles,
+        warmup=warmup,
+        discard_warmup=options.warmup == 'discard',
+        expected_interval=options.expected_interval,
+    )
+    starts = offsets[:-1]
+    if options.warmup == 'discard':
+        starts = starts + warmup
+    if options.drift is True:
+        window_data, drift = create_drift_statistics(
+            payloads,
+            latencies,
+            offsets,
+            windows=options.drift_windows,
+            starts=starts,
+        )
+        summary['Drift slope'] = drift['Drift slope'].values
+        summary['Drift score'] = drift['Drift score'].values
+        windows_csv = output_file(output_csv, 'windows')
+        print('Creating drift windows {}'.format(windows_csv))
+        window_data.to_csv(
+            windows_csv,
+            float_format='%.{}f'.format(options.precision),
+            index=False
+        )
+    if options.spike_periods is True:
+        periods_csv = output_file(output_csv, 'periods')
+        print('Creating spike periods {}'.format(periods_csv))
+        create_spike_periods(
+            payloads,
+            latencies,
+            offsets,
+            spike_percentile=options.spike_percentile,
+            starts=starts,
+        ).to_csv(periods_csv, float_format='%.3f', index=False)
+    if options.exemplars is True:
+        tail_csv = output_file(output_csv, 'tail')
+        print('Creating tail exemplars {}'.format(tail_csv))
+        create_tail_exemplars(
+            payloads,
+            latencies,
+            offsets,
+            top=options.top_samples,
+            context=options.context_samples,
+            starts=starts,
+        ).to_csv(
+            tail_csv,
+            float_format='%.{}f'.format(options.precision),
+            index=False
+        )
+        bursts_csv = output_file(output_csv, 'bursts')
+        print('Creating burst statistics {}'.format(bursts_csv))
+        create_burst_statistics(
+            payloads,
+            latencies,
+            offsets,
+            spike_percentile=options.spike_percentile,
+            burst_gap=options.burst_gap,
+            starts=starts,
+        ).to_csv(bursts_csv, float_format='%.3f', index=False)
+    histograms = create_latency_histograms(
+        payloads,
+        latencies,
+        offsets,
+        relative_accuracy=options.histogram_accuracy,
+        starts=starts,
+    )
+    histogram_csv = output_file(output_csv, 'histogram')
+    print('Creating histograms {}'.format(histogram_csv))
+    histograms.to_csv(histogram_csv, float_format='%.9g', index=False)
+    summary.to_csv(
+        output_csv,
+        float_format='%.{}f'.format(options.precision),
+        index=False
+    )
+    print('----------------------------')
+
+    if options.no_plots is True:
+        print('Skipping plots')
+        return
+    plots_directory = directory_type(plots_directory)
+    plot_ccdf(histograms, plots_directory)
+    plot_options = {
+        'points': options.series_points,
+        'overlay': options.series_overlay,
+    }
+    if options.jobs > 1:
+        create_payload_plots(
+            payloads,
+            latencies,
+            offsets,
+            plots_directory,
+            jobs=options.jobs,
+            plot_options=plot_options,
+            samples_file=samples_file
+        )
+    else:
+        for i, payload in enumerate(payloads):
+            plot_latencies(
+                latencies[offsets[i]:offsets[i + 1]],
+                payload,
+                plots_directory,
+                plot_options
+            )
+    print('----------------------------')
+
+
+def measurements_files(results_directory):
+    """
+    Get the measurements CSV files of an experiment results directory.
+
+    The files are the ones named 'measurements_<experiment_type>.csv', leaving
+    out the files output by this script (see OUTPUT_SUFFIXES). A measurements
+    file whose CSV has been removed is also listed if its samples store
+    exists.
+
+    :param results_directory: The experiment results directory.
+    :return: A sorted list with the file names (without directory).
+    """
+    files = set()
+    for f in listdir(results_directory):
+        if not isfile('{}/{}'.format(results_directory, f)):
+            continue
+        if not f.startswith('measurements_'):
+            continue
+        if f.endswith('_samples.npy'):
+            files.add('{}.csv'.format(f[:-len('_samples.npy')]))
+        elif f.endswith('.csv'):
+            if f[:-len('.csv')].split('_')[-1] not in OUTPUT_SUFFIXES:
+                files.add(f)
+    return sorted(files)
+
+
+def process_results_directory(results_directory, options):
+    """
+    Process all the measurements CSV files of an experiment results directory.
+
+    The files are processed in parallel by a pool of at most <options.jobs>
+    processes, and the plots of each file are rendered in the process of the
+    file. For each 'measurements_<experiment_type>.csv' file, the summary is
+    stored as 'measurements_<experiment_type>_summary.csv', and the plots in
+    the 'plots/measurements_<experiment_type>' directory.
+
+    :param results_directory: The experiment results directory.
+    :param options: The parsed command line arguments.
+    :return: The number of files that could not be processed.
+    """
+    files = measurements_files(results_directory)
+    if len(files) == 0:
+        print('No measurements files found in {}'.format(results_directory))
+        return 0
+
+    jobs = options.jobs
+    file_options = argparse.Namespace(**vars(options))
+    file_options.jobs = 1
+
+    failures = 0
+    with multiprocessing.Pool(max(min(jobs, len(files)), 1)) as pool:
+        results = {}
+        for f in files:
+            name = f[:-len('.csv')]
+            results[f] = pool.apply_async(
+                process_measurements,
+                (
+                    '{}/{}'.format(results_directory, f),
+                    '{}/{}_summary.csv'.format(results_directory, name),
+                    '{}/plots/{}'.format(results_directory, name),
+                    file_options,
+                )
+            )
+        for f in files:
+            try:
+                results[f].get()
+            except Exception as e:
+                print('Error processing {}: {}'.format(f, e))
+                failures += 1
+    return failures
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -49,81 +1661,249 @@ if __name__ == '__main__':
         '--plots_directory',
         type=directory_type,
         help='The directory to store the plots',
-        required=True
+        required=False
     )
     parser.add_argument(
         '-c',
         '--raw_csv',
         help='The CSV file from which the data is extracted',
-        required=True
+        required=False
     )
     parser.add_argument(
         '-o',
         '--output_csv',
         help='The file name of the output CSV',
-        required=True
+        required=False
+    )
+    parser.add_argument(
+        '-r',
+        '--results_directory',
+        help="""An experiment results directory. All its measurements CSV
+                files are processed in parallel, storing each summary as
+                <file>_summary.csv, and each plots in plots/<file>. -p, -c,
+                and -o are ignored.""",
+        required=False
+    )
+    parser.add_argument(
+        '--percentiles',
+        nargs='+',
+        type=float,
+        help='The latency percentiles to add to the summary',
+        default=DEFAULT_PERCENTILES,
+        required=False
+    )
+    parser.add_argument(
+        '--jitter_percentiles',
+        nargs='+',
+        type=float,
+        help='The jitter percentiles to add to the summary',
+        default=[],
+        required=False
+    )
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help="""Read the raw CSV in chunks to keep the memory bounded. Only
+                the summary is generated, with the median and percentiles
+                estimated within the sketch accuracy.""",
+        required=False
+    )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        help='The number of rows to read at a time in streaming mode',
+        default=1000000,
+        required=False
+    )
+    parser.add_argument(
+        '--sketch_accuracy',
+        type=float,
+        help='The relative accuracy of the streaming mode percentiles',
+        default=SKETCH_RELATIVE_ACCURACY,
+        required=False
+    )
+    parser.add_argument(
+        '--ingest',
+        action='store_true',
+        help="""Store the samples of the raw CSV in binary format (as
+                <raw_csv>_samples.npy and <raw_csv>_index.csv), which is used
+                instead of the raw CSV on subsequent runs""",
+        required=False
+    )
+    parser.add_argument(
+        '--precision',
+        type=int,
+        help='The number of decimals of the summary values',
+        default=3,
+        required=False
+    )
+    parser.add_argument(
+        '--warmup',
+        choices=['report', 'discard'],
+        help="""Detect the warm-up samples at the beginning of each payload,
+                and report their number in a 'Warm-up samples' summary
+                column. With 'discard', the summary statistics are computed
+                over the steady state samples only""",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        '--expected_interval',
+        type=float,
+        help="""The expected interval between samples in us. If given, the
+                samples omitted during stalls are back-filled (coordinated
+                omission correction), and corrected percentiles are added to
+                the summary""",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        '--drift',
+        action='store_true',
+        help="""Store the median, 99 percentile, and maximum of windows of
+                consecutive samples in a '<name>_windows.csv' file next to
+                the summary, and add 'Drift slope' and 'Drift score' summary
+                columns""",
+        required=False
+    )
+    parser.add_argument(
+        '--drift_windows',
+        type=int,
+        help='The number of windows per payload of the drift statistics',
+        default=DRIFT_WINDOWS,
+        required=False
+    )
+    parser.add_argument(
+        '--spike_periods',
+        action='store_true',
+        help="""Store the dominant periods of the latency spikes of each
+                payload in a '<name>_periods.csv' file next to the summary""",
+        required=False
+    )
+    parser.add_argument(
+        '--spike_percentile',
+        type=float,
+        help="""The latency percentile above which a sample is a spike for
+                --spike_periods and --exemplars""",
+        default=99,
+        required=False
+    )
+    parser.add_argument(
+        '--exemplars',
+        action='store_true',
+        help="""Store the worst samples of each payload, with the samples
+                around them, in a '<name>_tail.csv' file, and the statistics
+                of the bursts of spikes in a '<name>_bursts.csv' file, next
+                to the summary""",
+        required=False
+    )
+    parser.add_argument(
+        '--top_samples',
+        type=int,
+        help='The number of worst samples per payload for --exemplars',
+        default=10,
+        required=False
+    )
+    parser.add_argument(
+        '--context_samples',
+        type=int,
+        help="""The number of samples stored before and after each worst
+                sample for --exemplars""",
+        default=5,
+        required=False
+    )
+    parser.add_argument(
+        '--burst_gap',
+        type=int,
+        help="""The maximum number of samples between two spikes of the same
+                burst for --exemplars""",
+        default=10,
+        required=False
+    )
+    parser.add_argument(
+        '--no_plots',
+        action='store_true',
+        help='Create only the summary, without histograms and series plots',
+        required=False
+    )
+    parser.add_argument(
+        '--histogram_accuracy',
+        type=float,
+        help="""The relative accuracy of the log-binned histograms stored in
+                '<name>_histogram.csv' next to the summary""",
+        default=HISTOGRAM_RELATIVE_ACCURACY,
+        required=False
+    )
+    parser.add_argument(
+        '--ccdf_from',
+        help="""Redraw the CCDF plot of -p from a '<name>_histogram.csv'
+                file, without processing any measurements""",
+        required=False
+    )
+    parser.add_argument(
+        '--series_points',
+        type=int,
+        help="""The maximum number of samples drawn in the series plots
+                (min/max envelope of the series)""",
+        default=DEFAULT_SERIES_POINTS,
+        required=False
+    )
+    parser.add_argument(
+        '--series_overlay',
+        action='store_true',
+        help="""Overlay the median and percentile 99 of windows of consecutive
+                samples on the series plots""",
+        required=False
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help="""The maximum number of processes rendering plots, or
+                processing files with -r""",
+        default=len(sched_getaffinity(0)),
+        required=False
     )
     args = parser.parse_args()
-    plots_directory = args.plots_directory
-    raw_csv = args.raw_csv
-    output_csv = args.output_csv
 
-    # Make sure output file only contains headers
-    with open(output_csv, 'w') as output_file:
-        output_file.write('Bytes,Samples,Max,Min,Mean,Median,Stdev,Mean jitter,Max jitter,90%,99%,99.99%\n')
+    if args.streaming is True and args.warmup is not None:
+        parser.error('--warmup is not supported in streaming mode')
+    if args.streaming is True and args.expected_interval is not None:
+        parser.error('--expected_interval is not supported in streaming mode')
+    if args.expected_interval is not None and args.expected_interval <= 0:
+        parser.error('--expected_interval must be positive')
+    if args.streaming is True and args.drift is True:
+        parser.error('--drift is not supported in streaming mode')
+    if args.streaming is True and args.spike_periods is True:
+        parser.error('--spike_periods is not supported in streaming mode')
+    if args.streaming is True and args.exemplars is True:
+        parser.error('--exemplars is not supported in streaming mode')
 
-    print('----------------------------')
-    raw_data = pandas.read_csv(raw_csv)
-    payloads = raw_data['Payload [Bytes]'].unique()
-    for payload in payloads:
-        sample_series = raw_data[raw_data['Payload [Bytes]'] == payload]
-        sample_series = sample_series.reset_index(drop=True)
-
-        # Jitter
-        jitters = []
-        latencies = sample_series['Latency [us]']
-        for i in range(1, len(latencies)):
-            jitters.append(abs(latencies[i] - latencies[i-1]))
-
-        # CSV summary file
-        print('Adding entry for payload {} Bytes to {}'.format(payload, output_csv))
-        with open(output_csv, 'a') as output_file:
-            output_file.write(
-                '{},{},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f}\n'.format(
-                    payload,
-                    len(latencies),
-                    np.max(latencies.to_list()),
-                    np.min(latencies.to_list()),
-                    np.mean(latencies.to_list()),
-                    np.median(latencies.to_list()),
-                    np.std(latencies.to_list()),
-                    np.mean(jitters),
-                    np.max(jitters),
-                    np.percentile(latencies.to_list(), 90),
-                    np.percentile(latencies.to_list(), 99),
-                    np.percentile(latencies.to_list(), 99.99),
-                )
-            )
+    if args.ccdf_from is not None:
+        if args.plots_directory is None:
+            parser.error('-p is required with --ccdf_from')
+        plot_ccdf(
+            pandas.read_csv(args.ccdf_from),
+            directory_type(args.plots_directory)
+        )
+        exit(0)
 
-        # Histogram
-        fig_title = '{}/histogram_{}.png'.format(plots_directory, payload)
-        print('Generating {}'.format(fig_title))
-        fig = plt.figure()
-        histogram = sample_series.hist(bins=100, column='Latency [us]')
-        plt.xlabel('Latency [us]')
-        plt.ylabel('Number of occurrences')
-        plt.title('Latency Histogram - {} Bytes'.format(payload))
-        plt.savefig(fig_title)
-        plt.close(fig)
-
-        # Sample series
-        fig_title = '{}/series_{}.png'.format(plots_directory, payload)
-        print('Generating {}'.format(fig_title))
-        sample_series = sample_series.plot(y='Latency [us]')
-        plt.xlabel('Sample number')
-        plt.ylabel('Latency [us]')
-        plt.title('Latency Series - {} Bytes'.format(payload))
-        plt.savefig(fig_title)
-        plt.close(sample_series.get_figure())
-        print('----------------------------')
+    if args.results_directory is not None:
+        # Process all the measurements files in the directory
+        failures = process_results_directory(
+            args.results_directory.rstrip('/'),
+            args
+        )
+        if failures > 0:
+            print('{} measurements files failed'.format(failures))
+            exit(1)
+        exit(0)
 
+    if None in [args.plots_directory, args.raw_csv, args.output_csv]:
+        parser.error('-p, -c, and -o are required unless -r is given')
+    process_measurements(
+        args.raw_csv,
+        args.output_csv,
+        args.plots_directory,
+        args
+    )
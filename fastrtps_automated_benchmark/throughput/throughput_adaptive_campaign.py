@@ -0,0 +1,479 @@
+# Copyright 2019 Proyectos y Sistemas de Mantenimiento SL (eProsima).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""."""
+import argparse
+import logging
+import subprocess
+from os import listdir
+from os import makedirs
+from os.path import abspath
+from os.path import dirname
+from os.path import isdir
+from os.path import isfile
+from os.path import realpath
+
+import numpy as np
+
+import pandas
+
+# Measurements columns
+PAYLOAD = 'Payload [Bytes]'
+DEMAND = 'Demand [sample/burst]'
+RECOVERY = 'Recovery time [ms]'
+SUB_THROUGHPUT = 'Subscription throughput [Mb/s]'
+# Boundary columns
+LOSSLESS_DEMAND = 'Lossless demand [sample/burst]'
+LOSSY_DEMAND = 'Lossy demand [sample/burst]'
+LOSSLESS_THROUGHPUT = 'Lossless throughput [Mb/s]'
+# Measurements are grouped by experiment type, payload, and recovery time
+BOUNDARY_KEYS = ['Experiment type', PAYLOAD, RECOVERY]
+
+
+def experiment_type(filename):
+    """
+    Get experiment type of a measurements file based on its name.
+
+    Get experiment type of a measurements file based on its name
+    ('measurements_<experiment_type>.csv').
+
+    :param filename: The name of the measurements file.
+    :raise: AssertionError if filename is not a string.
+    :return: The experiment type as a string.
+    """
+    assert(isinstance(filename, str))
+    exp_type = filename.split('/')[-1].split('.')[-2].split('_')[1:]
+    exp_type = '_'.join(exp_type)
+    return exp_type
+
+
+def read_grid_file(grid_file):
+    """
+    Read a semicolon separated grid file of the throughput test.
+
+    :param grid_file: The path to the grid file, e.g. 'payloads_demands.csv'
+        or 'recoveries.csv'.
+    :return: A list with a list of integers per line of the file.
+    """
+    with open(grid_file) as f:
+        return [
+            [int(value) for value in line.split(';')]
+            for line in f if line.strip() != ''
+        ]
+
+
+def write_grid_file(grid_file, rows):
+    """
+    Write a semicolon separated grid file of the throughput test.
+
+    :param grid_file: The path to the grid file.
+    :param rows: A list with a list of integers per line of the file.
+    """
+    with open(grid_file, 'w') as f:
+        for row in rows:
+            f.write('{}\n'.format(';'.join([str(value) for value in row])))
+
+
+def load_campaign(campaign_directory):
+    """
+    Load the measurements of all the iterations of a campaign.
+
+    The measurements of iteration <i> and recovery time <r> are the
+    'measurements_<experiment_type>.csv' files in
+    '<campaign_directory>/iteration_<i>/recovery_<r>'.
+
+    :param campaign_directory: The campaign directory.
+    :return: A tuple with the number of the next iteration, and a DataFrame
+        with the measurements and their 'Experiment type' (None if there are
+        no measurements).
+    """
+    iterations = sorted(
+        [
+            int(d[len('iteration_'):]) for d in listdir(campaign_directory)
+            if d.startswith('iteration_') and
+            isdir('{}/{}'.format(campaign_directory, d))
+        ]
+    )
+    measurements = []
+    for iteration in iterations:
+        iteration_dir = '{}/iteration_{}'.format(campaign_directory, iteration)
+        for run in sorted(listdir(iteration_dir)):
+            run_dir = '{}/{}'.format(iteration_dir, run)
+            if not isdir(run_dir):
+                continue
+            for f in sorted(listdir(run_dir)):
+                if f.startswith('measurements_') and f.endswith('.csv'):
+                    data = pandas.read_csv('{}/{}'.format(run_dir, f))
+                    data.insert(0, 'Experiment type', experiment_type(f))
+                    measurements.append(data)
+
+    next_iteration = iterations[-1] + 1 if len(iterations) > 0 else 0
+    if len(measurements) == 0:
+        return next_iteration, None
+    return next_iteration, pandas.concat(measurements, ignore_index=True)
+
+
+def lossless_boundary(measurements, payloads, recoveries):
+    """
+    Get the lossless demand boundary of the measurements.
+
+    For each experiment type, payload, and recovery time, the boundary is
+    bracketed by the lowest demand that lost samples, and the highest demand
+    below it that did not. Lossless demands above a lossy one are taken as
+    noise, so the boundary is conservative.
+
+    :param measurements: A DataFrame with the measurements and their
+        'Experiment type'.
+    :param payloads: The payloads of the campaign.
+    :param recoveries: The recovery times of the campaign.
+    :return: A DataFrame with a row per experiment type, payload, and
+        recovery time, with the lossless and lossy demands (NaN if there is
+        none), and the subscription throughput of the lossless demand.
+    """
+    lost = measurements['Lost [samples]'] > 0
+    lossy = measurements[lost].groupby(BOUNDARY_KEYS)[DEMAND].min()
+    lossy = lossy.rename(LOSSY_DEMAND).reset_index()
+
+    lossless = measurements[~lost].merge(lossy, on=BOUNDARY_KEYS, how='left')
+    lossless = lossless[
+        lossless[LOSSY_DEMAND].isnull() |
+        (lossless[DEMAND] < lossless[LOSSY_DEMAND])
+    ].reset_index(drop=True)
+    lossless = lossless.loc[
+        lossless.groupby(BOUNDARY_KEYS)[DEMAND].idxmax().values,
+        BOUNDARY_KEYS + [DEMAND, SUB_THROUGHPUT]
+    ].rename(
+        columns={
+            DEMAND: LOSSLESS_DEMAND,
+            SUB_THROUGHPUT: LOSSLESS_THROUGHPUT
+        }
+    )
+
+    boundary = pandas.MultiIndex.from_product(
+        [measurements['Experiment type'].unique(), payloads, recoveries],
+        names=BOUNDARY_KEYS
+    ).to_frame(index=False)
+    boundary = boundary.merge(lossless, on=BOUNDARY_KEYS, how='left')
+    boundary = boundary.merge(lossy, on=BOUNDARY_KEYS, how='left')
+    return boundary[
+        BOUNDARY_KEYS +
+        [LOSSLESS_DEMAND, LOSSY_DEMAND, LOSSLESS_THROUGHPUT]
+    ]
+
+
+def next_demands(boundary, demand_ranges, tolerance):
+    """
+    Get the demands to measure in the next iteration of the campaign.
+
+    The lossless boundary of each experiment type, payload, and recovery time
+    is searched by bisection in logarithmic scale, starting from the demand
+    range of the payload. A boundary is found when the lossy demand is at
+    most (1 + <tolerance>) times the lossless one, or when there is no
+    lossless (or no lossy) demand in the range.
+
+    :param boundary: A DataFrame as returned by lossless_boundary().
+    :param demand_ranges: A dictionary with the (minimum, maximum) demand of
+        each payload.
+    :param tolerance: The relative width of a found boundary.
+    :return: A tuple with a DataFrame with the recovery times, payloads, and
+        demands to measure, and a boolean array with whether the boundary of
+        each row of <boundary> is found.
+    """
+    low = boundary[PAYLOAD].map(lambda p: demand_ranges[p][0]).values
+    high = boundary[PAYLOAD].map(lambda p: demand_ranges[p][1]).values
+    lossless = boundary[LOSSLESS_DEMAND].values.astype(float)
+    lossy = boundary[LOSSY_DEMAND].values.astype(float)
+
+    with np.errstate(invalid='ignore'):
+        # Measure the ends of the range until the boundary is bracketed
+        below = np.isnan(lossless) & ~(lossy <= low)
+        above = np.isnan(lossy) & ~(lossless >= high)
+        bracketed = (
+            ~np.isnan(lossless) & ~np.isnan(lossy) &
+            (lossy > lossless * (1 + tolerance)) &
+            (lossy - lossless > 1)
+        )
+        middle = np.clip(
+            np.rint(np.sqrt(lossless * lossy)),
+            lossless + 1,
+            lossy - 1
+        )
+
+    demands = pandas.concat(
+        [
+            pandas.DataFrame(
+                {
+                    RECOVERY: boundary[RECOVERY].values[mask],
+                    PAYLOAD: boundary[PAYLOAD].values[mask],
+                    DEMAND: values[mask].astype(int),
+                }
+            ) for mask, values in [
+                (below, low),
+                (above, high),
+                (bracketed, middle),
+            ]
+        ],
+        ignore_index=True
+    ).drop_duplicates().sort_values([RECOVERY, PAYLOAD, DEMAND])
+    return demands.reset_index(drop=True), ~(below | above | bracketed)
+
+
+def run_iteration(
+    run_script,
+    colcon_ws,
+    campaign_directory,
+    iteration,
+    demands
+):
+    """
+    Run the throughput test for the demands of an iteration.
+
+    The test is run once per recovery time, writing the grid files of the
+    run ('payloads_demands.csv' and 'recoveries.csv') to
+    '<campaign_directory>/iteration_<iteration>/recovery_<r>', where the
+    measurements are stored as well.
+
+    :param run_script: The script running the throughput test, with the
+        arguments of 'throughput_run_experiment.bash'.
+    :param colcon_ws: The colcon workspace root directory.
+    :param campaign_directory: The campaign directory.
+    :param iteration: The number of the iteration.
+    :param demands: A DataFrame as returned by next_demands().
+    :return: The exit code of the first failed run, 0 otherwise.
+    """
+    for recovery, recovery_demands in demands.groupby(RECOVERY):
+        run_dir = '{}/iteration_{}/recovery_{}'.format(
+            campaign_directory,
+            iteration,
+            recovery
+        )
+        makedirs(run_dir)
+        demands_file = '{}/payloads_demands.csv'.format(run_dir)
+        recoveries_file = '{}/recoveries.csv'.format(run_dir)
+        write_grid_file(
+            demands_file,
+            [
+                [payload] + payload_demands.tolist()
+                for payload, payload_demands
+                in recovery_demands.groupby(PAYLOAD)[DEMAND]
+            ]
+        )
+        write_grid_file(recoveries_file, [[recovery]])
+
+        logger.info(
+            'Iteration {}: running {} demands with recovery time {} ms'.format(
+                iteration,
+                len(recovery_demands),
+                recovery
+            )
+        )
+        exit_code = subprocess.call(
+            [
+                'bash',
+                run_script,
+                '-c',
+                colcon_ws,
+                '-r',
+                run_dir,
+                '-d',
+                demands_file,
+                '-t',
+                recoveries_file,
+            ]
+        )
+        if exit_code != 0:
+            logger.error(
+                'Throughput test failed with exit code {}'.format(exit_code)
+            )
+            return exit_code
+    return 0
+
+
+if __name__ == '__main__':
+    script_dir = dirname(realpath(__file__))
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="""
+            Script to run an adaptive throughput campaign. Instead of
+            measuring the whole demand and recovery time grid, the lossless
+            demand boundary of each experiment type, payload, and recovery
+            time is searched by bisection, running the throughput test once
+            per iteration and recovery time with the grid files of the
+            iteration. The demand range of each payload is the one of
+            <demands>. The campaign can be resumed, as the measurements of
+            previous iterations are read from <campaign_directory>. In the
+            end, the boundary is stored as 'lossless_boundary.csv', and the
+            measurements of all the iterations as
+            'measurements_<experiment_type>.csv', in <campaign_directory>.
+        """
+    )
+    parser.add_argument(
+        '-c',
+        '--colcon_ws',
+        help='The colcon workspace root directory',
+        required=True
+    )
+    parser.add_argument(
+        '-r',
+        '--campaign_directory',
+        help='The directory to store the campaign iterations and results',
+        required=True
+    )
+    parser.add_argument(
+        '-d',
+        '--demands',
+        help="""A throughput demands CSV file, with the demand range of each
+                payload""",
+        required=False,
+        default='{}/payloads_demands.csv'.format(script_dir)
+    )
+    parser.add_argument(
+        '-t',
+        '--recoveries',
+        help='A throughput recoveries CSV file',
+        required=False,
+        default='{}/recoveries.csv'.format(script_dir)
+    )
+    parser.add_argument(
+        '-i',
+        '--max_iterations',
+        type=int,
+        help="""The maximum number of iterations of the campaign, including
+                the ones of a resumed campaign""",
+        required=False,
+        default=12
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        help="""The maximum lossy to lossless demand ratio, minus one, of a
+                found boundary""",
+        required=False,
+        default=0.05
+    )
+    parser.add_argument(
+        '--run_script',
+        help="""The script running the throughput test, with the arguments
+                of 'throughput_run_experiment.bash'""",
+        required=False,
+        default='{}/throughput_run_experiment.bash'.format(script_dir)
+    )
+    parser.add_argument(
+        '--debug',
+        action='store_true',
+        help='Set logging level to debug.'
+    )
+    args = parser.parse_args()
+
+    # Create a custom logger
+    logger = logging.getLogger('THROUGHPUT.ADAPTIVE.CAMPAIGN')
+    # Create handlers
+    c_handler = logging.StreamHandler()
+    # Create formatters and add it to handlers
+    c_format = (
+        '[%(asctime)s][%(filename)s:%(lineno)s][%(funcName)s()]' +
+        '[%(levelname)s] %(message)s'
+    )
+    c_format = logging.Formatter(c_format)
+    c_handler.setFormatter(c_format)
+    # Add handlers to the logger
+    logger.addHandler(c_handler)
+    # Set log level
+    if args.debug is True:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    for f in [args.demands, args.recoveries, args.run_script]:
+        if not isfile(f):
+            parser.error('Cannot find {}'.format(f))
+    if args.tolerance <= 0:
+        parser.error('--tolerance must be positive')
+
+    demand_ranges = {
+        row[0]: (min(row[1:]), max(row[1:]))
+        for row in read_grid_file(args.demands)
+    }
+    payloads = sorted(demand_ranges.keys())
+    recoveries = sorted(read_grid_file(args.recoveries)[0])
+    campaign_directory = abspath(args.campaign_directory)
+    if not isdir(campaign_directory):
+        makedirs(campaign_directory)
+
+    iteration, measurements = load_campaign(campaign_directory)
+    while iteration < args.max_iterations:
+        if measurements is None:
+            # First iteration: measure the ends of the ranges
+            demands = pandas.DataFrame(
+                [
+                    [recovery, payload, demand]
+                    for recovery in recoveries
+                    for payload in payloads
+                    for demand in sorted(set(demand_ranges[payload]))
+                ],
+                columns=[RECOVERY, PAYLOAD, DEMAND]
+            )
+        else:
+            demands, _ = next_demands(
+                lossless_boundary(measurements, payloads, recoveries),
+                demand_ranges,
+                args.tolerance
+            )
+        if len(demands) == 0:
+            break
+
+        exit_code = run_iteration(
+            args.run_script,
+            abspath(args.colcon_ws),
+            campaign_directory,
+            iteration,
+            demands
+        )
+        if exit_code != 0:
+            exit(exit_code)
+        iteration, measurements = load_campaign(campaign_directory)
+
+    if measurements is None:
+        logger.error('No measurements found in {}'.format(campaign_directory))
+        exit(1)
+
+    # Store the boundary and the measurements of the campaign
+    boundary = lossless_boundary(measurements, payloads, recoveries)
+    _, found = next_demands(boundary, demand_ranges, args.tolerance)
+    boundary['Found'] = found
+    boundary_file = '{}/lossless_boundary.csv'.format(campaign_directory)
+    logger.info('Generating {}'.format(boundary_file))
+    boundary.to_csv(boundary_file, float_format='%.3f', index=False)
+    for exp_type, data in measurements.groupby('Experiment type'):
+        measurements_file = '{}/measurements_{}.csv'.format(
+            campaign_directory,
+            exp_type
+        )
+        logger.info('Generating {}'.format(measurements_file))
+        data.drop(columns='Experiment type').sort_values(
+            [PAYLOAD, DEMAND, RECOVERY],
+            kind='mergesort'
+        ).to_csv(measurements_file, float_format='%.3f', index=False)
+
+    if not found.all():
+        logger.warning(
+            '{} of {} boundaries not found in {} iterations'.format(
+                (~found).sum(),
+                len(found),
+                iteration
+            )
+        )
+    logger.info(
+        '{} measurements in {} iterations'.format(len(measurements), iteration)
+    )
@@ -20,12 +20,20 @@ Script to check the results of a throughput experiment, performed with
 file in the format output by "throughput_determine_requirements.py". The script
 generates check plots in the <plots_directory> directory, as well as CSV files
 for each check, placed in the <experiment_directory> directory.
+
+Requirements derived with "--grid" (with "Demand [sample/burst]" and
+"Recovery time [ms]" columns) are checked against every operating point of the
+measurements instead of against the summaries, with a joint criterion: an
+operating point passes if its throughput is not below the requirement and its
+lost samples [%] are not above theirs.
 """
 
 import argparse
 import logging
+import multiprocessing
 from os import listdir
 from os import makedirs
+from os import sched_getaffinity
 from os.path import abspath
 from os.path import isdir
 from os.path import isfile
@@ -36,6 +44,20 @@ import matplotlib.pyplot as plt
 
 import pandas
 
+# Columns checked against the requirements. The bit i of the return code of an
+# experiment type is set if check CHECK_COLUMNS[i] failed.
+CHECK_COLUMNS = ['Lost [samples]', 'Subscription throughput [Mb/s]']
+# Columns identifying an operating point, and columns checked against the
+# requirements of every operating point. The return code bits are the ones of
+# CHECK_COLUMNS.
+GRID_KEYS = [
+    'Experiment type',
+    'Payload [Bytes]',
+    'Demand [sample/burst]',
+    'Recovery time [ms]',
+]
+GRID_CHECK_COLUMNS = ['Lost [%]', 'Subscription throughput [Mb/s]']
+
 
 def directory_type(directory):
     """
@@ -70,155 +92,216 @@ def experiment_type(filename):
     return exp_type
 
 
-def check_requirement(
-    requirements_data,
-    experiment_data,
-    column,
-    payload
+def check_requirements(
+    requirements,
+    summaries,
 ):
     """
-    Check if a single result meets the requirement.
-
-    :param requirements_data: A Pandas DataFrame with at least column <column>,
-        and only one entry.
-    :param experiment_data: A Pandas DataFrame with at least column <column>,
-        and only one entry.
-    :param column: The column to check
-    :param payload: The checked payload.
+    Check the results of several experiment types against requirements.
+
+    Check experiment results in terms of lost samples and subscription
+    throughput. The requirements and the summaries are joined on
+    ('Experiment type', 'Payload [Bytes]') once, and all the checks are
+    evaluated as column operations. A lost samples check fails if the
+    experiment lost more samples than the requirement, a throughput check
+    fails if the experiment throughput is under the requirement, and both fail
+    if there is no result for a required payload.
+
+    :param requirements: A Pandas DataFrame with one row entry per experiment
+        type and payload, and at least the columns "Experiment type",
+        "Payload [Bytes]", "Lost [samples]", and
+        "Subscription throughput [Mb/s]".
+    :param summaries: A Pandas DataFrame with at least the same columns as
+        <requirements>. Only the first entry of each experiment type and
+        payload is checked.
     :raise: AssertionError if:
-        * <requirements_data> is not a DataFrame
-        * <experiment_data> is not a DataFrame
-        * <column> is not on <requirements_data> and in <experiment_data>
-        * <column> is not a string
-        * <payload> is not a string
-    :return: False on check failure, True on check pass
-    :return: A one entry Pandas DataFrame with columns: 'Check',
+        * requirements is not a DataFrame
+        * summaries is not a DataFrame
+        * Any of the mandatory columns is not in the DataFrames
+    :return: A dictionary with the experiment types of <summaries> as keys,
+        and their return codes as values (0 success, else the bit i is set if
+        check CHECK_COLUMNS[i] failed for some payload).
+    :return: A DataFrame with columns 'Experiment type', 'Check',
         'Payload [Bytes]', 'Requirement', 'Experiment', 'Difference',
         'Percentage over requirement', and 'Status' (either "failed" or
-        "passed").
+        "passed"), with one entry per check and required payload of each
+        experiment type of <summaries>, ordered by check.
     """
-    assert(isinstance(requirements_data, pandas.DataFrame))
-    assert(isinstance(experiment_data, pandas.DataFrame))
-    assert(isinstance(column, str))
-    assert(column in requirements_data)
-    assert(column in experiment_data)
-    assert(isinstance(payload, str))
-
-    # Get the requirement
-    req = requirements_data[column].values[0]
-    # Get the experiment result
-    exp = experiment_data[column].values[0]
-
-    diff = req - exp  # Difference
-    # Percentage of result over the requirement
-    perc = ((-diff * 100) / req) if req != 0 else (-diff * 100)
-
-    passed = True
-    if column == 'Lost [samples]':
-        passed = bool(diff >= 0)
-    elif column == 'Subscription throughput [Mb/s]':
-        passed = bool(diff <= 0)
-
-    # Resulting DataFrame
-    result = pandas.DataFrame(
-        {
-            'Check': column,
-            'Payload [Bytes]': payload,
-            'Requirement': [req],
-            'Experiment': [exp],
-            'Difference': [abs(diff)],
-            'Percentage over requirement': [perc],
-            'Status': ['passed' if passed else 'failed']
-        }
+    # Validate arguments
+    assert(isinstance(requirements, pandas.DataFrame))
+    assert(isinstance(summaries, pandas.DataFrame))
+
+    # Validate that columns in dataframes
+    keys = ['Experiment type', 'Payload [Bytes]']
+    for column in keys + CHECK_COLUMNS:
+        assert(column in requirements)
+        assert(column in summaries)
+
+    # Join the requirements of the checked experiment types with their results
+    exp_types = summaries['Experiment type'].unique()
+    joined = requirements[
+        requirements['Experiment type'].isin(exp_types)
+    ][keys + CHECK_COLUMNS].merge(
+        summaries[keys + CHECK_COLUMNS].drop_duplicates(keys),
+        how='left',
+        on=keys,
+        suffixes=(' requirement', ' experiment')
     )
-    logger.debug(
-        'Check for "{}" {} bytes {}. Result: \n{}'.format(
-            column,
-            payload,
-            'passed' if passed else 'failed',
-            result
+    logger.debug('Joined requirements and results:\n{}'.format(joined))
+
+    # Evaluate each check for all the experiment types and payloads at once
+    column_checks = []
+    for column in CHECK_COLUMNS:
+        req = joined['{} requirement'.format(column)]  # Requirements
+        exp = joined['{} experiment'.format(column)]  # Experiment results
+        diff = req - exp  # Difference
+        # Percentage of result over the requirement
+        perc = (-diff * 100) / req.where(req != 0, 1)
+        if column == 'Lost [samples]':
+            passed = diff >= 0
+        else:
+            passed = diff <= 0
+        column_checks.append(
+            pandas.DataFrame(
+                {
+                    'Experiment type': joined['Experiment type'],
+                    'Check': column,
+                    'Payload [Bytes]': joined['Payload [Bytes]'],
+                    'Requirement': req,
+                    'Experiment': exp,
+                    'Difference': diff.abs(),
+                    'Percentage over requirement': perc,
+                    'Status': passed.map({True: 'passed', False: 'failed'}),
+                }
+            )
         )
-    )
-    return passed, result
+    checks = pandas.concat(column_checks, ignore_index=True)
+    passed = checks['Status'] == 'passed'
+
+    # Set bit i of the return code if any payload fails CHECK_COLUMNS[i]
+    failed = checks[~passed].drop_duplicates(['Experiment type', 'Check'])
+    codes = failed['Check'].map(
+        {column: pow(2, i) for i, column in enumerate(CHECK_COLUMNS)}
+    ).groupby(failed['Experiment type']).sum()
+    return_codes = {
+        exp_type: int(codes.get(exp_type, 0)) for exp_type in exp_types
+    }
+    logger.debug('Return codes: {}'.format(return_codes))
+    return return_codes, checks
 
 
-def check_requirements(
-    requirements,
-    experiment,
-):
+def check_grid_requirements(requirements, measurements):
     """
-    Check results of an experiment type agains requirements.
-
-    Check experiment results in terms of median, percentile 99, and maximum
-    throughput.
-
-    :param requirements: A Pandas DataFrame with one row entry per payload, and
-        at least the columns "Bytes", "Median", "99%", and "Max".
-    :param experiment: A Pandas DataFrame with one row entry per payload, and
-        at least the columns "Bytes", "Median", "99%", and "Max".
+    Check every operating point of several experiment types.
+
+    The requirements and the measurements are joined on GRID_KEYS once, and
+    all the operating points are checked as column operations. An operating
+    point passes if its subscription throughput is not below the requirement,
+    and its lost samples [%] are not above theirs. Both fail if there is no
+    measurement for a required operating point.
+
+    :param requirements: A Pandas DataFrame with one row entry per operating
+        point, and at least the columns GRID_KEYS and GRID_CHECK_COLUMNS.
+    :param measurements: A Pandas DataFrame with at least the same columns as
+        <requirements>. Only the first entry of each operating point is
+        checked.
     :raise: AssertionError if:
         * requirements is not a DataFrame
-        * experiment is not a DataFrame
+        * measurements is not a DataFrame
         * Any of the mandatory columns is not in the DataFrames
-    :return: A return code (0 success)
-    :return: A dictionary with one entry per check (Median, 99%, and Max). Each
-        entry is a DataFrame as returned from check_requirement()
-
+    :return: A dictionary with the experiment types of <measurements> as keys,
+        and their return codes as values (0 success, else bit 0 is set if the
+        lost samples of some operating point are above the requirement, and
+        bit 1 if its throughput is below).
+    :return: A DataFrame with columns GRID_KEYS, 'Throughput requirement',
+        'Throughput', 'Loss requirement [%]', 'Loss [%]', and 'Status' (either
+        "failed" or "passed"), with one entry per required operating point of
+        each experiment type of <measurements>.
     """
     # Validate arguments
     assert(isinstance(requirements, pandas.DataFrame))
-    assert(isinstance(experiment, pandas.DataFrame))
-
-    # Columns to check
-    columns = [
-        'Payload [Bytes]',
-        'Lost [samples]',
-        'Subscription throughput [Mb/s]'
-    ]
+    assert(isinstance(measurements, pandas.DataFrame))
 
     # Validate that columns in dataframes
-    for column in columns:
+    for column in GRID_KEYS + GRID_CHECK_COLUMNS:
         assert(column in requirements)
-        assert(column in experiment)
-
-    return_code = 0
-    columns.pop(0)  # Remove 'Payload [Bytes]' column
-
-    checks = {}
+        assert(column in measurements)
+
+    # Join the requirements of the checked experiment types with their results
+    exp_types = measurements['Experiment type'].unique()
+    joined = requirements[
+        requirements['Experiment type'].isin(exp_types)
+    ][GRID_KEYS + GRID_CHECK_COLUMNS].merge(
+        measurements[GRID_KEYS + GRID_CHECK_COLUMNS].drop_duplicates(
+            GRID_KEYS
+        ),
+        how='left',
+        on=GRID_KEYS,
+        suffixes=(' requirement', ' experiment')
+    )
+    logger.debug('Joined requirements and results:\n{}'.format(joined))
 
-    # Iterate over the payloads
-    payloads = requirements['Payload [Bytes]'].unique()
-    for payload in payloads:
-        # Extract payload data
-        requirements_data = requirements[
-            requirements['Payload [Bytes]'] == payload
-        ]
-        result_data = experiment[experiment['Payload [Bytes]'] == payload]
-
-        # Check payload data for each column
-        i = 0
-        logger.debug('Checking columns {} {} bytes'.format(columns, payload))
-        for column in columns:
-            check, failed = check_requirement(
-                requirements_data,
-                result_data,
-                column,
-                str(payload)
-            )
+    # Evaluate the joint criterion for all the operating points at once
+    loss_passed = (
+        joined['Lost [%] experiment'] <= joined['Lost [%] requirement']
+    )
+    throughput_passed = (
+        joined['Subscription throughput [Mb/s] experiment'] >=
+        joined['Subscription throughput [Mb/s] requirement']
+    )
+    passed = loss_passed & throughput_passed
+    checks = joined[GRID_KEYS].copy()
+    checks['Throughput requirement'] = joined[
+        'Subscription throughput [Mb/s] requirement'
+    ]
+    checks['Throughput'] = joined['Subscription throughput [Mb/s] experiment']
+    checks['Loss requirement [%]'] = joined['Lost [%] requirement']
+    checks['Loss [%]'] = joined['Lost [%] experiment']
+    checks['Status'] = passed.map({True: 'passed', False: 'failed'})
+
+    # Set bit 0 if any operating point loses too many samples, and bit 1 if
+    # any has too little throughput
+    codes = (
+        (~loss_passed).groupby(joined['Experiment type']).any() * 1 +
+        (~throughput_passed).groupby(joined['Experiment type']).any() * 2
+    )
+    return_codes = {
+        exp_type: int(codes.get(exp_type, 0)) for exp_type in exp_types
+    }
+    logger.debug('Return codes: {}'.format(return_codes))
+    return return_codes, checks
 
-            # Append results
-            if column not in checks:
-                checks[column] = pandas.DataFrame()
-            checks[column] = checks[column].append(failed, sort=False)
-            checks[column] = checks[column].reset_index(drop=True)
 
-            # Update return_code
-            if check is False:
-                return_code += pow(2, i)
-            i += 1
+def load_grid_measurements(experiment_directory):
+    """
+    Load the measurements of all the experiment types of an experiment.
 
-    logger.debug('Return code: {}. Checks:\n{}'.format(return_code, checks))
-    return return_code, checks
+    :param experiment_directory: The experiment's results directory.
+    :return: A DataFrame with the entries of all the measurements files
+        ('measurements_<experiment_type>.csv'), expanded with an
+        "Experiment type" column and a "Lost [%]" column with the lost samples
+        over the sent ones.
+    """
+    measurements = []
+    for f in sorted(listdir(experiment_directory)):
+        if (
+            not isfile('{}/{}'.format(experiment_directory, f)) or
+            not f.startswith('measurements_') or
+            not f.endswith('.csv') or
+            'summary' in f
+        ):
+            continue
+        logger.debug('Loading measurements "{}"'.format(f))
+        data = pandas.read_csv('{}/{}'.format(experiment_directory, f))
+        data.insert(0, 'Experiment type', f[len('measurements_'):-len('.csv')])
+        data['Lost [%]'] = (
+            100 * data['Lost [samples]'] /
+            data['Sent [samples]'].where(data['Sent [samples]'] != 0)
+        )
+        measurements.append(data)
+    if len(measurements) == 0:
+        return pandas.DataFrame(columns=GRID_KEYS + GRID_CHECK_COLUMNS)
+    return pandas.concat(measurements, ignore_index=True, sort=False)
 
 
 def plot(
@@ -265,8 +348,7 @@ def plot(
     ]
 
     # Agregate requirements and experiment data in one DataFrame
-    summaries_data = requirements
-    summaries_data = summaries_data.append(experiment, sort=False)
+    summaries_data = pandas.concat([requirements, experiment], sort=False)
     summaries_data['Payload [Bytes]'] = summaries_data[
         'Payload [Bytes]'
     ].astype(str)
@@ -305,16 +387,13 @@ def plot(
     plt.close(fig)
 
 
-def plot_and_check(
+def plot_experiment_type(
     requirements,
     experiment,
     plots_directory
 ):
     """
-    Plot and check experiment data against requirements.
-
-    Plot the experiment data and requirements data series.
-    Check whether the experiment data meet the requirements.
+    Plot the experiment data and requirements of an experiment type.
 
     :param requirements: Pandas DataFrame containing the requirements for a
         specific experiment type.
@@ -323,20 +402,21 @@ def plot_and_check(
     :param plots_directory: A directory to place the resulting plots.
     :raise: AssertionError if requirements or experiment are not Pandas
         Dataframes.
-    :return: The return of "check_requirements()"
     """
     # Validate arguments
     assert(isinstance(requirements, pandas.DataFrame))
     assert(isinstance(experiment, pandas.DataFrame))
 
-    # Columns to check
-    columns = ['Lost [samples]', 'Subscription throughput [Mb/s]']
+    requirements = requirements.reset_index(drop=True)
+    requirements.insert(0, 'Label', 'requirements')
+    experiment = experiment.reset_index(drop=True)
+    experiment.insert(0, 'Label', 'experiment')
     titles = {
         'Lost [samples]': 'lost_samples',
         'Subscription throughput [Mb/s]': 'subscription_throughput'
     }
     # Plot comparison for each column
-    for column in columns:
+    for column in CHECK_COLUMNS:
         logger.debug(
             'Creating plot "{}" from column "{}"'.format(
                 titles[column],
@@ -350,8 +430,57 @@ def plot_and_check(
             plots_directory=plots_directory,
             title=titles[column]
         )
-    # Check the requirements
-    return check_requirements(requirements, experiment)
+
+
+def plot_checks(requirements, summaries, plots_directory, jobs):
+    """
+    Plot the experiment data and requirements of all the experiment types.
+
+    The experiment types are plotted in parallel, by a pool of at most <jobs>
+    processes. The plots of each experiment type are placed in the
+    '<plots_directory>/measurements_<experiment_type>' directory.
+
+    :param requirements: Pandas DataFrame containing the requirements.
+    :param summaries: Pandas DataFrame containing the summaries of all the
+        experiment types, with an "Experiment type" column.
+    :param plots_directory: A directory to place the resulting plots.
+    :param jobs: The maximum number of plotting processes.
+    :return: The number of experiment types that could not be plotted.
+    """
+    tasks = []
+    for exp_type, experiment in summaries.groupby(
+        'Experiment type',
+        sort=False
+    ):
+        tasks.append(
+            (
+                exp_type,
+                requirements[requirements['Experiment type'] == exp_type],
+                experiment,
+                '{}/measurements_{}'.format(plots_directory, exp_type),
+            )
+        )
+    if len(tasks) == 0:
+        return 0
+
+    failures = 0
+    with multiprocessing.Pool(max(min(jobs, len(tasks)), 1)) as pool:
+        results = [
+            (
+                exp_type,
+                pool.apply_async(
+                    plot_experiment_type,
+                    (reqs, experiment, exp_plots_directory)
+                )
+            ) for exp_type, reqs, experiment, exp_plots_directory in tasks
+        ]
+        for exp_type, result in results:
+            try:
+                result.get()
+            except Exception as e:
+                logger.error('Error plotting {}: {}'.format(exp_type, e))
+                failures += 1
+    return failures
 
 
 if __name__ == '__main__':
@@ -369,7 +498,10 @@ if __name__ == '__main__':
             0 indicates that all check passed, else, some check failed.
             The script generates check plots in the <plots_directory>
             directory, as well as CSV files for each check, placed in the
-            <experiment_directory> directory.
+            <experiment_directory> directory. Requirements with demand and
+            recovery time columns (as output with --grid) are checked
+            against every operating point of the measurements files
+            instead, and no check plots are generated.
         """
     )
     parser.add_argument(
@@ -397,6 +529,20 @@ if __name__ == '__main__':
         help='Whether to print a table with the summaries for each result',
         required=False
     )
+    parser.add_argument(
+        '--no_plots',
+        action='store_true',
+        help='Check the results without generating the check plots',
+        required=False
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='The maximum number of processes plotting experiment types',
+        default=len(sched_getaffinity(0)),
+        required=False
+    )
     parser.add_argument(
         '--debug',
         action='store_true',
@@ -454,53 +600,53 @@ if __name__ == '__main__':
     passed_checks = 0
     # Get requirements
     requirements = pandas.read_csv(requirements)
-
-    # Check each summary separately
-    for summary in summaries:
-        logger.debug('Checking summary "{}"'.format(summary))
-        # Get experiment type
-        exp_type = experiment_type(summary)
-
-        # Get requirements for experiment type
-        reqs = requirements[requirements['Experiment type'] == exp_type]
-        reqs.insert(0, 'Label', 'requirements')
-        reqs = reqs.reset_index(drop=True)
-
-        # Get experiment summary data
-        experiment = pandas.read_csv(
-            summary,
-            usecols=[
-                'Payload [Bytes]',
-                'Lost [samples]',
-                'Subscription throughput [Mb/s]',
-            ]
+    grid = 'Demand [sample/burst]' in requirements
+
+    if grid is True:
+        # Get all the operating points of the experiment in one DataFrame,
+        # and check them at once
+        experiments = load_grid_measurements(experiment_directory)
+        return_codes, all_checks = check_grid_requirements(
+            requirements,
+            experiments
         )
-        experiment['Experiment type'] = exp_type
-        experiment.insert(0, 'Label', 'experiment')
-        logger.debug('{} data:\n{}'.format(summary, experiment))
-
-        # Plot experiment and requirements, and check the experiment
-        status, column_checks = plot_and_check(
-            requirements=reqs,
-            experiment=experiment,
-            plots_directory='{}/measurements_{}'.format(
-                plots_directory,
-                exp_type
+    else:
+        # Get all the experiment summaries in one DataFrame
+        experiments = []
+        for summary in summaries:
+            logger.debug('Loading summary "{}"'.format(summary))
+            experiment = pandas.read_csv(
+                summary,
+                usecols=['Payload [Bytes]'] + CHECK_COLUMNS
+            )
+            experiment.insert(0, 'Experiment type', experiment_type(summary))
+            experiments.append(experiment)
+        if len(experiments) > 0:
+            experiments = pandas.concat(experiments, ignore_index=True)
+        else:
+            experiments = pandas.DataFrame(
+                columns=['Experiment type', 'Payload [Bytes]'] + CHECK_COLUMNS
             )
-        )
 
+        # Check all the experiment types at once
+        return_codes, all_checks = check_requirements(
+            requirements,
+            experiments
+        )
+    checks_by_type = dict(
+        list(all_checks.groupby('Experiment type', sort=False))
+    )
+    for exp_type in return_codes:
         # Checkup check status
-        if status == 0:
+        if return_codes[exp_type] == 0:
             logger.info('Check for {} [PASSED]'.format(exp_type))
         else:
             logger.warning('Check for {} [FAILED]'.format(exp_type))
             exit_code += 1
 
         # Generate check report
-        checks = pandas.DataFrame()
-        for check in column_checks:
-            checks = checks.append(column_checks[check], sort=False)
-        checks = checks.reset_index(drop=True)
+        checks = checks_by_type.get(exp_type, all_checks.iloc[0:0])
+        checks = checks.drop(columns='Experiment type').reset_index(drop=True)
         check_file = '{}/checks_{}.csv'.format(experiment_directory, exp_type)
         logger.debug('Check saved in {}'.format(check_file))
         checks.to_csv(
@@ -519,6 +665,17 @@ if __name__ == '__main__':
     if not print_summaries:
         logger.info('----------------------------')
 
+    # Plot experiments and requirements
+    if args.no_plots is False and grid is False:
+        if plot_checks(
+            requirements,
+            experiments,
+            plots_directory,
+            args.jobs
+        ) > 0:
+            logger.error('Some check plots could not be generated')
+        logger.info('----------------------------')
+
     # Print analysis summary and exit with exit_code
     logger.info(
         '{:.3f}% checks passed: ({}/{})'.format(
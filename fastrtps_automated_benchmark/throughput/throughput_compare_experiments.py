@@ -0,0 +1,453 @@
+# Copyright 2019 Proyectos y Sistemas de Mantenimiento SL (eProsima).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare two throughput experiment results as output by 'throughput_job.bash'.
+
+The script takes two throughput experiment result directories (one acting as
+reference and the other one as target for the comparison), scans them looking
+for sub-experiment measurements as output by 'throughput_run_experiment.bash',
+and compares the whole demand and recovery time grid of the target against
+the reference, joining the measurements on experiment type, payload, demand,
+and recovery time. For every grid point, the script compares:
+
+    - Subscription throughput: fails if it decreases more than the fail
+      threshold, relative to the reference.
+    - Subscription sample rate: fails if it decreases more than the fail
+      threshold, relative to the reference.
+    - Lost samples: fails if the percentage of lost samples over the sent ones
+      increases more than the loss threshold (in percentage points), as the
+      relative change of a lost samples count is meaningless when the
+      reference did not lose any.
+
+For each experiment type, the comparison of every grid point is stored in
+'<experiment_type>_comparison.csv', and the changes are plotted as heatmaps
+over the demand and recovery time grid of each payload
+('<experiment_type>_<magnitude>_heatmap.png'), both in the plots directory.
+The script's exit code is 0 if all performed comparisons succeed, and 1
+otherwise. Run with '-h' or '--help' to see a complete list of arguments.
+
+Example:
+    python3 throughput_compare_experiments.py \\
+        --reference ./reference_results \\
+        --results ./target_result \\
+        --plots_directory ./comparison_plots
+
+Output example:
+    Comparison for interprocess_best_effort PASSED
+    Comparison for interprocess_reliable FAILED
+       16 Bytes, 1000 samples/burst, 20 ms: throughput change -15.032%,
+       sample rate change -15.032%, loss change +0.000 points
+    1/2 comparisons passed
+    Failed comparisons:
+       interprocess_reliable
+    Comparison exit code: 1
+
+The previous generates the following CSVs and plots:
+    - /comparison_plots/interprocess_best_effort_comparison.csv
+    - /comparison_plots/interprocess_best_effort_throughput_heatmap.png
+    - /comparison_plots/interprocess_best_effort_sample_rate_heatmap.png
+    - /comparison_plots/interprocess_best_effort_loss_heatmap.png
+    - /comparison_plots/interprocess_reliable_comparison.csv
+    - /comparison_plots/interprocess_reliable_throughput_heatmap.png
+    - /comparison_plots/interprocess_reliable_sample_rate_heatmap.png
+    - /comparison_plots/interprocess_reliable_loss_heatmap.png
+"""
+import argparse
+import logging
+from os import listdir
+from os.path import isdir
+from os.path import isfile
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import numpy as np
+
+import pandas as pd
+
+import seaborn as sns
+
+# Measurements columns identifying a grid point
+GRID_KEYS = [
+    'Payload [Bytes]',
+    'Demand [sample/burst]',
+    'Recovery time [ms]',
+]
+# Measurements columns compared
+COMPARED_COLUMNS = [
+    'Subscription throughput [Mb/s]',
+    'Subscription sample rate [Sample/s]',
+    'Lost [samples]',
+]
+# Changes of the comparison: change column, magnitude name (for the plots),
+# and whether the change is relative to the reference (as opposed to
+# percentage points of lost samples)
+CHANGES = [
+    ('Throughput change [%]', 'throughput', True),
+    ('Sample rate change [%]', 'sample_rate', True),
+    ('Loss change [points]', 'loss', False),
+]
+
+
+def directory_type(directory):
+    """
+    Check whether the argument is a directory.
+
+    :param directory: The directory path.
+    :return: The directory path without ending /.
+    Exit if the directory cannot be found.
+    """
+    if directory.endswith('/'):
+        directory = directory[:-1]
+    if not isdir(directory):
+        print('Cannot find {}'.format(directory))
+        exit(1)
+    return directory
+
+
+def experiment_type_from_filename(filename):
+    """
+    Get experiment type of a measurements file based on its name.
+
+    Get experiment type of a measurements file based on its name
+    ('measurements_<experiment_type>.csv').
+
+    :param filename: The name of the measurements file.
+    :raise: AssertionError if filename is not a string.
+    :return: The experiment type as a string.
+    """
+    assert(isinstance(filename, str))
+    exp_type = filename.split('/')[-1].split('.')[-2].split('_')[1:]
+    exp_type = '_'.join(exp_type)
+    return exp_type
+
+
+def measurements_files(results_directory):
+    """
+    Get the measurements CSV files of an experiment results directory.
+
+    The files are the ones named 'measurements_<experiment_type>.csv', leaving
+    out the summaries output by 'throughput_process_results.py'.
+
+    :param results_directory: The experiment results directory.
+    :return: A sorted list with the file names (without directory).
+    """
+    return [
+        f for f in sorted(listdir(results_directory))
+        if isfile('{}/{}'.format(results_directory, f)) and
+        f.startswith('measurements_') and
+        f.endswith('.csv') and
+        not f.endswith('_summary.csv')
+    ]
+
+
+def compare_grids(reference_data, result_data, fail_threshold, loss_threshold):
+    """
+    Compare the demand and recovery time grid of a result against a reference.
+
+    The measurements are joined on payload, demand, and recovery time
+    (averaging repeated grid points), leaving out the grid points that are
+    not in both. A grid point fails if the subscription throughput or sample
+    rate decrease more than <fail_threshold> relative to the reference, if
+    the percentage of lost samples increases more than <loss_threshold>
+    percentage points, or if a change cannot be computed (a reference of 0).
+    The comparison fails if there are no grid points in both.
+
+    :param reference_data: A DataFrame with the reference measurements.
+    :param result_data: A DataFrame with the measurements to check.
+    :param fail_threshold: The limit under the reference, in based 1.
+    :param loss_threshold: The limit of lost samples [%] over the reference,
+        in percentage points.
+
+    :returns: A tuple containing:
+        - Return code: True if all comparisons succeeded. False otherwise.
+        - DataFrame: The comparison, with a row per grid point and the
+            following columns:
+                - GRID_KEYS
+                - Reference <column> and Result <column> for every column in
+                  COMPARED_COLUMNS
+                - The change columns of CHANGES
+                - Comparison: Either 'passed' of 'failed'
+        - The number of grid points that are only in one of the experiments.
+    """
+    columns = COMPARED_COLUMNS + ['Sent [samples]']
+    reference = reference_data.groupby(GRID_KEYS)[columns].mean()
+    result = result_data.groupby(GRID_KEYS)[columns].mean()
+    comparison = reference.add_prefix('Reference ').join(
+        result.add_prefix('Result '),
+        how='inner'
+    )
+    unmatched = len(reference.index.union(result.index)) - len(comparison)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for (change, _, _), column in zip(CHANGES, COMPARED_COLUMNS[:2]):
+            comparison[change] = 100 * (
+                comparison['Result {}'.format(column)] /
+                comparison['Reference {}'.format(column)] - 1
+            )
+        comparison['Loss change [points]'] = 100 * (
+            comparison['Result Lost [samples]'] /
+            comparison['Result Sent [samples]'] -
+            comparison['Reference Lost [samples]'] /
+            comparison['Reference Sent [samples]']
+        )
+    comparison = comparison.drop(
+        columns=['Reference Sent [samples]', 'Result Sent [samples]']
+    )
+
+    failed = (
+        (comparison['Throughput change [%]'] < -100 * fail_threshold) |
+        (comparison['Sample rate change [%]'] < -100 * fail_threshold) |
+        (comparison['Loss change [points]'] > loss_threshold) |
+        comparison[[change for change, _, _ in CHANGES]].isnull().any(axis=1)
+    )
+    comparison['Comparison'] = np.where(failed, 'failed', 'passed')
+    passed = len(comparison) > 0 and not failed.any()
+    return passed, comparison.reset_index(), unmatched
+
+
+def plot_heatmaps(comparison, exp_type, plots_directory):
+    """
+    Plot the changes of a comparison as heatmaps over the grid.
+
+    For every change in CHANGES, create a figure with a heatmap of the change
+    over the demand and recovery time grid of each payload, stored as
+    '<plots_directory>/<exp_type>_<magnitude>_heatmap.png'. Improvements are
+    blue and regressions red, in a color scale symmetric around 0 and shared
+    by all the payloads.
+
+    :param comparison: A DataFrame as returned by compare_grids().
+    :param exp_type: The experiment type.
+    :param plots_directory: The directory to store the plots.
+    """
+    payloads = comparison['Payload [Bytes]'].unique()
+    cols = min(len(payloads), 4)
+    rows = int(np.ceil(len(payloads) / cols))
+    for change, magnitude, relative in CHANGES:
+        changes = comparison[change].replace([np.inf, -np.inf], np.nan)
+        limit = max(changes.abs().max(), 1.0)
+        fig, axes = plt.subplots(
+            rows,
+            cols,
+            figsize=(5 * cols, 4 * rows),
+            squeeze=False
+        )
+        for ax, payload in zip(axes.flat, payloads):
+            grid = comparison.assign(**{change: changes})[
+                comparison['Payload [Bytes]'] == payload
+            ].pivot(
+                index='Demand [sample/burst]',
+                columns='Recovery time [ms]',
+                values=change
+            )
+            sns.heatmap(
+                grid,
+                ax=ax,
+                annot=True,
+                fmt='.1f',
+                center=0,
+                vmin=-limit,
+                vmax=limit,
+                # A throughput decrease or a loss increase is a regression
+                cmap='RdBu' if relative is True else 'RdBu_r',
+            )
+            ax.set_title('{} Bytes'.format(payload))
+        for ax in axes.flat[len(payloads):]:
+            ax.axis('off')
+        fig.suptitle('{} {}'.format(exp_type, change))
+        fig.tight_layout(rect=[0, 0, 1, 0.95])
+        fig_path = '{}/{}_{}_heatmap.png'.format(
+            plots_directory,
+            exp_type,
+            magnitude
+        )
+        fig.savefig(fig_path)
+        logger.debug('Generated figure: {}'.format(fig_path))
+        plt.close(fig)
+
+
+if __name__ == '__main__':
+    # Get argument parser
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=__doc__
+    )
+    # Great different argument groups
+    parser._action_groups.pop()
+    required = parser.add_argument_group('Required arguments')
+    optional = parser.add_argument_group('Optional arguments')
+    # Define arguments
+    required.add_argument(
+        '-p',
+        '--plots_directory',
+        type=directory_type,
+        help='The directory to store the plots and comparison CSVs',
+        required=True
+    )
+    required.add_argument(
+        '-R',
+        '--reference',
+        type=directory_type,
+        help='The reference directory',
+        required=True
+    )
+    required.add_argument(
+        '-r',
+        '--results',
+        type=directory_type,
+        help='The results directory',
+        required=True
+    )
+    optional.add_argument(
+        '-t',
+        '--fail_threshold',
+        help="""The limit that the subscription throughput and sample rate of
+                the "results" data are allowed to fall under the reference
+                data. Represents a percentage of the reference, expressed in
+                based 1 instead of 100.""",
+        type=float,
+        default=0.1,
+        required=False
+    )
+    optional.add_argument(
+        '-l',
+        '--loss_threshold',
+        help="""The limit that the lost samples [%%] of the "results" data are
+                allowed to exceed the reference data, in percentage
+                points.""",
+        type=float,
+        default=1.0,
+        required=False
+    )
+    optional.add_argument(
+        '-d',
+        '--debug',
+        action='store_true',
+        help='Print debug info.'
+    )
+    # Get arguments
+    args = parser.parse_args()
+    # Validate arguments
+    plots_directory = args.plots_directory
+    reference = args.reference
+    results = args.results
+    if not 0 <= args.fail_threshold <= 1:
+        parser.error('--fail_threshold must be in [0, 1]')
+    if args.loss_threshold < 0:
+        parser.error('--loss_threshold must not be negative')
+
+    # Create a custom logger
+    logger = logging.getLogger('THROUGHPUT_COMPARISON')
+    # Create handlers
+    l_handler = logging.StreamHandler()
+    # Create formatters and add it to handlers
+    l_format = '[%(asctime)s][%(levelname)s] %(message)s'
+    l_format = logging.Formatter(l_format)
+    l_handler.setFormatter(l_format)
+    # Add handlers to the logger
+    logger.addHandler(l_handler)
+    # Set log level
+    if args.debug is True:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # Get list of measurements files in reference and results directories
+    reference_files = measurements_files(reference)
+    results_files = measurements_files(results)
+
+    # Check that all results have a reference to compare with
+    for f in results_files:
+        if f not in reference_files:
+            logger.error(
+                '{} present in results but not in reference'.format(f)
+            )
+            exit(1)
+
+    exit_code = 0
+    failed_comparisons = []
+    for result in results_files:
+        exp_type = experiment_type_from_filename(result)
+        logger.debug('Analyzing {}'.format(result))
+        reference_data = pd.read_csv('{}/{}'.format(reference, result))
+        result_data = pd.read_csv('{}/{}'.format(results, result))
+        comp_result, comparison, unmatched = compare_grids(
+            reference_data,
+            result_data,
+            args.fail_threshold,
+            args.loss_threshold
+        )
+
+        # Warn about the grid points that could not be compared
+        if len(comparison) == 0:
+            logger.error(
+                'No grid points of {} are in both experiments'.format(
+                    exp_type
+                )
+            )
+        elif unmatched > 0:
+            logger.warning(
+                '{} grid points of {} are not in both experiments'.format(
+                    unmatched,
+                    exp_type
+                )
+            )
+
+        # Save comparison CSV and heatmaps in the plots directory
+        csv_name = '{}/{}_comparison.csv'.format(plots_directory, exp_type)
+        comparison.to_csv(csv_name, float_format='%.3f', index=False)
+        logger.debug('Generated CSV: {}'.format(csv_name))
+        if len(comparison) > 0:
+            plot_heatmaps(comparison, exp_type, plots_directory)
+
+        # Check exit code
+        if comp_result is True:
+            logger.info('Comparison for {} PASSED'.format(exp_type))
+        else:
+            exit_code = 1
+            failed_comparisons.append(exp_type)
+            logger.error('Comparison for {} FAILED'.format(exp_type))
+            for _, row in comparison[
+                comparison['Comparison'] == 'failed'
+            ].iterrows():
+                logger.error(
+                    '   {} Bytes, {} samples/burst, {} ms: throughput change '
+                    '{:+.3f}%, sample rate change {:+.3f}%, loss change '
+                    '{:+.3f} points'.format(
+                        row['Payload [Bytes]'],
+                        row['Demand [sample/burst]'],
+                        row['Recovery time [ms]'],
+                        row['Throughput change [%]'],
+                        row['Sample rate change [%]'],
+                        row['Loss change [points]']
+                    )
+                )
+
+    # Log comparison summary
+    logger.info(
+        '{}/{} comparisons passed'.format(
+            len(results_files) - len(failed_comparisons),
+            len(results_files)
+        )
+    )
+    if exit_code != 0:
+        logger.info('Failed comparisons:')
+        for failure in failed_comparisons:
+            logger.info('   {}'.format(failure))
+
+    # Exit with 0 if all passed, 1 otherwise.
+    logger.info('Comparison exit code: {}'.format(exit_code))
+    exit(exit_code)
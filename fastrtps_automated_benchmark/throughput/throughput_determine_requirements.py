@@ -16,6 +16,7 @@
 import argparse
 import logging
 from os import listdir
+from os import remove
 from os.path import abspath
 from os.path import isdir
 from os.path import isfile
@@ -24,6 +25,13 @@ import numpy as np
 
 import pandas
 
+# Number of resamples of the bootstrap tolerance bounds
+BOOTSTRAP_RESAMPLES = 2000
+# Keys of the requirements derived from the summaries, and of the ones
+# derived for every operating point of the measurements (--grid)
+SUMMARY_KEYS = ['Experiment type', 'Payload [Bytes]']
+GRID_KEYS = SUMMARY_KEYS + ['Demand [sample/burst]', 'Recovery time [ms]']
+
 
 def directory_type(directory):
     """
@@ -59,6 +67,368 @@ def experiment_type(filename):
     return exp_type
 
 
+def load_summaries(results_dirs, experiment_types):
+    """
+    Load the summaries of a set of experiment results directories.
+
+    :param results_dirs: The list of experiment results directories.
+    :param experiment_types: The list of supported experiment types.
+    :return: A DataFrame with the entries of all the summaries, expanded with
+        an "Experiment" column containing the directory name of the
+        experiment results, and an "Experiment type" column. None if an
+        experiment type is not supported.
+    """
+    file_data = []
+    for results_dir in results_dirs:
+        # Get path of summary files
+        logger.debug('Geting summaries for {}'.format(results_dir))
+        results_files = sorted(
+            [
+                '{}/{}'.format(
+                    results_dir,
+                    f
+                ) for f in listdir(results_dir) if isfile(
+                    '{}/{}'.format(
+                        results_dir,
+                        f
+                    )
+                ) and 'summary' in f
+            ]
+        )
+        logger.debug('Summaries: {}'.format(results_files))
+
+        # Iterate over the summaries
+        for f in results_files:
+            # Get experiment type
+            exp_type = experiment_type(f)
+            # Check that supported
+            if exp_type not in experiment_types:
+                logger.error(
+                    'Experiment {} found in {} is NOT supported'.format(
+                        exp_type,
+                        results_dir
+                    )
+                )
+                return None
+
+            # Load data as DataFrame
+            logger.debug('Loading data from {}'.format(f))
+            data = pandas.read_csv(f)
+            data.insert(0, 'Experiment type', exp_type)
+            data.insert(0, 'Experiment', results_dir.split('/')[-1])
+            file_data.append(data)
+
+    if len(file_data) == 0:
+        return pandas.DataFrame(columns=['Experiment', 'Experiment type'])
+    return pandas.concat(file_data, ignore_index=True, sort=False)
+
+
+def load_measurements(results_dirs, experiment_types):
+    """
+    Load the measurements of a set of experiment results directories.
+
+    :param results_dirs: The list of experiment results directories.
+    :param experiment_types: The list of supported experiment types.
+    :return: A DataFrame with the entries of all the measurements files
+        ('measurements_<experiment_type>.csv'), expanded with an
+        "Experiment" column containing the directory name of the experiment
+        results, an "Experiment type" column, and a "Lost [%]" column with
+        the lost samples over the sent ones. None if an experiment type is not
+        supported.
+    """
+    file_data = []
+    for results_dir in results_dirs:
+        # Get path of measurements files
+        logger.debug('Geting measurements for {}'.format(results_dir))
+        results_files = sorted(
+            [
+                f for f in listdir(results_dir) if isfile(
+                    '{}/{}'.format(results_dir, f)
+                ) and f.startswith('measurements_') and
+                f.endswith('.csv') and 'summary' not in f
+            ]
+        )
+        logger.debug('Measurements: {}'.format(results_files))
+
+        # Iterate over the measurements
+        for f in results_files:
+            # Get experiment type
+            exp_type = f[len('measurements_'):-len('.csv')]
+            # Check that supported
+            if exp_type not in experiment_types:
+                logger.error(
+                    'Experiment {} found in {} is NOT supported'.format(
+                        exp_type,
+                        results_dir
+                    )
+                )
+                return None
+
+            # Load data as DataFrame
+            logger.debug('Loading data from {}/{}'.format(results_dir, f))
+            data = pandas.read_csv('{}/{}'.format(results_dir, f))
+            data.insert(0, 'Experiment type', exp_type)
+            data.insert(0, 'Experiment', results_dir.split('/')[-1])
+            data['Lost [%]'] = (
+                100 * data['Lost [samples]'] /
+                data['Sent [samples]'].where(data['Sent [samples]'] != 0)
+            )
+            file_data.append(data)
+
+    if len(file_data) == 0:
+        return pandas.DataFrame(columns=['Experiment', 'Experiment type'])
+    return pandas.concat(file_data, ignore_index=True, sort=False)
+
+
+def derive_requirements(data, req_columns, keys=SUMMARY_KEYS):
+    """
+    Derive requirements for each experiment type and payload.
+
+    :param data: A DataFrame with at least the columns of <keys>, and the ones
+        of <req_columns>, as returned by load_summaries() (or
+        load_measurements() with GRID_KEYS).
+    :param req_columns: A dictionary with the requirement columns as keys,
+        and the percentile of the summary values used to derive each of them
+        as values.
+    :param keys: The columns identifying a requirement.
+        Defaults: SUMMARY_KEYS.
+    :return: A DataFrame with the columns of <keys>, and one column per
+        requirement, with the keys in order of appearance in <data>.
+    """
+    grouped = data.groupby(keys, sort=False)
+    requirements = pandas.DataFrame(
+        {
+            c: grouped[c].quantile(req_columns[c] / 100)
+            for c in req_columns
+        }
+    )
+    return requirements.reset_index()[keys + list(req_columns)]
+
+
+def binomial_cdf(n, p):
+    """
+    Compute the cumulative distribution function of a binomial distribution.
+
+    :param n: The number of trials.
+    :param p: The success probability, in (0, 1).
+    :return: A numpy array with the probability of at most k successes, for k
+        in 0, ..., n.
+    """
+    k = np.arange(1, n + 1)
+    log_combinations = np.concatenate(
+        ([0], np.cumsum(np.log((n - k + 1) / k)))
+    )
+    k = np.arange(n + 1)
+    return np.cumsum(
+        np.exp(log_combinations + k * np.log(p) + (n - k) * np.log1p(-p))
+    )
+
+
+def tolerance_bound(
+    values,
+    coverage,
+    confidence,
+    upper,
+    method,
+    random_state
+):
+    """
+    Compute a one-sided tolerance bound of a set of values.
+
+    The bound is expected to be above (or below if not <upper>) <coverage> of
+    the population the values are drawn from, with probability <confidence>.
+    With the 'nonparametric' method, the bound is the order statistic with the
+    lowest rank that reaches <confidence> (distribution-free), or the extreme
+    value if there are not enough values for that. With the 'bootstrap'
+    method, the bound is the <confidence> percentile of the bootstrap
+    distribution of the <coverage> percentile.
+    In both cases, the confidence actually reached is the distribution-free
+    confidence of the highest (lowest if not <upper>) value not beyond the
+    bound.
+
+    :param values: A numpy array with the values.
+    :param coverage: The fraction of the population to bound, in (0, 1).
+    :param confidence: The target confidence, in (0, 1).
+    :param upper: Whether the bound is an upper bound.
+    :param method: Either 'nonparametric' or 'bootstrap'.
+    :param random_state: A numpy RandomState for the bootstrap resamples.
+    :return: The bound (NaN if there are no values).
+    :return: The confidence reached by the bound (0 if there are no values).
+    """
+    values = np.sort(values)
+    n = len(values)
+    if n == 0:
+        return np.nan, 0.0
+    cdf = binomial_cdf(n, coverage)
+    if method == 'bootstrap':
+        resamples = values[
+            random_state.randint(0, n, (BOOTSTRAP_RESAMPLES, n))
+        ]
+        if upper is True:
+            quantiles = np.percentile(resamples, coverage * 100, axis=1)
+            bound = np.percentile(quantiles, confidence * 100)
+            rank = np.searchsorted(values, bound, side='right')
+        else:
+            quantiles = np.percentile(resamples, (1 - coverage) * 100, axis=1)
+            bound = np.percentile(quantiles, (1 - confidence) * 100)
+            rank = n - np.searchsorted(values, bound, side='left')
+    else:
+        rank = min(np.searchsorted(cdf[:n], confidence) + 1, n)
+        bound = values[rank - 1] if upper is True else values[n - rank]
+    return bound, cdf[rank - 1]
+
+
+def tolerance_requirements(
+    data,
+    req_bounds,
+    coverage,
+    confidence,
+    method,
+    random_state
+):
+    """
+    Derive requirements as tolerance bounds of the summary values.
+
+    :param data: A DataFrame with at least the columns "Experiment type",
+        "Payload [Bytes]", and the ones of <req_bounds>, as returned by
+        load_summaries().
+    :param req_bounds: A dictionary with the requirement columns as keys, and
+        whether the requirement is an upper bound as values.
+    :param coverage: The fraction of the runs each requirement must bound.
+    :param confidence: The target confidence.
+    :param method: Either 'nonparametric' or 'bootstrap'.
+    :param random_state: A numpy RandomState for the bootstrap resamples.
+    :return: A DataFrame with columns 'Experiment type', 'Payload [Bytes]',
+        and one column per requirement.
+    :return: A DataFrame with columns 'Experiment type', 'Payload [Bytes]',
+        'Requirement', 'Runs', 'Confidence', and 'Additional runs needed',
+        with one row per requirement. The additional runs needed are the ones
+        for the extreme value to reach the target confidence
+        distribution-free.
+    """
+    keys = ['Experiment type', 'Payload [Bytes]']
+    runs_needed = int(np.ceil(np.log1p(-confidence) / np.log(coverage)))
+    requirements = []
+    report = []
+    for key, grp in data.groupby(keys, sort=False):
+        payload_reqs = list(key)
+        for column, upper in req_bounds.items():
+            values = grp[column].dropna().values
+            bound, reached = tolerance_bound(
+                values,
+                coverage,
+                confidence,
+                upper,
+                method,
+                random_state
+            )
+            payload_reqs.append(bound)
+            report.append(
+                list(key) + [
+                    column,
+                    len(values),
+                    reached,
+                    max(runs_needed - len(values), 0),
+                ]
+            )
+        requirements.append(payload_reqs)
+    requirements = pandas.DataFrame(
+        requirements,
+        columns=keys + list(req_bounds)
+    )
+    report = pandas.DataFrame(
+        report,
+        columns=keys + [
+            'Requirement',
+            'Runs',
+            'Confidence',
+            'Additional runs needed',
+        ]
+    )
+    return requirements, report
+
+
+def update_state(
+    state_file,
+    results_dirs,
+    experiment_types,
+    columns,
+    grid=False
+):
+    """
+    Update the state of an incremental requirements derivation.
+
+    The state file keeps the values needed to derive the requirements of every
+    experiment already consumed, one row per experiment and summary (or
+    measurements, with <grid>) row, so only the files of the experiments that
+    are not in it yet are read. The percentiles over the experiments are not
+    mergeable, so the state grows with the number of experiments. The entries
+    of experiments that are not in <results_dirs> anymore are dropped.
+
+    The columns of the state file depend on <grid>, so a state file created
+    with the other setting is reported instead of updated.
+
+    :param state_file: The path to the state CSV file. It is created if it
+        does not exist.
+    :param results_dirs: The list of experiment results directories.
+    :param experiment_types: The list of supported experiment types.
+    :param columns: The summary columns needed to derive the requirements.
+    :param grid: Whether to keep the values of the measurements (see
+        load_measurements()) instead of the summaries. Defaults: False.
+    :return: The updated state, as a DataFrame with columns 'Experiment',
+        'Experiment type', 'Payload [Bytes]', and <columns>, or None if an
+        experiment type is not supported or the state file does not match
+        <grid>.
+    """
+    state_columns = [
+        'Experiment',
+        'Experiment type',
+        'Payload [Bytes]'
+    ] + columns
+    if isfile(state_file):
+        state = pandas.read_csv(state_file)
+        if list(state.columns) != state_columns:
+            logger.error(
+                'State file {} was not created in {} mode, use --rebuild '
+                'to replace it'.format(
+                    state_file,
+                    'grid' if grid is True else 'summary'
+                )
+            )
+            return None
+    else:
+        state = pandas.DataFrame(columns=state_columns)
+
+    names = [d.split('/')[-1] for d in results_dirs]
+    state = state[state['Experiment'].isin(names)]
+    consumed = set(state['Experiment'])
+    new_dirs = [
+        d for d, name in zip(results_dirs, names) if name not in consumed
+    ]
+    logger.info(
+        'Reading {} new experiments ({} already consumed)'.format(
+            len(new_dirs),
+            len(consumed)
+        )
+    )
+    if grid is True:
+        new_data = load_measurements(new_dirs, experiment_types)
+    else:
+        new_data = load_summaries(new_dirs, experiment_types)
+    if new_data is None:
+        return None
+    if len(state) == 0:
+        state = new_data.reindex(columns=state_columns)
+    elif len(new_data) > 0:
+        state = pandas.concat(
+            [state, new_data[state_columns]],
+            ignore_index=True,
+            sort=False
+        )
+    state.to_csv(state_file, index=False)
+    return state
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -72,7 +442,11 @@ if __name__ == '__main__':
             "throughput_process_results.py". Each requirement is set by the 99
             percentile of the results for a given payload and experiment type.
             The scripts generate requirement for lost samples, and subscription
-            throughput.
+            throughput. With --grid, the requirements are derived for every
+            operating point (experiment type, payload, demand, and recovery
+            time) of the measurements instead, as a joint criterion: the
+            subscription throughput must be at least its 1 percentile, with
+            the lost samples [%] at most their 99 percentile.
         """
     )
     parser.add_argument(
@@ -88,12 +462,70 @@ if __name__ == '__main__':
         required=False,
         default='throughput_requirements.csv'
     )
+    parser.add_argument(
+        '-g',
+        '--grid',
+        action='store_true',
+        help="""Derive requirements for every operating point of the
+                measurements, instead of for the maximum throughput entry of
+                the summaries""",
+        required=False
+    )
+    parser.add_argument(
+        '-s',
+        '--state_file',
+        help="""A CSV file to keep the summary values of the experiments
+                already consumed. If given, only the summaries of the new
+                experiments are read""",
+        required=False
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Read all the summaries again, replacing the state file',
+        required=False
+    )
+    parser.add_argument(
+        '-t',
+        '--tolerance',
+        choices=['nonparametric', 'bootstrap'],
+        help="""Derive each requirement as a tolerance bound of the summary
+                values (upper for the lost samples, and lower for the
+                throughput), which covers <coverage> of the runs with
+                <confidence>, instead of as their 99 percentile""",
+        required=False
+    )
+    parser.add_argument(
+        '--coverage',
+        help='The fraction of the runs the tolerance bounds must cover',
+        type=float,
+        required=False,
+        default=0.9
+    )
+    parser.add_argument(
+        '--confidence',
+        help='The confidence of the tolerance bounds',
+        type=float,
+        required=False,
+        default=0.9
+    )
+    parser.add_argument(
+        '--report_file',
+        help="""A file to write the runs, confidence, and additional runs
+                needed of each tolerance bound""",
+        required=False,
+        default='throughput_requirements_tolerance.csv'
+    )
     parser.add_argument(
         '--debug',
         action='store_true',
         help='Set logging level to debug.'
     )
     args = parser.parse_args()
+    if not 0 < args.coverage < 1 or not 0 < args.confidence < 1:
+        parser.error('--coverage and --confidence must be in (0, 1)')
+    if args.grid is True and args.tolerance is not None:
+        parser.error('--grid cannot be used with --tolerance')
 
     # Create a custom logger
     logger = logging.getLogger('THROUGHPUT.DETERMINE.REQUIREMENTS')
@@ -154,100 +586,94 @@ if __name__ == '__main__':
         'intraprocess_reliable',
     ]
 
-    # Create a dictionary with one entry per experiment type. The values are
-    # Pandas DataFrames:
-    # {
-    #     'experiment_type_1': <Pandas DataFrame>,
-    #     'experiment_type_2': <Pandas DataFrame>
-    # }
-    # The DataFrames contain a "Experiment" column to keep track of from which
-    # experiment does every data entry come from.
-    data_by_exp_type = {}
-    for results_dir in results_dirs:
-        # Get path of summary files
-        logger.debug('Geting summaries for {}'.format(results_dir))
-        results_files = sorted(
-            [
-                '{}/{}'.format(
-                    results_dir,
-                    f
-                ) for f in listdir(results_dir) if isfile(
-                    '{}/{}'.format(
-                        results_dir,
-                        f
-                    )
-                ) and 'summary' in f
-            ]
-        )
-        logger.debug('Summaries: {}'.format(results_files))
-
-        # Iterate over the summaries
-        for f in results_files:
-            # Get experiment type
-            exp_type = experiment_type(f)
-            # Check that supported
-            if exp_type not in experiment_types:
-                logger.error(
-                    'Experiment {} found in {} is NOT supported'.format(
-                        exp_type,
-                        results_dir
-                    )
-                )
-                exit(1)
-            # Initialize dictionary entry
-            if exp_type not in data_by_exp_type:
-                data_by_exp_type[exp_type] = pandas.DataFrame()
-
-            # Load data as DataFrame
-            logger.debug('Loading data from {}'.format(f))
-            file_data = pandas.read_csv(f)
-            # Expand data with a "Experiment" column containing directory name
-            # of experiment results.
-            file_data['Experiment'] = results_dir.split('/')[-1]
-            # Append data to
-            data_by_exp_type[exp_type] = data_by_exp_type[exp_type].append(
-                file_data,
-                sort=False
-            )
-    logger.debug('Data by experiment type: {}'.format(data_by_exp_type))
-
     # Requirement columns and percentile used to derive requirements
     req_columns = {
         'Lost [samples]': 99,
         'Subscription throughput [Mb/s]': 99,
     }
+    keys = SUMMARY_KEYS
+    if args.grid is True:
+        # At every operating point, the throughput must not be below the
+        # requirement, with the lost samples not above theirs.
+        req_columns = {
+            'Lost [%]': 99,
+            'Subscription throughput [Mb/s]': 1,
+        }
+        keys = GRID_KEYS
+
+    # Get the summary values of every experiment, either from all the
+    # summaries, or from the state file and the summaries of the new
+    # experiments.
+    if args.state_file is None and args.grid is True:
+        data = load_measurements(results_dirs, experiment_types)
+    elif args.state_file is None:
+        data = load_summaries(results_dirs, experiment_types)
+    else:
+        state_file = abspath(args.state_file)
+        if args.rebuild is True and isfile(state_file):
+            logger.debug('Removing {}'.format(state_file))
+            remove(state_file)
+        data = update_state(
+            state_file,
+            results_dirs,
+            experiment_types,
+            keys[2:] + list(req_columns),
+            args.grid
+        )
+    if data is None:
+        exit(1)
+    logger.debug('Data: {}'.format(data))
 
     # Derive requirements for each experiment type, payload, and req_column
     # based on the percentiles. Store them in a DataFrame in the form:
     # Experiment Payload [Bytes] Lost [samples]  Subscription throughput [Mb/s]
     # 0  interprocess_best_effort_security   16   0.00   8.62310
     # 1  interprocess_best_effort_security 1024 144.54 547.46745
-
-    requirements = pandas.DataFrame()
-    for exp_type in data_by_exp_type:
-        # Get experiment_type data
-        exp_data = data_by_exp_type[exp_type].reset_index(drop=True)
-        exp_requirements = pandas.DataFrame()
-
-        # Iterate over payloads
-        payloads = exp_data['Payload [Bytes]'].unique()
-        for payload in payloads:
-            # Get payload data
-            payload_data = exp_data[exp_data['Payload [Bytes]'] == payload]
-
-            # Iterate over requirement columns
-            payload_reqs = pandas.DataFrame()
-            for c in req_columns:
-                # Calculate percentile and insert entry
-                payload_reqs.at[0, c] = np.percentile(
-                    payload_data[c],
-                    req_columns[c]
+    if args.tolerance is None:
+        requirements = derive_requirements(data, req_columns, keys)
+        if args.grid is True:
+            # Round the requirements outwards to the precision of the output,
+            # so an operating point right at a requirement does not fail its
+            # check
+            requirements['Lost [%]'] = np.ceil(
+                requirements['Lost [%]'] * 1000
+            ) / 1000
+            requirements['Subscription throughput [Mb/s]'] = np.floor(
+                requirements['Subscription throughput [Mb/s]'] * 1000
+            ) / 1000
+    else:
+        # The lost samples must not be above the requirement, and the
+        # throughput must not be below it.
+        requirements, report = tolerance_requirements(
+            data,
+            {
+                'Lost [samples]': True,
+                'Subscription throughput [Mb/s]': False,
+            },
+            args.coverage,
+            args.confidence,
+            args.tolerance,
+            np.random.RandomState(0)
+        )
+        report_file = abspath(args.report_file)
+        report.to_csv(report_file, float_format='%.3f', index=False)
+        below = report[report['Confidence'] < args.confidence]
+        logger.info(
+            '{}/{} requirements reach {} confidence of covering {} of the '
+            'runs'.format(
+                len(report) - len(below),
+                len(report),
+                args.confidence,
+                args.coverage
+            )
+        )
+        if len(below) > 0:
+            logger.info(
+                'Up to {} additional runs needed (see {})'.format(
+                    below['Additional runs needed'].max(),
+                    report_file
                 )
-
-            payload_reqs.insert(0, 'Payload [Bytes]', payload)
-            exp_requirements = exp_requirements.append(payload_reqs)
-        exp_requirements.insert(0, 'Experiment type', exp_type)
-        requirements = requirements.append(exp_requirements)
+            )
 
     # Save requirements as CSV file
     requirements = requirements.reset_index(drop=True)
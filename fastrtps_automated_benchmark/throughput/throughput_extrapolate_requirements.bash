@@ -184,21 +184,10 @@ main ()
 
         # Create plots and summary of experiment results
         rm ${RESULTS_DIR}/*summary* &> /dev/null
-        DATA_FILES=($(ls ${RESULTS_DIR} -I plots))
-        for FILE in ${DATA_FILES[@]}
-        do
-            # Get filename without extension
-            IFS='.' read -r -a FILE <<< "${FILE}"
-            FILE=${FILE[-2]}
-            echo "Generating plots for ${FILE}..."
-
-            # Create plots and summary
-            ${PYTHON_3} ${SCRITP_DIR}/throughput_process_results.py \
-                --plots_directory ${RESULTS_DIR}/plots/${FILE} \
-                --raw_csv ${RESULTS_DIR}/${FILE}.csv \
-                --output_csv ${RESULTS_DIR}/${FILE}_summary.csv
-            echo "-------------------------------------------------------------------"
-        done
+        echo "Generating plots and summaries for ${RESULTS_DIR}..."
+        ${PYTHON_3} ${SCRITP_DIR}/throughput_process_results.py \
+            --results_directory ${RESULTS_DIR}
+        echo "-------------------------------------------------------------------"
     done
 
     # Determine requirements
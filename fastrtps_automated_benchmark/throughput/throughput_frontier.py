@@ -0,0 +1,486 @@
+# Copyright 2019 Proyectos y Sistemas de Mantenimiento SL (eProsima).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""."""
+import argparse
+import logging
+from os import listdir
+from os import makedirs
+from os.path import abspath
+from os.path import isdir
+from os.path import isfile
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import numpy as np
+
+import pandas
+
+# Measurements columns
+PAYLOAD = 'Payload [Bytes]'
+DEMAND = 'Demand [sample/burst]'
+RECOVERY = 'Recovery time [ms]'
+PUB_THROUGHPUT = 'Publication throughput [Mb/s]'
+SUB_THROUGHPUT = 'Subscription throughput [Mb/s]'
+LOSS = 'Lost [%]'
+# Frontier CSV columns
+FRONTIER_COLUMNS = [
+    PAYLOAD,
+    DEMAND,
+    RECOVERY,
+    PUB_THROUGHPUT,
+    SUB_THROUGHPUT,
+    'Lost [samples]',
+    LOSS,
+]
+
+
+def experiment_type(filename):
+    """
+    Get experiment type of a measurements file based on its name.
+
+    Get experiment type of a measurements file based on its name
+    ('measurements_<experiment_type>.csv').
+
+    :param filename: The name of the measurements file.
+    :raise: AssertionError if filename is not a string.
+    :return: The experiment type as a string.
+    """
+    assert(isinstance(filename, str))
+    exp_type = filename.split('/')[-1].split('.')[-2].split('_')[1:]
+    exp_type = '_'.join(exp_type)
+    return exp_type
+
+
+def measurements_files(results_directory):
+    """
+    Get the measurements CSV files of an experiment results directory.
+
+    The files are the ones named 'measurements_<experiment_type>.csv', leaving
+    out the summaries output by 'throughput_process_results.py'.
+
+    :param results_directory: The experiment results directory.
+    :return: A sorted list with the file names (without directory).
+    """
+    return [
+        f for f in sorted(listdir(results_directory))
+        if isfile('{}/{}'.format(results_directory, f)) and
+        f.startswith('measurements_') and
+        f.endswith('.csv') and
+        not f.endswith('_summary.csv')
+    ]
+
+
+def add_loss_percentage(raw_data):
+    """
+    Add the percentage of lost samples to the measurements of an experiment.
+
+    :param raw_data: A DataFrame containing the data of a throughput experiment
+        output CSV file.
+    :return: A copy of <raw_data> with a 'Lost [%]' column.
+    """
+    data = raw_data.copy()
+    sent = data['Sent [samples]'].values.astype(float)
+    lost = data['Lost [samples]'].values.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        data[LOSS] = np.where(sent > 0, 100 * lost / sent, np.nan)
+    return data
+
+
+def pareto_frontier(data):
+    """
+    Get the throughput against loss Pareto frontier of every payload.
+
+    A measurement is in the frontier of its payload if no other measurement of
+    the payload has a higher or equal subscription throughput with a lower or
+    equal loss (and is not the same point). Sorting the measurements by
+    decreasing throughput, those are the ones whose loss is lower than the
+    loss of all the measurements before them.
+
+    :param data: A DataFrame with the measurements of an experiment, as
+        returned by add_loss_percentage().
+    :return: A DataFrame with the frontier measurements (FRONTIER_COLUMNS),
+        sorted by payload and decreasing subscription throughput.
+    """
+    data = data[data[LOSS].notnull()].sort_values(
+        [PAYLOAD, SUB_THROUGHPUT, LOSS],
+        ascending=[True, False, True],
+        kind='mergesort'
+    )
+    payloads = data[PAYLOAD]
+    previous_min_loss = data.groupby(payloads)[LOSS].cummin().groupby(
+        payloads
+    ).shift(1)
+    in_frontier = previous_min_loss.isnull() | (
+        data[LOSS] < previous_min_loss
+    )
+    return data.loc[in_frontier, FRONTIER_COLUMNS].reset_index(drop=True)
+
+
+def max_throughput(data, mask, payloads):
+    """
+    Get the measurement with the highest subscription throughput per payload.
+
+    :param data: A DataFrame with the measurements of an experiment.
+    :param mask: A boolean Series selecting the candidate measurements.
+    :param payloads: The payloads to report, in order.
+    :return: A DataFrame indexed by payload with the demand, recovery time,
+        subscription throughput and loss of the measurement. The values are
+        NaN for payloads without candidates.
+    """
+    candidates = data[mask]
+    rows = candidates.groupby(PAYLOAD)[SUB_THROUGHPUT].idxmax()
+    best = candidates.loc[rows.values, [PAYLOAD, DEMAND, RECOVERY,
+                                        SUB_THROUGHPUT, LOSS]]
+    return best.set_index(PAYLOAD).reindex(payloads)
+
+
+def saturation_knee(data, divergence):
+    """
+    Get the saturation knee of every payload.
+
+    Sorting the measurements of a payload by increasing publication
+    throughput, the publication and subscription throughputs diverge at the
+    first measurement whose subscription throughput is below
+    (1 - <divergence>) times its publication throughput. The knee is the
+    measurement right before it, that is the highest offered load delivered
+    without diverging.
+
+    :param data: A DataFrame with the measurements of an experiment.
+    :param divergence: The relative throughput loss at which the throughputs
+        diverge.
+    :return: A DataFrame indexed by payload with the demand, recovery time,
+        and publication and subscription throughputs of the knee, and whether
+        the payload saturates in the measured range. The knee values are NaN
+        if the throughputs diverge from the lowest offered load.
+    """
+    data = data.sort_values(
+        [PAYLOAD, PUB_THROUGHPUT],
+        kind='mergesort'
+    )
+    payloads = data[PAYLOAD]
+    diverging = (
+        data[SUB_THROUGHPUT] < (1 - divergence) * data[PUB_THROUGHPUT]
+    ).astype(int)
+    diverged = diverging.groupby(payloads).cummax() > 0
+    knees = data[~diverged].groupby(PAYLOAD).tail(1)
+    knees = knees[[PAYLOAD, DEMAND, RECOVERY, PUB_THROUGHPUT, SUB_THROUGHPUT]]
+    knees = knees.set_index(PAYLOAD).reindex(payloads.unique())
+    knees['Saturated'] = diverging.groupby(payloads).max() > 0
+    return knees
+
+
+def throughput_capacity(data, max_loss, divergence):
+    """
+    Get the throughput capacity figures of every payload.
+
+    :param data: A DataFrame with the measurements of an experiment, as
+        returned by add_loss_percentage().
+    :param max_loss: The maximum percentage of lost samples for the bounded
+        loss throughput.
+    :param divergence: The relative throughput loss at which the publication
+        and subscription throughputs diverge (see saturation_knee()).
+    :return: A DataFrame with a row per payload.
+    """
+    payloads = np.sort(data[PAYLOAD].unique())
+    raw = max_throughput(data, data[SUB_THROUGHPUT].notnull(), payloads)
+    lossless = max_throughput(data, data['Lost [samples]'] == 0, payloads)
+    bounded = max_throughput(data, data[LOSS] <= max_loss, payloads)
+    knees = saturation_knee(data, divergence).reindex(payloads)
+
+    capacity = pandas.DataFrame({PAYLOAD: payloads})
+    capacity['Max throughput [Mb/s]'] = raw[SUB_THROUGHPUT].values
+    capacity['Max throughput lost [%]'] = raw[LOSS].values
+    for name, best in [('lossless', lossless), ('bounded loss', bounded)]:
+        capacity['Max {} throughput [Mb/s]'.format(name)] = (
+            best[SUB_THROUGHPUT].values
+        )
+        capacity['Max {} demand [sample/burst]'.format(name)] = (
+            best[DEMAND].values
+        )
+        capacity['Max {} recovery time [ms]'.format(name)] = (
+            best[RECOVERY].values
+        )
+    capacity['Max bounded loss lost [%]'] = bounded[LOSS].values
+    capacity['Knee publication throughput [Mb/s]'] = (
+        knees[PUB_THROUGHPUT].values
+    )
+    capacity['Knee subscription throughput [Mb/s]'] = (
+        knees[SUB_THROUGHPUT].values
+    )
+    capacity['Knee demand [sample/burst]'] = knees[DEMAND].values
+    capacity['Knee recovery time [ms]'] = knees[RECOVERY].values
+    capacity['Saturated'] = knees['Saturated'].values
+    return capacity
+
+
+def plot_frontier(data, frontier, capacity, payload, plots_directory):
+    """
+    Plot the throughput frontier and saturation knee of a payload.
+
+    The left plot shows every measurement in the loss-throughput plane, the
+    Pareto frontier, and the maximum lossless and bounded loss throughputs.
+    The right plot shows the subscription against the publication
+    throughput, and the saturation knee. Throughputs are in log scale. The
+    figure is stored as 'frontier_<payload>.png'.
+
+    :param data: A DataFrame with the measurements of an experiment, as
+        returned by add_loss_percentage().
+    :param frontier: A DataFrame as returned by pareto_frontier().
+    :param capacity: A DataFrame as returned by throughput_capacity().
+    :param payload: The payload.
+    :param plots_directory: The directory to store the plot.
+    """
+    data = data[data[PAYLOAD] == payload]
+    frontier = frontier[frontier[PAYLOAD] == payload].sort_values(LOSS)
+    capacity = capacity[capacity[PAYLOAD] == payload].iloc[0]
+
+    fig, (loss_ax, knee_ax) = plt.subplots(1, 2, figsize=(12, 5))
+    loss_ax.scatter(
+        data[LOSS],
+        data[SUB_THROUGHPUT],
+        color='grey',
+        alpha=0.5,
+        label='Measurements'
+    )
+    loss_ax.step(
+        frontier[LOSS],
+        frontier[SUB_THROUGHPUT],
+        where='post',
+        color='C0',
+        marker='o',
+        label='Frontier'
+    )
+    for column, color in [
+        ('Max lossless throughput [Mb/s]', 'C2'),
+        ('Max bounded loss throughput [Mb/s]', 'C1'),
+    ]:
+        if not np.isnan(capacity[column]):
+            loss_ax.axhline(
+                capacity[column],
+                color=color,
+                linestyle='--',
+                label=column
+            )
+    loss_ax.set_xlabel(LOSS)
+    loss_ax.set_ylabel(SUB_THROUGHPUT)
+    loss_ax.set_yscale('log')
+    loss_ax.legend()
+
+    knee_ax.scatter(
+        data[PUB_THROUGHPUT],
+        data[SUB_THROUGHPUT],
+        color='grey',
+        alpha=0.5,
+        label='Measurements'
+    )
+    limits = [data[PUB_THROUGHPUT].min(), data[PUB_THROUGHPUT].max()]
+    knee_ax.plot(limits, limits, color='C0', label='No divergence')
+    if not np.isnan(capacity['Knee publication throughput [Mb/s]']):
+        knee_ax.scatter(
+            capacity['Knee publication throughput [Mb/s]'],
+            capacity['Knee subscription throughput [Mb/s]'],
+            color='C3',
+            marker='x',
+            s=100,
+            label='Saturation knee'
+        )
+    knee_ax.set_xlabel(PUB_THROUGHPUT)
+    knee_ax.set_ylabel(SUB_THROUGHPUT)
+    knee_ax.set_xscale('log')
+    knee_ax.set_yscale('log')
+    knee_ax.legend()
+
+    fig.suptitle('Throughput frontier for {} Bytes'.format(payload))
+    plot_file = '{}/frontier_{}.png'.format(plots_directory, payload)
+    logger.debug('Saving figure "{}"'.format(plot_file))
+    fig.savefig(plot_file)
+    plt.close(fig)
+
+
+def analyse_measurements(
+    raw_csv,
+    frontier_csv,
+    capacity_csv,
+    plots_directory,
+    max_loss,
+    divergence
+):
+    """
+    Create the frontier, capacity and plots of a measurements CSV file.
+
+    :param raw_csv: The path to the measurements CSV file.
+    :param frontier_csv: The path to store the frontier CSV file.
+    :param capacity_csv: The path to store the capacity CSV file.
+    :param plots_directory: The directory to store the plots, or None not to
+        plot.
+    :param max_loss: The maximum percentage of lost samples for the bounded
+        loss throughput.
+    :param divergence: The relative throughput loss at which the publication
+        and subscription throughputs diverge.
+    :return: The capacity DataFrame.
+    """
+    logger.info('Analysing "{}"'.format(raw_csv))
+    data = add_loss_percentage(pandas.read_csv(raw_csv))
+    frontier = pareto_frontier(data)
+    capacity = throughput_capacity(data, max_loss, divergence)
+
+    logger.debug('Generating "{}"'.format(frontier_csv))
+    frontier.to_csv(frontier_csv, float_format='%.3f', index=False)
+    logger.debug('Generating "{}"'.format(capacity_csv))
+    capacity.to_csv(capacity_csv, float_format='%.3f', index=False)
+
+    if plots_directory is not None:
+        if not isdir(plots_directory):
+            makedirs(plots_directory)
+        for payload in capacity[PAYLOAD]:
+            plot_frontier(data, frontier, capacity, payload, plots_directory)
+    return capacity
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="""
+            Script to analyse the full demand and recovery time grid of a
+            throughput experiment. For every payload, it computes the Pareto
+            frontier of subscription throughput against lost samples, the
+            highest throughput reached with zero and with bounded loss, and
+            the saturation knee, where publication and subscription
+            throughputs start to diverge. The frontier and the capacity
+            figures are written as CSV files, and plotted per payload.
+        """
+    )
+    parser.add_argument(
+        '-c',
+        '--raw_csv',
+        help='The measurements CSV file to analyse',
+        required=False
+    )
+    parser.add_argument(
+        '-o',
+        '--frontier_csv',
+        help='The file name of the output frontier CSV',
+        required=False
+    )
+    parser.add_argument(
+        '-a',
+        '--capacity_csv',
+        help='The file name of the output capacity CSV',
+        required=False
+    )
+    parser.add_argument(
+        '-p',
+        '--plots_directory',
+        help='The directory to store the plots. No plots if not given',
+        required=False
+    )
+    parser.add_argument(
+        '-r',
+        '--results_directory',
+        help="""An experiment results directory. All its measurements CSV
+                files are analysed, storing the frontier and capacity of each
+                'measurements_<type>.csv' as frontier_<type>.csv and
+                capacity_<type>.csv, and the plots in
+                plots/measurements_<type>. -c, -o, -a, and -p are ignored.""",
+        required=False
+    )
+    parser.add_argument(
+        '-l',
+        '--max_loss',
+        type=float,
+        help='The maximum lost samples [%%] for the bounded loss throughput',
+        default=1.0,
+        required=False
+    )
+    parser.add_argument(
+        '-d',
+        '--divergence',
+        type=float,
+        help="""The relative difference between publication and subscription
+                throughput at which they diverge""",
+        default=0.05,
+        required=False
+    )
+    parser.add_argument(
+        '--debug',
+        action='store_true',
+        help='Set logging level to debug.'
+    )
+    args = parser.parse_args()
+
+    # Create a custom logger
+    logger = logging.getLogger('THROUGHPUT.FRONTIER')
+    # Create handlers
+    c_handler = logging.StreamHandler()
+    # Create formatters and add it to handlers
+    c_format = (
+        '[%(asctime)s][%(filename)s:%(lineno)s][%(funcName)s()]' +
+        '[%(levelname)s] %(message)s'
+    )
+    c_format = logging.Formatter(c_format)
+    c_handler.setFormatter(c_format)
+    # Add handlers to the logger
+    logger.addHandler(c_handler)
+    # Set log level
+    if args.debug is True:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    if not 0 <= args.divergence < 1:
+        parser.error('--divergence must be in [0, 1)')
+
+    if args.results_directory is not None:
+        # Analyse all the measurements files in the directory
+        results_directory = abspath(args.results_directory)
+        if not isdir(results_directory):
+            parser.error('Cannot find {}'.format(results_directory))
+        files = measurements_files(results_directory)
+        if len(files) == 0:
+            logger.error(
+                'No measurements files found in "{}"'.format(
+                    results_directory
+                )
+            )
+            exit(1)
+        for f in files:
+            exp_type = experiment_type(f)
+            analyse_measurements(
+                '{}/{}'.format(results_directory, f),
+                '{}/frontier_{}.csv'.format(results_directory, exp_type),
+                '{}/capacity_{}.csv'.format(results_directory, exp_type),
+                '{}/plots/{}'.format(results_directory, f[:-len('.csv')]),
+                args.max_loss,
+                args.divergence
+            )
+        exit(0)
+
+    if None in [args.raw_csv, args.frontier_csv, args.capacity_csv]:
+        parser.error('-c, -o, and -a are required unless -r is given')
+    if not isfile(args.raw_csv):
+        parser.error('Cannot find {}'.format(args.raw_csv))
+
+    analyse_measurements(
+        abspath(args.raw_csv),
+        abspath(args.frontier_csv),
+        abspath(args.capacity_csv),
+        None if args.plots_directory is None else abspath(
+            args.plots_directory
+        ),
+        args.max_loss,
+        args.divergence
+    )
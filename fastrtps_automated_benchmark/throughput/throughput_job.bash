@@ -21,7 +21,8 @@ print_usage()
     echo "set of requirements."
     echo ""
     echo "1. Run a throughput experiment with 'throughput_run_experiment.bash'."
-    echo "2. Process results and create summaries with 'throughput_process_results.py'."
+    echo "2. Process results and create summaries with 'throughput_process_results.py', and"
+    echo "   throughput frontiers with 'throughput_frontier.py'."
     echo "3. Clean database form old experiments with 'remove_old_executions.bash'."
     echo "4. Check results against requirements with 'throughput_check_experiment.py'."
     echo "5. Update database history plots with 'throughput_plot_history.py'."
@@ -212,26 +213,11 @@ main ()
 
     # Create plots and summary of experiment results
     rm ${RESULTS_DIR}/*summary* &> /dev/null
-    SUMMARIES=""
-    DATA_FILES=($(ls ${RESULTS_DIR} -I plots))
-    for FILE in ${DATA_FILES[@]}
-    do
-        # Get filename without extension
-        IFS='.' read -r -a FILE <<< "${FILE}"
-        FILE=${FILE[-2]}
-        echo "Generating plots for ${FILE}..."
-
-        # Create plots and summary
-        ${PYTHON_3} ${SCRITP_DIR}/throughput_process_results.py \
-            --plots_directory ${RESULTS_DIR}/plots/${FILE} \
-            --raw_csv ${RESULTS_DIR}/${FILE}.csv \
-            --output_csv ${RESULTS_DIR}/${FILE}_summary.csv
-            
-        # Add summary to list
-        SUMMARIES="${SUMMARIES} ${RESULTS_DIR}/${FILE}_summary.csv"
-
-        echo "-------------------------------------------------------------------"
-    done
+    echo "Generating plots and summaries for ${RESULTS_DIR}..."
+    ${PYTHON_3} ${SCRITP_DIR}/throughput_process_results.py \
+        --results_directory ${RESULTS_DIR}
+    SUMMARIES=$(ls ${RESULTS_DIR}/*_summary.csv)
+    echo "-------------------------------------------------------------------"
 
     # Create comparison plots
     echo "Creating sub-experiment comparison plots"
@@ -240,6 +226,12 @@ main ()
             --subexperiment_summaries ${SUMMARIES}
     echo "-------------------------------------------------------------------"
 
+    # Create throughput frontiers
+    echo "Creating throughput frontiers for ${RESULTS_DIR}..."
+    ${PYTHON_3} ${SCRITP_DIR}/throughput_frontier.py \
+        --results_directory ${RESULTS_DIR}
+    echo "-------------------------------------------------------------------"
+
 
     # Clean database
     bash ${SCRITP_DIR}/../remove_old_executions.bash \
@@ -16,18 +16,36 @@
 import argparse
 import logging
 import multiprocessing
+from os import listdir
 from os import makedirs
+from os import sched_getaffinity
 from os.path import isdir
+from os.path import isfile
 from os.path import abspath
 
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
+import numpy as np
+
 import pandas
 
 import seaborn as sns
 
+# Measurements columns shared with the plotting processes
+PLOT_COLUMNS = [
+    'Demand [sample/burst]',
+    'Recovery time [ms]',
+    'Subscription throughput [Mb/s]',
+    'Lost [samples]',
+]
+
+# Measurements matrix (PLOT_COLUMNS) shared with a plotting process, and the
+# data types of its columns. Set by init_plotting_process().
+shared_measurements = None
+shared_dtypes = None
+
 
 def directory_type(directory):
     """
@@ -48,32 +66,20 @@ def create_throughput_summary(raw_data, output_csv):
     """
     Create a throughput summary from a dataframe.
 
+    The summary has, for each payload, the measurement with the maximum
+    subscription throughput (the first one if there are several).
+
     :param raw_data: A DataFrame containing the data of a throughput experiment
         output CSV file.
     :param output_csv: The path to a file to store the summary.
     :return: A DataFrame containing the summary.
     """
-    summary_df = pandas.DataFrame()
-    payloads = raw_data['Payload [Bytes]'].unique()
-    for payload in payloads:
-        logger.debug(
-            'Adding entry for payload {} Bytes to "{}"'.format(
-                payload,
-                output_csv
-            )
-        )
-        sample_series = raw_data[raw_data['Payload [Bytes]'] == payload]
-        sample_series = sample_series.reset_index(drop=True)
-        max_row = sample_series[
-            (
-                sample_series['Subscription throughput [Mb/s]'] ==
-                sample_series['Subscription throughput [Mb/s]'].max()
-            )
-        ]
-        summary_df = summary_df.append(max_row)
+    max_rows = raw_data.groupby('Payload [Bytes]', sort=False)[
+        'Subscription throughput [Mb/s]'
+    ].idxmax()
+    summary_df = raw_data.loc[max_rows].reset_index(drop=True)
 
     # Save summary as CSV file
-    summary_df = summary_df.reset_index(drop=True)
     summary_df.to_csv(output_csv, float_format='%.3f', index=False)
     logger.debug('Summary for {}:\n{}'.format(output_csv, summary_df))
     return summary_df
@@ -159,32 +165,194 @@ def plotting_function(payload, raw_data, plots_directory):
     )
 
 
-def create_experiment_plots(raw_data, plots_directory):
-    """."""
+def init_plotting_process(measurements, dtypes):
+    """
+    Initialize a plotting process with the shared measurements.
+
+    :param measurements: A multiprocessing.RawArray with the PLOT_COLUMNS
+        values of the measurements, row by row, as float64.
+    :param dtypes: The data types of PLOT_COLUMNS in the measurements.
+    """
+    global shared_measurements
+    global shared_dtypes
+    shared_measurements = np.frombuffer(measurements).reshape(
+        -1,
+        len(PLOT_COLUMNS)
+    )
+    shared_dtypes = dtypes
+
+
+def plot_shared_payload(payload, start, stop, plots_directory):
+    """
+    Create the plots of a payload from the shared measurements.
+
+    :param payload: The payload.
+    :param start: The first row of the payload in the shared measurements.
+    :param stop: The row after the last one of the payload in the shared
+        measurements.
+    :param plots_directory: The directory to store the plots.
+    """
+    payload_data = pandas.DataFrame(
+        shared_measurements[start:stop],
+        columns=PLOT_COLUMNS
+    ).astype(dict(zip(PLOT_COLUMNS, shared_dtypes)))
+    payload_data.insert(0, 'Payload [Bytes]', payload)
+    plotting_function(payload, payload_data, plots_directory)
+
+
+def create_experiment_plots(raw_data, plots_directory, jobs):
+    """
+    Create the plots of every payload in parallel.
+
+    The plots are rendered by a pool of at most <jobs> processes. The
+    measurements needed for the plots are copied once, grouped by payload,
+    to a shared memory block, so each process reads the rows of its payloads
+    instead of receiving a copy of <raw_data>.
+
+    :param raw_data: A DataFrame containing the data of a throughput experiment
+        output CSV file.
+    :param plots_directory: The directory to store the plots.
+    :param jobs: The maximum number of processes.
+    :return: True if all the plots were created, False otherwise.
+    """
     payloads = raw_data['Payload [Bytes]'].unique()
-    logger.debug('Creating plotting processes')
-    plot_processes = []
-    for payload in payloads:
-        logger.debug('Creating plotting process for {}'.format(payload))
-        plot_processes.append(
-            multiprocessing.Process(
-                target=plotting_function,
-                args=(payload, raw_data, plots_directory,)
-            )
-        )
-    try:
-        logger.debug('Starting processes')
-        for process in plot_processes:
-            process.start()
-
-        logger.debug('Joining processes')
-        for process in plot_processes:
-            process.join()
-        logger.debug('All processes have finished working')
+    if len(payloads) == 0:
         return True
-    except Exception as e:
-        logger.error('Exception occurred while plotting: {}'.format(e))
-        return False
+
+    # Group the rows by payload
+    payload_rows = [
+        np.flatnonzero(raw_data['Payload [Bytes]'].values == payload)
+        for payload in payloads
+    ]
+    offsets = np.cumsum([0] + [len(rows) for rows in payload_rows])
+    values = raw_data[PLOT_COLUMNS].values[np.concatenate(payload_rows)]
+    measurements = multiprocessing.RawArray('d', values.size)
+    np.frombuffer(measurements)[:] = values.astype(float).ravel()
+    dtypes = [raw_data[c].dtype for c in PLOT_COLUMNS]
+
+    failures = 0
+    logger.debug('Creating plotting pool')
+    with multiprocessing.Pool(
+        max(min(jobs, len(payloads)), 1),
+        initializer=init_plotting_process,
+        initargs=(measurements, dtypes)
+    ) as pool:
+        results = [
+            pool.apply_async(
+                plot_shared_payload,
+                (payload, offsets[i], offsets[i + 1], plots_directory)
+            ) for i, payload in enumerate(payloads)
+        ]
+        for payload, result in zip(payloads, results):
+            try:
+                result.get()
+            except Exception as e:
+                logger.error(
+                    'Error plotting payload {}: {}'.format(payload, e)
+                )
+                failures += 1
+    logger.debug('All processes have finished working')
+    return failures == 0
+
+
+def process_measurements(
+    raw_csv,
+    output_csv,
+    plots_directory,
+    parallel_plots=True,
+    jobs=1
+):
+    """
+    Create the summary and plots of a throughput measurements CSV file.
+
+    :param raw_csv: The path to the measurements CSV file.
+    :param output_csv: The path to store the summary CSV file.
+    :param plots_directory: The directory to store the plots.
+    :param parallel_plots: Whether to render the plots of the payloads in a
+        pool of processes. Defaults: True.
+    :param jobs: The maximum number of plotting processes. Defaults: 1.
+    :return: True if all the plots were created, False otherwise.
+    """
+    plots_directory = directory_type(plots_directory)
+    logger.debug('Reading data from "{}"'.format(raw_csv))
+    raw_data = pandas.read_csv(raw_csv)
+
+    logger.info('Creating summary in "{}"'.format(output_csv))
+    create_throughput_summary(raw_data, output_csv)
+
+    logger.info(
+        'Creating plots for "{}" in "{}"'.format(raw_csv, plots_directory)
+    )
+    if parallel_plots is True:
+        return create_experiment_plots(raw_data, plots_directory, jobs)
+    for payload in raw_data['Payload [Bytes]'].unique():
+        plotting_function(payload, raw_data, plots_directory)
+    return True
+
+
+def measurements_files(results_directory):
+    """
+    Get the measurements CSV files of an experiment results directory.
+
+    The files are the ones named 'measurements_<experiment_type>.csv', leaving
+    out the summaries output by this script.
+
+    :param results_directory: The experiment results directory.
+    :return: A sorted list with the file names (without directory).
+    """
+    return [
+        f for f in sorted(listdir(results_directory))
+        if isfile('{}/{}'.format(results_directory, f)) and
+        f.startswith('measurements_') and
+        f.endswith('.csv') and
+        not f.endswith('_summary.csv')
+    ]
+
+
+def process_results_directory(results_directory, jobs):
+    """
+    Process all the measurements CSV files of an experiment results directory.
+
+    The files are processed in parallel by a pool of at most <jobs>
+    processes, and the plots of each file are rendered in the process of the
+    file. For each 'measurements_<experiment_type>.csv' file, the summary is
+    stored as 'measurements_<experiment_type>_summary.csv', and the plots in
+    the 'plots/measurements_<experiment_type>' directory.
+
+    :param results_directory: The experiment results directory.
+    :param jobs: The maximum number of processes.
+    :return: The number of files that could not be processed.
+    """
+    files = measurements_files(results_directory)
+    logger.debug('Measurements files: {}'.format(files))
+    if len(files) == 0:
+        logger.warning(
+            'No measurements files found in "{}"'.format(results_directory)
+        )
+        return 0
+
+    failures = 0
+    with multiprocessing.Pool(max(min(jobs, len(files)), 1)) as pool:
+        results = {}
+        for f in files:
+            name = f[:-len('.csv')]
+            results[f] = pool.apply_async(
+                process_measurements,
+                (
+                    '{}/{}'.format(results_directory, f),
+                    '{}/{}_summary.csv'.format(results_directory, name),
+                    '{}/plots/{}'.format(results_directory, name),
+                    False,
+                )
+            )
+        for f in files:
+            try:
+                if results[f].get() is not True:
+                    failures += 1
+            except Exception as e:
+                logger.error('Error processing "{}": {}'.format(f, e))
+                failures += 1
+    return failures
 
 
 if __name__ == '__main__':
@@ -195,19 +363,37 @@ if __name__ == '__main__':
         '-p',
         '--plots_directory',
         help='The directory to store the plots',
-        required=True
+        required=False
     )
     parser.add_argument(
         '-c',
         '--raw_csv',
         help='The CSV file from which the data is extracted',
-        required=True
+        required=False
     )
     parser.add_argument(
         '-o',
         '--output_csv',
         help='The file name of the output CSV',
-        required=True
+        required=False
+    )
+    parser.add_argument(
+        '-r',
+        '--results_directory',
+        help="""An experiment results directory. All its measurements CSV
+                files are processed in parallel, storing each summary as
+                <file>_summary.csv, and each plots in plots/<file>. -p, -c,
+                and -o are ignored.""",
+        required=False
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help="""The maximum number of processes processing files with -r, or
+                rendering the plots of the payloads otherwise""",
+        default=len(sched_getaffinity(0)),
+        required=False
     )
     parser.add_argument(
         '--debug',
@@ -235,20 +421,27 @@ if __name__ == '__main__':
     else:
         logger.setLevel(logging.INFO)
 
-    plots_directory = abspath(directory_type(args.plots_directory))
-    raw_csv = abspath(args.raw_csv)
-    output_csv = abspath(args.output_csv)
-
-    logger.debug('Reading data from "{}"'.format(raw_csv))
-    raw_data = pandas.read_csv(raw_csv)
+    if args.results_directory is not None:
+        # Process all the measurements files in the directory
+        failures = process_results_directory(
+            abspath(args.results_directory),
+            args.jobs
+        )
+        if failures > 0:
+            logger.error('{} measurements files failed'.format(failures))
+            exit(1)
+        logger.debug('All work is done!')
+        exit(0)
 
-    logger.info('Creating summary in "{}"'.format(output_csv))
-    summary_df = create_throughput_summary(raw_data, output_csv)
+    if None in [args.plots_directory, args.raw_csv, args.output_csv]:
+        parser.error('-p, -c, and -o are required unless -r is given')
 
-    logger.info(
-        'Creating plots for "{}" in "{}"'.format(raw_csv, plots_directory)
-    )
-    if create_experiment_plots(raw_data, plots_directory) is True:
+    if process_measurements(
+        abspath(args.raw_csv),
+        abspath(args.output_csv),
+        abspath(args.plots_directory),
+        jobs=args.jobs
+    ) is True:
         logger.debug('All work is done!')
         exit(0)
     else: